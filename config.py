@@ -0,0 +1,343 @@
+"""
+Configuração central do AI-Totem: perfis nomeados, arquivo JSON e variáveis de ambiente.
+
+Ordem de precedência (a última vence):
+    1. valores padrão das dataclasses abaixo;
+    2. perfil escolhido (campo "profile" do arquivo ou AI_TOTEM_PROFILE);
+    3. seções do arquivo JSON (AI_TOTEM_CONFIG, padrão 'ai_totem_config.json');
+    4. variáveis de ambiente: AI_TOTEM_<SEÇÃO>_<CAMPO> (ex: AI_TOTEM_DETECTOR_CONF=0.6)
+       e os atalhos já existentes listados em ENV_ALIASES (ex: AI_TOTEM_BACKEND).
+
+Exemplo de arquivo:
+    {"profile": "low-power-kiosk", "detector": {"conf": 0.6}, "camera": {"display_fps": 15}}
+
+Com config_manager.start_watching() o arquivo é relido quando muda e os assinantes
+(subscribe) recebem a nova configuração sem reiniciar o app. Campos marcados em
+RESTART_FIELDS só têm efeito no próximo início. Cada seção valida faixas e tamanhos
+em __post_init__, então um valor fora da faixa é rejeitado já na leitura e, no
+hot reload, a configuração anterior continua valendo.
+"""
+import copy
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import Optional, Tuple, Union, get_args, get_origin, get_type_hints
+
+PROJECT_ROOT = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_CONFIG_FILE = os.path.join(PROJECT_ROOT, 'ai_totem_config.json')
+# o letterbox do YOLO usa o stride 32 do modelo
+IMGSZ_STRIDE = 32
+# formatos de imagem dos snapshots de auditoria, aceitos pelo cv2.imencode
+AUDIT_IMAGE_FORMATS = ('jpg', 'webp')
+
+def _require(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+@dataclass(frozen=True)
+class DetectorConfig:
+    backend: str = 'pytorch'
+    imgsz: int = 640
+    batch_size: int = 4
+    conf: float = 0.70
+    iou: float = 0.25
+    roi: Optional[Tuple[int, int, int, int]] = None
+    # modo em tiles (colunas, linhas) para bandejas cheias de itens pequenos
+    tiles: Optional[Tuple[int, int]] = None
+    tile_overlap: float = 0.2
+    latency_budget_ms: Optional[float] = None
+    workers: int = 0
+    inference_server: Optional[str] = None
+
+    def __post_init__(self):
+        _require(self.imgsz > 0 and self.imgsz % IMGSZ_STRIDE == 0, f"imgsz deve ser um múltiplo positivo de {IMGSZ_STRIDE}: {self.imgsz}")
+        _require(self.batch_size >= 1, f"batch_size deve ser maior ou igual a 1: {self.batch_size}")
+        _require(0 <= self.conf <= 1, f"conf deve estar em [0, 1]: {self.conf}")
+        _require(0 <= self.iou <= 1, f"iou deve estar em [0, 1]: {self.iou}")
+        if self.roi is not None:
+            _require(len(self.roi) == 4, f"roi deve ter 4 valores (x1, y1, x2, y2): {self.roi}")
+            x1, y1, x2, y2 = self.roi
+            _require(x1 >= 0 and y1 >= 0 and x2 > x1 and y2 > y1, f"roi inválida: {self.roi}. Use x2 > x1 >= 0 e y2 > y1 >= 0.")
+        if self.tiles is not None:
+            _require(len(self.tiles) == 2 and min(self.tiles) >= 1, f"tiles deve ser (colunas, linhas) com valores >= 1: {self.tiles}")
+        _require(0 <= self.tile_overlap < 1, f"tile_overlap deve estar em [0, 1): {self.tile_overlap}")
+        _require(self.latency_budget_ms is None or self.latency_budget_ms > 0, f"latency_budget_ms deve ser positivo: {self.latency_budget_ms}")
+        _require(self.workers >= 0, f"workers não pode ser negativo: {self.workers}")
+
+@dataclass(frozen=True)
+class CameraConfig:
+    source: str = '0'
+    width: int = 640
+    height: int = 480
+    display_fps: float = 20.0
+    buffer_size: int = 8
+
+    def __post_init__(self):
+        _require(self.width > 0 and self.height > 0, f"width e height devem ser positivos: {self.width}x{self.height}")
+        _require(self.display_fps > 0, f"display_fps deve ser positivo: {self.display_fps}")
+        _require(self.buffer_size >= 2, f"buffer_size deve ser maior ou igual a 2: {self.buffer_size}")
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    result_poll_interval: float = 0.1
+    motion_threshold: float = 0.01
+    motion_max_reuse_age: float = 2.0
+    tracker_iou_threshold: float = 0.3
+    # tempo (s) que um produto continua no carrinho sem ser detectado (antigo HISTORY_TIMEOUT)
+    history_timeout: float = 1.0
+    tracker_min_hits: int = 2
+
+    def __post_init__(self):
+        _require(self.result_poll_interval > 0, f"result_poll_interval deve ser positivo: {self.result_poll_interval}")
+        _require(self.motion_threshold >= 0, f"motion_threshold não pode ser negativo: {self.motion_threshold}")
+        _require(self.motion_max_reuse_age >= 0, f"motion_max_reuse_age não pode ser negativo: {self.motion_max_reuse_age}")
+        _require(0 <= self.tracker_iou_threshold <= 1, f"tracker_iou_threshold deve estar em [0, 1]: {self.tracker_iou_threshold}")
+        _require(self.history_timeout >= 0, f"history_timeout não pode ser negativo: {self.history_timeout}")
+        _require(self.tracker_min_hits >= 1, f"tracker_min_hits deve ser maior ou igual a 1: {self.tracker_min_hits}")
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    db_name: str = 'ai_totem.db'
+    # intervalo (s) entre as consultas da versão do catálogo de preços e estoque
+    catalog_refresh_interval: float = 2.0
+
+    def __post_init__(self):
+        _require(bool(self.db_name), "db_name não pode ser vazio")
+        _require(self.catalog_refresh_interval > 0, f"catalog_refresh_interval deve ser positivo: {self.catalog_refresh_interval}")
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    file: Optional[str] = None
+    port: Optional[int] = None
+    stats_overlay: bool = False
+
+    def __post_init__(self):
+        _require(self.port is None or 0 < self.port < 65536, f"port deve estar entre 1 e 65535: {self.port}")
+
+@dataclass(frozen=True)
+class AuditConfig:
+    # snapshots dos frames que geraram o carrinho, gravados com cada compra
+    enabled: bool = True
+    ring_size: int = 4
+    min_interval: float = 0.5
+    image_format: str = 'jpg'
+    quality: int = 80
+    max_age_days: float = 30.0
+    max_total_mb: float = 500.0
+
+    def __post_init__(self):
+        _require(self.ring_size >= 1, f"ring_size deve ser maior ou igual a 1: {self.ring_size}")
+        _require(self.min_interval >= 0, f"min_interval não pode ser negativo: {self.min_interval}")
+        _require(self.image_format in AUDIT_IMAGE_FORMATS, f"image_format deve ser um de {', '.join(AUDIT_IMAGE_FORMATS)}: {self.image_format}")
+        _require(0 <= self.quality <= 100, f"quality deve estar entre 0 e 100: {self.quality}")
+        _require(self.max_age_days > 0, f"max_age_days deve ser positivo: {self.max_age_days}")
+        _require(self.max_total_mb > 0, f"max_total_mb deve ser positivo: {self.max_total_mb}")
+
+@dataclass(frozen=True)
+class AppConfig:
+    profile: str = 'default'
+    detector: DetectorConfig = field(default_factory=DetectorConfig)
+    camera: CameraConfig = field(default_factory=CameraConfig)
+    pipeline: PipelineConfig = field(default_factory=PipelineConfig)
+    database: DatabaseConfig = field(default_factory=DatabaseConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    audit: AuditConfig = field(default_factory=AuditConfig)
+
+SECTIONS = {
+    'detector': DetectorConfig,
+    'camera': CameraConfig,
+    'pipeline': PipelineConfig,
+    'database': DatabaseConfig,
+    'metrics': MetricsConfig,
+    'audit': AuditConfig,
+}
+
+# perfis nomeados: só os campos que diferem dos padrões
+PROFILES = {
+    'default': {},
+    # CPU fraca e sem GPU: modelo OpenVINO menor, imgsz adaptativo e menos trabalho na interface
+    'low-power-kiosk': {
+        'detector': {'backend': 'openvino', 'imgsz': 416, 'latency_budget_ms': 150.0},
+        'camera': {'display_fps': 12.0},
+        'pipeline': {'result_poll_interval': 0.2, 'motion_max_reuse_age': 3.0},
+    },
+    # servidor com vários núcleos atendendo vários caixas: lotes maiores e inferência em processos
+    'multi-lane-server': {
+        'detector': {'backend': 'onnx', 'batch_size': 8, 'workers': 2},
+        'camera': {'display_fps': 20.0, 'buffer_size': 16},
+    },
+}
+
+# variáveis de ambiente já usadas pelo app, mantidas como atalhos
+ENV_ALIASES = {
+    'AI_TOTEM_BACKEND': ('detector', 'backend'),
+    'AI_TOTEM_ROI': ('detector', 'roi'),
+    'AI_TOTEM_LATENCY_BUDGET_MS': ('detector', 'latency_budget_ms'),
+    'AI_TOTEM_INFERENCE_WORKERS': ('detector', 'workers'),
+    'AI_TOTEM_INFERENCE_SERVER': ('detector', 'inference_server'),
+    'AI_TOTEM_FRAME_SOURCE': ('camera', 'source'),
+    'AI_TOTEM_METRICS_FILE': ('metrics', 'file'),
+    'AI_TOTEM_METRICS_PORT': ('metrics', 'port'),
+    'AI_TOTEM_STATS_OVERLAY': ('metrics', 'stats_overlay'),
+}
+
+# campos lidos só na inicialização (modelo, processos, banco e exportadores)
+RESTART_FIELDS = {
+    'detector': ('backend', 'batch_size', 'workers', 'inference_server'),
+    'database': ('db_name', 'catalog_refresh_interval'),
+    'metrics': ('file', 'port', 'stats_overlay'),
+    'audit': ('enabled', 'ring_size', 'min_interval', 'image_format', 'quality', 'max_age_days', 'max_total_mb'),
+}
+
+def _convert(value, annotation):
+    """
+    Converte um valor do JSON ou de uma variável de ambiente para o tipo do campo.
+    """
+    if get_origin(annotation) is Union and type(None) in get_args(annotation):
+        if value is None or (isinstance(value, str) and value.strip().lower() in ('', 'none', 'null')):
+            return None
+        annotation = next(arg for arg in get_args(annotation) if arg is not type(None))
+    if get_origin(annotation) in (tuple, Tuple):
+        items = value.split(',') if isinstance(value, str) else value
+        item_types = get_args(annotation)
+        return tuple(_convert(item, item_types[0]) for item in items)
+    if annotation is bool:
+        if isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return bool(value)
+    return annotation(value)
+
+def _build_section(section_class, values, source):
+    hints = get_type_hints(section_class)
+    known = {f.name for f in fields(section_class)}
+    unknown = set(values) - known
+    if unknown:
+        raise ValueError(f"Campos desconhecidos em '{source}': {', '.join(sorted(unknown))}")
+    try:
+        return section_class(**{name: _convert(value, hints[name]) for name, value in values.items()})
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Valor inválido em '{source}': {e}")
+
+def _merge(base, overrides):
+    merged = copy.deepcopy(base)
+    for section, values in overrides.items():
+        merged.setdefault(section, {}).update(values)
+    return merged
+
+def _env_overrides(environ):
+    overrides = {}
+    for name, (section, key) in ENV_ALIASES.items():
+        if name in environ:
+            overrides.setdefault(section, {})[key] = environ[name]
+    for section in SECTIONS:
+        prefix = f'AI_TOTEM_{section.upper()}_'
+        for name, value in environ.items():
+            if name.startswith(prefix):
+                overrides.setdefault(section, {})[name[len(prefix):].lower()] = value
+    return overrides
+
+def load_config(path=None, environ=None):
+    """
+    :param path: Arquivo JSON; por padrão AI_TOTEM_CONFIG ou DEFAULT_CONFIG_FILE (opcional).
+    :return: AppConfig validado.
+    """
+    environ = os.environ if environ is None else environ
+    path = path or environ.get('AI_TOTEM_CONFIG', DEFAULT_CONFIG_FILE)
+    file_values = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            file_values = json.load(f)
+
+    profile = environ.get('AI_TOTEM_PROFILE') or file_values.get('profile', 'default')
+    if profile not in PROFILES:
+        raise ValueError(f"Perfil '{profile}' desconhecido. Use um de: {', '.join(PROFILES)}")
+
+    values = _merge(PROFILES[profile], {section: file_values.get(section, {}) for section in SECTIONS})
+    values = _merge(values, _env_overrides(environ))
+    sections = {name: _build_section(section_class, values.get(name, {}), name) for name, section_class in SECTIONS.items()}
+    return AppConfig(profile=profile, **sections)
+
+def restart_required_changes(old, new):
+    """
+    :return: Lista 'seção.campo' dos campos alterados que só valem após reiniciar.
+    """
+    changed = []
+    for section, names in RESTART_FIELDS.items():
+        for name in names:
+            if getattr(getattr(old, section), name) != getattr(getattr(new, section), name):
+                changed.append(f'{section}.{name}')
+    return changed
+
+class ConfigManager:
+    """
+    Guarda a configuração atual e a recarrega quando o arquivo muda. Uma configuração
+    inválida é rejeitada e a anterior continua valendo.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('AI_TOTEM_CONFIG', DEFAULT_CONFIG_FILE)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._mtime = self._file_mtime()
+        self._config = load_config(self.path)
+        self._thread = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def get(self):
+        with self._lock:
+            return self._config
+
+    def subscribe(self, callback):
+        """
+        :param callback: Chamado como callback(new_config, old_config) na thread que recarregou.
+        """
+        self._subscribers.append(callback)
+
+    def reload(self):
+        """
+        :return: True se a configuração mudou.
+        """
+        try:
+            new_config = load_config(self.path)
+        except Exception as e:
+            print(f"Configuração inválida em '{self.path}', mantendo a anterior: {e}")
+            return False
+        with self._lock:
+            old_config, self._config = self._config, new_config
+        if new_config == old_config:
+            return False
+
+        print(f"Configuração recarregada (perfil '{new_config.profile}').")
+        restart = restart_required_changes(old_config, new_config)
+        if restart:
+            print(f"Só terão efeito após reiniciar: {', '.join(restart)}")
+        for callback in self._subscribers:
+            try:
+                callback(new_config, old_config)
+            except Exception as e:
+                print(f"Erro ao aplicar a nova configuração: {e}")
+        return True
+
+    def start_watching(self, interval=2.0):
+        if self._thread is not None:
+            return
+
+        def watch_loop():
+            while True:
+                time.sleep(interval)
+                mtime = self._file_mtime()
+                if mtime != self._mtime:
+                    self._mtime = mtime
+                    self.reload()
+
+        self._thread = threading.Thread(target=watch_loop, name='config-watcher', daemon=True)
+        self._thread.start()
+
+# instância compartilhada pelo app
+config_manager = ConfigManager()
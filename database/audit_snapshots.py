@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from queue import Queue
+
+from config import AUDIT_IMAGE_FORMATS as IMAGE_FORMATS
+from database.connector import DB_NAME
+
+def snapshot_dir_for(db_name):
+    return os.path.splitext(db_name)[0] + '_snapshots'
+
+class AuditSnapshotWriter:
+    """
+    Grava, em segundo plano, os frames anotados que geraram o carrinho de cada compra.
+
+    Cada compra ganha o diretório purchase_<id>/ com as imagens comprimidas e um
+    detections.json com as caixas de cada frame. submit() só enfileira: a anotação,
+    a compressão e a escrita acontecem na thread do writer, fora do checkout. Depois de
+    cada compra os diretórios mais antigos que max_age_days são apagados, e também os
+    mais antigos enquanto o total passar de max_total_mb. O tamanho total e a ordem dos
+    diretórios ficam em memória; o disco só é varrido uma vez, quando o writer inicia.
+    """
+    def __init__(self, directory=None, image_format='jpg', quality=80, max_age_days=30.0, max_total_mb=500.0):
+        """
+        :param directory: Diretório das imagens; por padrão fica ao lado do banco.
+        :param image_format: 'jpg' ou 'webp'.
+        :param quality: Qualidade da compressão (0 a 100).
+        :param max_age_days: Snapshots mais antigos que isso são apagados.
+        :param max_total_mb: Tamanho máximo do diretório; os snapshots mais antigos saem primeiro.
+        """
+        self.directory = directory or snapshot_dir_for(DB_NAME)
+        self.image_format = image_format
+        self.quality = quality
+        self.max_age_days = max_age_days
+        self.max_total_mb = max_total_mb
+
+        self._queue = Queue()
+        self._thread = None
+        self.running = False
+        # diretório de cada compra -> (mtime, bytes), do mais antigo ao mais recente; só a thread do writer usa
+        self._index = None
+        self._total_size = 0
+
+    def configure(self, audit_config, directory):
+        """
+        Aplica a seção 'audit' da configuração (ver config.AuditConfig).
+        """
+        if audit_config.image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Formato '{audit_config.image_format}' inválido. Use um de: {', '.join(IMAGE_FORMATS)}")
+        if directory != self.directory:
+            self._index = None
+        self.directory = directory
+        self.image_format = audit_config.image_format
+        self.quality = audit_config.quality
+        self.max_age_days = audit_config.max_age_days
+        self.max_total_mb = audit_config.max_total_mb
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._writer_loop, name='audit-snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Grava os snapshots que ainda estão na fila e encerra a thread.
+        """
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+        self.running = False
+
+    def submit(self, purchase_id, snapshots, class_names):
+        """
+        :param snapshots: Lista de vision.snapshot_ring.Snapshot; os frames passam a ser do writer.
+        :param class_names: Nomes das classes do detector, para anotar as caixas.
+        """
+        if not snapshots:
+            return
+        if not self.running:
+            self.start()
+        self._queue.put((purchase_id, snapshots, list(class_names)))
+
+    def _writer_loop(self):
+        # a varredura do disco acontece na inicialização, antes da primeira compra
+        if self._index is None:
+            try:
+                self._load_index()
+            except OSError as e:
+                print(f"Erro ao ler o diretório de snapshots '{self.directory}': {e}")
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                if self._index is None:
+                    self._load_index()
+                purchase_dir, size = self._write_purchase(*item)
+                self._add_to_index(purchase_dir, size)
+                self._enforce_retention()
+            except Exception as e:
+                print(f"Erro ao gravar os snapshots da compra #{item[0]}: {e}")
+
+    def _annotate(self, frame, boxes, class_names):
+        import cv2
+        for x1, y1, x2, y2, conf, cls_id in boxes:
+            cls_id = int(cls_id)
+            name = class_names[cls_id] if cls_id < len(class_names) else f'classe_{cls_id}'
+            top_left = (int(x1), int(y1))
+            cv2.rectangle(frame, top_left, (int(x2), int(y2)), (50, 205, 50), 2)
+            cv2.putText(frame, f'{name} {conf:.2f}', (int(x1), max(int(y1) - 5, 12)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (50, 205, 50), 1, cv2.LINE_AA)
+        return frame
+
+    def _write_purchase(self, purchase_id, snapshots, class_names):
+        import cv2
+        quality_flag = cv2.IMWRITE_WEBP_QUALITY if self.image_format == 'webp' else cv2.IMWRITE_JPEG_QUALITY
+        purchase_dir = os.path.join(self.directory, f'purchase_{purchase_id}')
+        os.makedirs(purchase_dir, exist_ok=True)
+
+        frames = []
+        size = 0
+        for index, snapshot in enumerate(snapshots):
+            # o frame pertence ao writer (ver SnapshotRing.detach): pode ser desenhado sem cópia
+            image = self._annotate(snapshot.frame, snapshot.boxes, class_names)
+            ok, encoded = cv2.imencode(f'.{self.image_format}', image, [quality_flag, int(self.quality)])
+            if not ok:
+                raise ValueError(f"Falha ao comprimir o frame {index} em {self.image_format}")
+            file_name = f'frame_{index}.{self.image_format}'
+            with open(os.path.join(purchase_dir, file_name), 'wb') as image_file:
+                size += image_file.write(encoded.tobytes())
+            frames.append({
+                'file': file_name,
+                'captured_at': datetime.fromtimestamp(snapshot.captured_at).isoformat(' '),
+                'detections': [{
+                    'class': class_names[int(cls_id)] if int(cls_id) < len(class_names) else f'classe_{int(cls_id)}',
+                    'class_id': int(cls_id),
+                    'confidence': round(float(conf), 4),
+                    'bbox': [round(float(v), 1) for v in (x1, y1, x2, y2)],
+                } for x1, y1, x2, y2, conf, cls_id in snapshot.boxes],
+            })
+
+        metadata_path = os.path.join(purchase_dir, 'detections.json')
+        metadata = {'purchase_id': purchase_id, 'frames': frames}
+        with open(metadata_path, 'w', encoding='utf-8') as metadata_file:
+            json.dump(metadata, metadata_file, indent=2, ensure_ascii=False)
+        return purchase_dir, size + os.path.getsize(metadata_path)
+
+    def _load_index(self):
+        """
+        Varre o diretório uma única vez e monta o índice do mais antigo ao mais recente.
+        """
+        purchases = []
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.is_dir() and entry.name.startswith('purchase_'):
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                    purchases.append((entry.stat().st_mtime, size, entry.path))
+        purchases.sort()
+        self._index = OrderedDict((path, (mtime, size)) for mtime, size, path in purchases)
+        self._total_size = sum(size for _, size, _ in purchases)
+
+    def _add_to_index(self, path, size):
+        # uma compra regravada (mesmo id) troca a entrada antiga e passa a ser a mais recente
+        previous = self._index.pop(path, None)
+        if previous is not None:
+            self._total_size -= previous[1]
+        self._index[path] = (time.time(), size)
+        self._total_size += size
+
+    def _enforce_retention(self):
+        oldest_allowed = time.time() - self.max_age_days * 86400
+        max_total = self.max_total_mb * 1024 * 1024
+        while self._index:
+            path, (mtime, size) = next(iter(self._index.items()))
+            if mtime >= oldest_allowed and self._total_size <= max_total:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            del self._index[path]
+            self._total_size -= size
+
+# instância única usada pela interface
+audit_snapshots = AuditSnapshotWriter()
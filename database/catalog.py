@@ -0,0 +1,317 @@
+import argparse
+import sys
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from config import config_manager
+from database import connector
+from database.connector import get_connection, db_lock
+
+# tabelas criadas por init_catalog (a última delas só existe depois da migração do estoque)
+CATALOG_TABLES = ('catalog', 'catalog_meta', 'stock_shortfalls')
+
+# preços usados para popular o catálogo na primeira execução
+DEFAULT_PRODUCT_PRICES = {
+    "Banana": 5.99,
+    "Orange": 3.50,
+    "Apple": 7.00,
+    "Pineapple": 12.00,
+    "Grapes": 7.00,
+    "Kiwi": 5.35,
+    "Mango": 3.82,
+    "Sugerapple": 2.50,
+    "Watermelon": 3.0,
+}
+UNKNOWN_PRODUCT_PRICE = 0.00
+
+def _migrate_untracked_stock(cursor):
+    # versões anteriores criavam stock NOT NULL DEFAULT 0 sem nunca contar o estoque:
+    # zeros e negativos não eram estoque real e passam a "não controlado" (NULL)
+    columns = {row[1]: row for row in cursor.execute('PRAGMA table_info(catalog)')}
+    if 'stock' not in columns or not columns['stock'][3]:
+        return
+    cursor.execute('''
+        CREATE TABLE catalog_new (
+            product_name TEXT PRIMARY KEY,
+            price REAL NOT NULL,
+            stock INTEGER,
+            updated_at DATETIME NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT INTO catalog_new SELECT product_name, price, CASE WHEN stock > 0 THEN stock END, updated_at FROM catalog')
+    cursor.execute('DROP TABLE catalog')
+    cursor.execute('ALTER TABLE catalog_new RENAME TO catalog')
+
+def init_catalog():
+    """
+    Cria as tabelas 'catalog', 'catalog_meta' e 'stock_shortfalls' e os triggers que
+    incrementam a versão do catálogo quando um preço muda ou um produto esgota, e baixam
+    o estoque na mesma transação em que os itens de uma compra são gravados.
+
+    O estoque só é controlado depois de definido (set_stock/add_stock); até lá fica NULL.
+    Ele nunca fica negativo: uma venda maior que o estoque zera o produto e a diferença
+    é registrada em 'stock_shortfalls'.
+    Deve ser chamada depois de init_db().
+    """
+    try:
+        conn = get_connection()
+        with db_lock(), conn:
+            cursor = conn.cursor()
+            # recriado abaixo; removido antes para a migração poder recriar a tabela 'catalog'
+            cursor.execute('DROP TRIGGER IF EXISTS trg_catalog_stock')
+            _migrate_untracked_stock(cursor)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS catalog (
+                    product_name TEXT PRIMARY KEY,
+                    price REAL NOT NULL,
+                    stock INTEGER,
+                    updated_at DATETIME NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS catalog_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS stock_shortfalls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    purchase_id INTEGER NOT NULL,
+                    product_name TEXT NOT NULL,
+                    requested INTEGER NOT NULL,
+                    available INTEGER NOT NULL,
+                    timestamp DATETIME NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO catalog_meta (id, version) VALUES (1, 0)')
+
+            for event, timing in (('INSERT', 'INSERT'), ('UPDATE', 'UPDATE OF price'), ('DELETE', 'DELETE')):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_catalog_version_{event.lower()} AFTER {timing} ON catalog
+                    BEGIN
+                        UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+                    END
+                ''')
+            # esgotar ou repor um produto também muda a versão, para a interface sinalizar a falta
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_catalog_version_stock AFTER UPDATE OF stock ON catalog
+                WHEN (NEW.stock IS NOT NULL AND NEW.stock <= 0) != (OLD.stock IS NOT NULL AND OLD.stock <= 0)
+                BEGIN
+                    UPDATE catalog_meta SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER trg_catalog_stock AFTER INSERT ON purchase_items
+                BEGIN
+                    INSERT INTO stock_shortfalls (purchase_id, product_name, requested, available, timestamp)
+                    SELECT NEW.purchase_id, NEW.product_name, NEW.quantity, stock, NEW.timestamp FROM catalog
+                    WHERE product_name = NEW.product_name AND stock IS NOT NULL AND stock < NEW.quantity;
+                    UPDATE catalog SET stock = MAX(stock - NEW.quantity, 0)
+                    WHERE product_name = NEW.product_name AND stock IS NOT NULL;
+                END
+            ''')
+
+            now = datetime.now().isoformat(' ')
+            cursor.executemany('''
+                INSERT OR IGNORE INTO catalog (product_name, price, stock, updated_at) VALUES (?, ?, NULL, ?)
+            ''', [(name, price, now) for name, price in DEFAULT_PRODUCT_PRICES.items()])
+    except Exception as e:
+        print(f"Erro ao inicializar o catálogo: {e}")
+
+def set_price(product_name, price):
+    conn = get_connection()
+    with db_lock(), conn:
+        conn.execute('''
+            INSERT INTO catalog (product_name, price, stock, updated_at) VALUES (?, ?, NULL, ?)
+            ON CONFLICT (product_name) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at
+        ''', (product_name, price, datetime.now().isoformat(' ')))
+
+def set_stock(product_name, quantity):
+    """
+    Define o estoque contado de um produto; quantity=None deixa de controlar o estoque.
+
+    :return: True se o produto está no catálogo.
+    """
+    if quantity is not None and quantity < 0:
+        raise ValueError("O estoque não pode ser negativo.")
+    conn = get_connection()
+    with db_lock(), conn:
+        cursor = conn.execute('UPDATE catalog SET stock = ?, updated_at = ? WHERE product_name = ?', (quantity, datetime.now().isoformat(' '), product_name))
+    return cursor.rowcount > 0
+
+def add_stock(product_name, quantity):
+    """
+    Soma quantity ao estoque (use um valor negativo para retirar), sem deixá-lo negativo.
+    Um produto com estoque não controlado passa a ser controlado a partir de zero.
+    O produto precisa estar no catálogo.
+
+    :return: O novo estoque ou None se o produto não existe.
+    """
+    conn = get_connection()
+    with db_lock(), conn:
+        conn.execute('UPDATE catalog SET stock = MAX(COALESCE(stock, 0) + ?, 0), updated_at = ? WHERE product_name = ?', (quantity, datetime.now().isoformat(' '), product_name))
+        row = conn.execute('SELECT stock FROM catalog WHERE product_name = ?', (product_name,)).fetchone()
+    return row[0] if row else None
+
+def list_catalog():
+    conn = get_connection()
+    with db_lock():
+        return conn.execute('SELECT product_name, price, stock FROM catalog ORDER BY product_name').fetchall()
+
+def list_stock_shortfalls(limit=50):
+    """
+    :return: Vendas mais recentes com mais unidades do que o estoque registrado.
+    """
+    conn = get_connection()
+    with db_lock():
+        return conn.execute('''
+            SELECT timestamp, purchase_id, product_name, requested, available FROM stock_shortfalls
+            ORDER BY id DESC LIMIT ?
+        ''', (limit,)).fetchall()
+
+class ProductCatalog:
+    """
+    Cache em memória dos preços do catálogo. O cache guarda a versão com que foi
+    carregado e só é recarregado quando a versão em 'catalog_meta' muda; com
+    start_auto_refresh() a versão é consultada periodicamente em uma thread própria,
+    então uma troca de preço aparece com o cliente já no carrinho.
+    Os preços também ficam em um array indexado pelo class id do modelo.
+    """
+    def __init__(self, class_names=None):
+        self.version = None
+        self.prices = dict(DEFAULT_PRODUCT_PRICES)
+        # produtos com estoque controlado e zerado
+        self.out_of_stock = frozenset()
+        self.class_names = list(class_names or [])
+        self.price_by_class = np.zeros(len(self.class_names), dtype=np.float64)
+        self._lock = threading.Lock()
+        self._refresh_stop = threading.Event()
+        self._refresh_thread = None
+        self._build_class_prices()
+
+    def set_class_names(self, class_names):
+        with self._lock:
+            self.class_names = list(class_names)
+            self._build_class_prices()
+
+    def _build_class_prices(self):
+        self.price_by_class = np.array([self.prices.get(name, UNKNOWN_PRODUCT_PRICE) for name in self.class_names], dtype=np.float64)
+
+    def refresh(self, force=False):
+        """
+        Recarrega os preços se o catálogo mudou desde a última carga.
+
+        :return: True se o cache foi recarregado.
+        """
+        try:
+            conn = get_connection()
+            with db_lock():
+                version = conn.execute('SELECT version FROM catalog_meta WHERE id = 1').fetchone()[0]
+                if not force and version == self.version:
+                    return False
+                rows = conn.execute('SELECT product_name, price, stock FROM catalog').fetchall()
+        except Exception as e:
+            print(f"Erro ao carregar o catálogo, usando os preços em cache: {e}")
+            return False
+
+        with self._lock:
+            self.prices = {product_name: price for product_name, price, _ in rows}
+            self.out_of_stock = frozenset(product_name for product_name, _, stock in rows if stock is not None and stock <= 0)
+            self.version = version
+            self._build_class_prices()
+        return True
+
+    def start_auto_refresh(self, interval=2.0):
+        """
+        Consulta a versão do catálogo a cada interval segundos, fora da thread da interface.
+        """
+        if self._refresh_thread is not None:
+            return
+        self._refresh_stop.clear()
+
+        def refresh_loop():
+            while not self._refresh_stop.wait(interval):
+                self.refresh()
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name='catalog-refresh', daemon=True)
+        self._refresh_thread.start()
+
+    def stop_auto_refresh(self):
+        if self._refresh_thread is None:
+            return
+        self._refresh_stop.set()
+        self._refresh_thread.join(timeout=2.0)
+        self._refresh_thread = None
+
+    def price(self, product_name):
+        return self.prices.get(product_name, UNKNOWN_PRODUCT_PRICE)
+
+    def total_for_class_counts(self, class_counts):
+        """
+        :param class_counts: Array com a quantidade de cada class id (mesmo tamanho de class_names).
+        """
+        return float(np.dot(class_counts, self.price_by_class))
+
+def _stock_argument(text):
+    return None if text.strip().lower() == 'none' else int(text)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gerencia preços e estoque do catálogo do AI-Totem.')
+    parser.add_argument('--db', default=config_manager.get().database.db_name, help='arquivo do banco de dados (padrão: database.db_name da configuração)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='lista produtos, preços e estoque')
+    subparsers.add_parser('shortfalls', help='lista vendas maiores que o estoque registrado')
+    price_parser = subparsers.add_parser('set-price', help='define o preço de um produto')
+    price_parser.add_argument('product_name')
+    price_parser.add_argument('price', type=float)
+    set_stock_parser = subparsers.add_parser('set-stock', help="define o estoque contado ('none' deixa de controlar)")
+    set_stock_parser.add_argument('product_name')
+    set_stock_parser.add_argument('quantity', type=_stock_argument)
+    stock_parser = subparsers.add_parser('add-stock', help='soma (ou subtrai) unidades ao estoque')
+    stock_parser.add_argument('product_name')
+    stock_parser.add_argument('quantity', type=int)
+    args = parser.parse_args(argv)
+
+    connector.DB_NAME = args.db
+    # sem migrações nem importação do banco legado: o esquema é criado pelo totem ao iniciar
+    try:
+        if args.command in ('list', 'shortfalls'):
+            connector.open_read_only()
+        else:
+            connector.open_existing()
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    missing = connector.missing_tables(CATALOG_TABLES)
+    if missing:
+        raise SystemExit(f"Tabelas do catálogo ausentes ou desatualizadas em '{args.db}': {', '.join(missing)}. Inicie o totem uma vez para criá-las.")
+
+    if args.command == 'list':
+        for product_name, price, stock in list_catalog():
+            print(f"{product_name:<12} R$ {price:>7.2f}  estoque: {'não controlado' if stock is None else stock}")
+    elif args.command == 'shortfalls':
+        for timestamp, purchase_id, product_name, requested, available in list_stock_shortfalls():
+            print(f"{timestamp}  compra #{purchase_id}  {product_name}: vendido {requested}, estoque {available}")
+    elif args.command == 'set-price':
+        set_price(args.product_name, args.price)
+        print(f"Preço de {args.product_name} atualizado para R$ {args.price:.2f}.")
+    elif args.command == 'set-stock':
+        try:
+            found = set_stock(args.product_name, args.quantity)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        if not found:
+            print(f"Produto '{args.product_name}' não está no catálogo.")
+            sys.exit(1)
+        print(f"Estoque de {args.product_name}: {'não controlado' if args.quantity is None else args.quantity}")
+    else:
+        stock = add_stock(args.product_name, args.quantity)
+        if stock is None:
+            print(f"Produto '{args.product_name}' não está no catálogo.")
+            sys.exit(1)
+        print(f"Estoque de {args.product_name}: {stock}")
+
+if __name__ == '__main__':
+    main()
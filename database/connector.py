@@ -1,30 +1,221 @@
 import sqlite3
-import json 
-from datetime import datetime 
+import json
+import os
+import threading
+from datetime import datetime
+from urllib.request import pathname2url
 
 DB_NAME = 'ai_totem.db'
+# banco antigo cujas compras são importadas uma única vez pelo init_db
+LEGACY_DB_NAME = 'ai_totem_OLD.db'
+
+# conexão única e de longa duração, compartilhada entre as threads e protegida pelo lock
+_connection = None
+_connection_lock = threading.RLock()
+# próximo id de compra; os ids são alocados antes do INSERT para que a escrita possa ser adiada
+_next_purchase_id = None
+
+def get_connection():
+    """
+    Retorna a conexão persistente com o banco, abrindo-a no primeiro uso.
+    Quem usar a conexão deve segurar db_lock() enquanto executa comandos.
+    """
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+            # WAL permite leituras concorrentes com a escrita e reduz fsyncs por commit
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            conn.execute('PRAGMA temp_store=MEMORY')
+            conn.execute('PRAGMA cache_size=-8000') # ~8 MB
+            conn.execute('PRAGMA busy_timeout=5000')
+            _connection = conn
+        return _connection
+
+def open_read_only():
+    """
+    Abre a conexão compartilhada somente para leitura (relatórios): nenhuma migração
+    roda e qualquer escrita falha. O banco precisa existir.
+    """
+    global _connection
+    with _connection_lock:
+        if _connection is None:
+            path = os.path.abspath(DB_NAME)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Banco de dados não encontrado: {path}")
+            conn = sqlite3.connect(f'file:{pathname2url(path)}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute('PRAGMA busy_timeout=5000')
+            _connection = conn
+        return _connection
+
+def open_existing():
+    """
+    Abre a conexão compartilhada de um banco que já existe, para leitura e escrita, sem
+    rodar migrações (ferramentas de linha de comando). Ao contrário de get_connection,
+    não cria um arquivo novo.
+    """
+    path = os.path.abspath(DB_NAME)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Banco de dados não encontrado: {path}")
+    return get_connection()
+
+def missing_tables(names):
+    """
+    :return: Os nomes de names que não existem no banco, na mesma ordem.
+    """
+    conn = get_connection()
+    with _connection_lock:
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [name for name in names if name not in existing]
+
+def db_lock():
+    return _connection_lock
+
+def close_db():
+    global _connection, _next_purchase_id
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+        _next_purchase_id = None
+
+def allocate_purchase_id():
+    """
+    Reserva o próximo id da tabela 'purchases' sem inserir a linha.
+    """
+    global _next_purchase_id
+    with _connection_lock:
+        if _next_purchase_id is None:
+            conn = get_connection()
+            max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM purchases').fetchone()[0]
+            sequence = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'purchases'").fetchone()[0]
+            _next_purchase_id = max(max_id, sequence) + 1
+        purchase_id = _next_purchase_id
+        _next_purchase_id += 1
+        return purchase_id
+
+def insert_purchase(cursor, purchase_id, cart_items, total_price, payment_method, timestamp):
+    """
+    Insere a compra e seus itens com um id já alocado. Deve ser chamada dentro de uma transação.
+
+    :return: False se a compra já existia (ex: reaplicada do journal), True caso contrário.
+    """
+    cursor.execute('''
+        INSERT OR IGNORE INTO purchases (id, products_json, total_value, payment_method, timestamp)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (purchase_id, json.dumps(cart_items), total_price, payment_method, timestamp))
+    if cursor.rowcount == 0:
+        return False
+    _insert_purchase_items(cursor, purchase_id, cart_items, timestamp)
+    return True
+
+def _insert_purchase_items(cursor, purchase_id, cart_items, timestamp):
+    cursor.executemany('''
+        INSERT INTO purchase_items (purchase_id, product_name, quantity, timestamp)
+        VALUES (?, ?, ?, ?)
+    ''', [(purchase_id, product_name, quantity, timestamp) for product_name, quantity in cart_items.items()])
+
+def _migration_applied(cursor, migration_name):
+    cursor.execute('SELECT 1 FROM schema_migrations WHERE name = ?', (migration_name,))
+    return cursor.fetchone() is not None
+
+def _mark_migration(cursor, migration_name):
+    cursor.execute('INSERT INTO schema_migrations (name, applied_at) VALUES (?, ?)', (migration_name, datetime.now().isoformat(' ')))
+
+def _migrate_json_purchases(cursor):
+    # preenche purchase_items para compras antigas que só têm o products_json
+    if _migration_applied(cursor, 'purchase_items_from_json'):
+        return 0
+
+    cursor.execute('''
+        SELECT id, products_json, timestamp FROM purchases
+        WHERE NOT EXISTS (SELECT 1 FROM purchase_items WHERE purchase_items.purchase_id = purchases.id)
+    ''')
+    migrated = 0
+    for purchase_id, products_json, timestamp in cursor.fetchall():
+        try:
+            cart_items = json.loads(products_json)
+        except ValueError:
+            print(f"Compra #{purchase_id} com products_json inválido, ignorada na migração.")
+            continue
+        _insert_purchase_items(cursor, purchase_id, cart_items, timestamp)
+        migrated += 1
+    _mark_migration(cursor, 'purchase_items_from_json')
+    return migrated
+
+def _import_legacy_db(cursor, legacy_path):
+    migration_name = f'import:{os.path.basename(legacy_path)}'
+    if _migration_applied(cursor, migration_name):
+        return 0
+
+    legacy_conn = sqlite3.connect(legacy_path)
+    try:
+        has_purchases = legacy_conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'purchases'").fetchone()
+        legacy_rows = legacy_conn.execute('SELECT products_json, total_value, payment_method, timestamp FROM purchases ORDER BY id').fetchall() if has_purchases else []
+    finally:
+        legacy_conn.close()
+
+    # as compras recebem novos ids para não colidir com as do banco atual
+    cursor.executemany('''
+        INSERT INTO purchases (products_json, total_value, payment_method, timestamp)
+        VALUES (?, ?, ?, ?)
+    ''', legacy_rows)
+    _mark_migration(cursor, migration_name)
+    return len(legacy_rows)
 
 def init_db():
     """
-    Inicializa o banco de dados e cria a tabela 'purchases' se ela não existir.
+    Inicializa o banco de dados e cria as tabelas 'purchases' e 'purchase_items' se elas não existirem.
+    Compras antigas (salvas apenas como JSON) e as do banco legado são migradas para 'purchase_items'.
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-       
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS purchases (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                products_json TEXT NOT NULL,
-                total_value REAL NOT NULL,
-                payment_method TEXT NOT NULL,
-                timestamp DATETIME NOT NULL
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        with db_lock(), conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS purchases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    products_json TEXT NOT NULL,
+                    total_value REAL NOT NULL,
+                    payment_method TEXT NOT NULL,
+                    timestamp DATETIME NOT NULL
+                )
+            ''')
+
+            # uma linha por produto da compra, para consultas por produto sem varrer e decodificar o JSON
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS purchase_items (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    purchase_id INTEGER NOT NULL REFERENCES purchases(id) ON DELETE CASCADE,
+                    product_name TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    timestamp DATETIME NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchase_items_product_timestamp ON purchase_items (product_name, timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchase_items_purchase ON purchase_items (purchase_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchases_timestamp ON purchases (timestamp)')
+
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    name TEXT PRIMARY KEY,
+                    applied_at DATETIME NOT NULL
+                )
+            ''')
+
+            # o banco legado é importado antes, para que suas compras também ganhem purchase_items
+            if os.path.exists(LEGACY_DB_NAME) and os.path.abspath(LEGACY_DB_NAME) != os.path.abspath(DB_NAME):
+                imported = _import_legacy_db(cursor, LEGACY_DB_NAME)
+                if imported:
+                    print(f"{imported} compra(s) importada(s) de '{LEGACY_DB_NAME}'.")
+
+            migrated = _migrate_json_purchases(cursor)
+            if migrated:
+                print(f"{migrated} compra(s) migrada(s) para a tabela 'purchase_items'.")
+
         print(f"Banco de dados '{DB_NAME}' inicializado com sucesso.")
     except Exception as e:
         print(f"Erro ao inicializar o banco de dados: {e}")
@@ -39,26 +230,14 @@ def save_purchase(cart_items, total_price, payment_method):
     :return: O ID da compra recém-criada ou None em caso de erro.
     """
     try:
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        
-       
-        products_as_json = json.dumps(cart_items)
-        
-       
-        current_timestamp = datetime.now()
-        
-        
-        cursor.execute('''
-            INSERT INTO purchases (products_json, total_value, payment_method, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (products_as_json, total_price, payment_method, current_timestamp))
-        
-        purchase_id = cursor.lastrowid 
-        
-        conn.commit()
-        conn.close()
-        
+        conn = get_connection()
+
+        current_timestamp = datetime.now().isoformat(' ')
+
+        with db_lock(), conn:
+            purchase_id = allocate_purchase_id()
+            insert_purchase(conn.cursor(), purchase_id, cart_items, total_price, payment_method, current_timestamp)
+
         print(f"Compra #{purchase_id} salva com sucesso!")
         return purchase_id
     except Exception as e:
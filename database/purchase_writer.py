@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from queue import Queue, Empty
+
+from database.connector import DB_NAME, get_connection, db_lock, allocate_purchase_id, insert_purchase
+
+def journal_path_for(db_name):
+    return os.path.splitext(db_name)[0] + '_journal.jsonl'
+
+# journal das compras aceitas e ainda não gravadas no banco; reaplicado no início
+JOURNAL_NAME = journal_path_for(DB_NAME)
+
+class PurchaseWriter:
+    """
+    Grava compras em segundo plano (write-behind). submit() só enfileira a compra e
+    devolve um Future; a thread do writer reserva o id, anota o lote no journal com um
+    único fsync, resolve os Futures com os ids e grava o lote em uma única transação.
+    Nada disso (nem o lock do banco nem o fsync) roda na thread de quem chamou. Se o
+    processo cair antes da gravação, o journal é reaplicado na próxima inicialização.
+    """
+    def __init__(self, journal_path=JOURNAL_NAME, max_batch=32, batch_window=0.05):
+        """
+        :param journal_path: Arquivo JSON Lines usado como journal.
+        :param max_batch: Máximo de compras por transação.
+        :param batch_window: Tempo (s) esperando mais compras antes de gravar o lote.
+        """
+        self.journal_path = journal_path
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+
+        self._queue = Queue()
+        self._journal_lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Condition(self._journal_lock)
+        self._thread = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return
+        replayed = self.replay_journal()
+        if replayed:
+            print(f"{replayed} compra(s) recuperada(s) do journal '{self.journal_path}'.")
+        self.running = True
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Grava o que estiver pendente e encerra a thread.
+        """
+        if not self.running:
+            return
+        self.flush(timeout)
+        self.running = False
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, cart_items, total_price, payment_method):
+        """
+        Aceita uma compra para gravação em segundo plano, sem bloquear.
+
+        :return: concurrent.futures.Future resolvido com o ID da compra quando ela já está
+                 sincronizada no journal, ou com a exceção se não foi possível registrá-la.
+        """
+        future = Future()
+        request = {
+            'cart_items': cart_items,
+            'total_price': total_price,
+            'payment_method': payment_method,
+            'timestamp': datetime.now().isoformat(' '),
+            'future': future,
+        }
+        with self._idle:
+            self._pending += 1
+        self._queue.put(request)
+        return future
+
+    def flush(self, timeout=None):
+        """
+        Bloqueia até que todas as compras aceitas tenham sido gravadas no banco.
+
+        :return: True se não restou nada pendente.
+        """
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _writer_loop(self):
+        while self.running:
+            request = self._queue.get()
+            if request is None:
+                continue
+            batch = [request]
+            try:
+                while len(batch) < self.max_batch:
+                    request = self._queue.get(timeout=self.batch_window)
+                    if request is None:
+                        break
+                    batch.append(request)
+            except Empty:
+                pass
+            entries = self._journal_batch(batch)
+            if entries:
+                self._write_batch(entries)
+
+    def _journal_batch(self, requests):
+        """
+        Reserva os ids e anota o lote no journal com um único fsync; só então resolve os Futures.
+
+        :return: As entradas anotadas, ou [] se o journal não pôde ser gravado.
+        """
+        try:
+            entries = []
+            for request in requests:
+                entry = {key: value for key, value in request.items() if key != 'future'}
+                entry['id'] = allocate_purchase_id()
+                entries.append(entry)
+            lines = ''.join(json.dumps(entry) + '\n' for entry in entries)
+            with self._journal_lock:
+                with open(self.journal_path, 'a', encoding='utf-8') as journal:
+                    journal.write(lines)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+        except Exception as e:
+            print(f"Erro ao registrar as compras no journal: {e}")
+            for request in requests:
+                request['future'].set_exception(e)
+            with self._idle:
+                self._pending -= len(requests)
+                if self._pending == 0:
+                    self._idle.notify_all()
+            return []
+
+        for request, entry in zip(requests, entries):
+            request['future'].set_result(entry['id'])
+        return entries
+
+    def _write_batch(self, batch):
+        try:
+            conn = get_connection()
+            with db_lock(), conn:
+                cursor = conn.cursor()
+                for entry in batch:
+                    insert_purchase(cursor, entry['id'], entry['cart_items'], entry['total_price'], entry['payment_method'], entry['timestamp'])
+            purchase_ids = ', '.join(f"#{entry['id']}" for entry in batch)
+            print(f"{len(batch)} compra(s) gravada(s): {purchase_ids}")
+        except Exception as e:
+            # as compras continuam no journal e serão reaplicadas na próxima inicialização
+            print(f"Erro ao gravar lote de compras: {e}")
+
+        with self._idle:
+            self._pending -= len(batch)
+            if self._pending == 0:
+                # tudo que está no journal já foi gravado (ou falhou e será reaplicado)
+                self._truncate_journal_if_written()
+                self._idle.notify_all()
+
+    def _truncate_journal_if_written(self):
+        # chamado com o lock do journal; só descarta o journal se todas as compras estão no banco
+        try:
+            entries = self._read_journal()
+            if not entries:
+                return
+            ids = [entry['id'] for entry in entries]
+            placeholders = ', '.join('?' for _ in ids)
+            conn = get_connection()
+            with db_lock():
+                stored = conn.execute(f'SELECT COUNT(*) FROM purchases WHERE id IN ({placeholders})', ids).fetchone()[0]
+            if stored == len(set(ids)):
+                open(self.journal_path, 'w').close()
+        except Exception as e:
+            print(f"Erro ao limpar o journal de compras: {e}")
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path, encoding='utf-8') as journal:
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # linha incompleta de uma queda durante a escrita
+                    continue
+        return entries
+
+    def replay_journal(self):
+        """
+        Reaplica no banco as compras do journal que ainda não foram gravadas.
+
+        :return: Quantidade de compras recuperadas.
+        """
+        with self._journal_lock:
+            entries = self._read_journal()
+            if not entries:
+                return 0
+            conn = get_connection()
+            with db_lock(), conn:
+                cursor = conn.cursor()
+                replayed = sum(
+                    insert_purchase(cursor, entry['id'], entry['cart_items'], entry['total_price'], entry['payment_method'], entry['timestamp'])
+                    for entry in entries
+                )
+            open(self.journal_path, 'w').close()
+            return replayed
+
+# instância única usada pela interface
+purchase_writer = PurchaseWriter()
+
+def save_purchase_async(cart_items, total_price, payment_method):
+    """
+    Versão não bloqueante de save_purchase: devolve na hora um Future com o ID da
+    compra e grava no banco em segundo plano.
+    """
+    if not purchase_writer.running:
+        purchase_writer.start()
+    return purchase_writer.submit(cart_items, total_price, payment_method)
@@ -0,0 +1,190 @@
+import argparse
+import csv
+import sys
+from datetime import datetime
+
+from config import config_manager
+from database import connector
+from database.connector import get_connection, db_lock
+
+# tabelas lidas pelos relatórios, criadas por init_db() e init_reports() quando o app inicia
+REPORT_TABLES = ('sales_by_product_hour', 'sales_by_payment_hour')
+
+# agregados por hora mantidos por triggers na mesma transação do INSERT da compra,
+# então um relatório soma no máximo uma linha por hora em vez de varrer o histórico
+HOUR_BUCKET = "strftime('%Y-%m-%d %H:00', NEW.timestamp)"
+
+REPORT_QUERIES = {
+    'products': (
+        ['product_name', 'quantity', 'purchases'],
+        '''
+        SELECT product_name, SUM(quantity), SUM(purchases) FROM sales_by_product_hour
+        WHERE hour >= ? AND hour < ?
+        GROUP BY product_name ORDER BY SUM(quantity) DESC
+        '''
+    ),
+    'hourly': (
+        ['hour', 'purchases', 'revenue'],
+        '''
+        SELECT hour, SUM(purchases), ROUND(SUM(revenue), 2) FROM sales_by_payment_hour
+        WHERE hour >= ? AND hour < ?
+        GROUP BY hour ORDER BY hour
+        '''
+    ),
+    'payment_methods': (
+        ['payment_method', 'purchases', 'revenue'],
+        '''
+        SELECT payment_method, SUM(purchases), ROUND(SUM(revenue), 2) FROM sales_by_payment_hour
+        WHERE hour >= ? AND hour < ?
+        GROUP BY payment_method ORDER BY SUM(revenue) DESC
+        '''
+    ),
+}
+
+def init_reports():
+    """
+    Cria as tabelas de agregados e os triggers que as mantêm atualizadas.
+    Na primeira execução os agregados são reconstruídos a partir do histórico existente.
+    Deve ser chamada depois de init_db().
+    """
+    try:
+        conn = get_connection()
+        with db_lock(), conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sales_by_product_hour (
+                    hour TEXT NOT NULL,
+                    product_name TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    purchases INTEGER NOT NULL,
+                    PRIMARY KEY (hour, product_name)
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sales_by_payment_hour (
+                    hour TEXT NOT NULL,
+                    payment_method TEXT NOT NULL,
+                    purchases INTEGER NOT NULL,
+                    revenue REAL NOT NULL,
+                    PRIMARY KEY (hour, payment_method)
+                )
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_sales_by_product_hour AFTER INSERT ON purchase_items
+                BEGIN
+                    INSERT INTO sales_by_product_hour (hour, product_name, quantity, purchases)
+                    VALUES ({HOUR_BUCKET}, NEW.product_name, NEW.quantity, 1)
+                    ON CONFLICT (hour, product_name) DO UPDATE SET
+                        quantity = quantity + excluded.quantity,
+                        purchases = purchases + 1;
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_sales_by_payment_hour AFTER INSERT ON purchases
+                BEGIN
+                    INSERT INTO sales_by_payment_hour (hour, payment_method, purchases, revenue)
+                    VALUES ({HOUR_BUCKET}, NEW.payment_method, 1, NEW.total_value)
+                    ON CONFLICT (hour, payment_method) DO UPDATE SET
+                        purchases = purchases + 1,
+                        revenue = revenue + excluded.revenue;
+                END
+            ''')
+
+            cursor.execute("SELECT 1 FROM schema_migrations WHERE name = 'sales_aggregates'")
+            if cursor.fetchone() is None:
+                _rebuild_aggregates(cursor)
+                cursor.execute("INSERT INTO schema_migrations (name, applied_at) VALUES ('sales_aggregates', ?)", (datetime.now().isoformat(' '),))
+    except Exception as e:
+        print(f"Erro ao inicializar os relatórios: {e}")
+
+def _rebuild_aggregates(cursor):
+    cursor.execute('DELETE FROM sales_by_product_hour')
+    cursor.execute('DELETE FROM sales_by_payment_hour')
+    cursor.execute('''
+        INSERT INTO sales_by_product_hour (hour, product_name, quantity, purchases)
+        SELECT strftime('%Y-%m-%d %H:00', timestamp), product_name, SUM(quantity), COUNT(*)
+        FROM purchase_items GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO sales_by_payment_hour (hour, payment_method, purchases, revenue)
+        SELECT strftime('%Y-%m-%d %H:00', timestamp), payment_method, COUNT(*), SUM(total_value)
+        FROM purchases GROUP BY 1, 2
+    ''')
+
+def rebuild_aggregates():
+    """
+    Recalcula todos os agregados a partir de 'purchases' e 'purchase_items'
+    (necessário apenas se compras forem apagadas ou editadas manualmente).
+    """
+    conn = get_connection()
+    with db_lock(), conn:
+        _rebuild_aggregates(conn.cursor())
+
+def _hour_bounds(start, end):
+    # os agregados têm granularidade de uma hora: o intervalo é [hora de start, hora de end)
+    def to_bucket(value, default):
+        if value is None:
+            return default
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value.strftime('%Y-%m-%d %H:00')
+    return to_bucket(start, '0000-01-01 00:00'), to_bucket(end, '9999-12-31 23:00')
+
+def get_report(kind, start=None, end=None):
+    """
+    :param kind: 'products', 'hourly' ou 'payment_methods'.
+    :param start: Início do intervalo (datetime ou string ISO), inclusive; None para sem limite.
+    :param end: Fim do intervalo (datetime ou string ISO), exclusivo; None para sem limite.
+    :return: Tupla (colunas, linhas).
+    """
+    columns, query = REPORT_QUERIES[kind]
+    conn = get_connection()
+    with db_lock():
+        rows = conn.execute(query, _hour_bounds(start, end)).fetchall()
+    return columns, rows
+
+def export_csv(kind, output, start=None, end=None):
+    """
+    Escreve o relatório em CSV linha a linha, direto do cursor, sem montar a lista em memória.
+
+    :return: Quantidade de linhas escritas.
+    """
+    columns, query = REPORT_QUERIES[kind]
+    writer = csv.writer(output)
+    writer.writerow(columns)
+    written = 0
+    conn = get_connection()
+    with db_lock():
+        for row in conn.execute(query, _hour_bounds(start, end)):
+            writer.writerow(row)
+            written += 1
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exporta relatórios de vendas do AI-Totem em CSV.')
+    parser.add_argument('report', choices=sorted(REPORT_QUERIES), help='tipo de relatório')
+    parser.add_argument('--start', help="início do intervalo, ex: '2025-06-01' ou '2025-06-01 14:00'")
+    parser.add_argument('--end', help='fim do intervalo (exclusivo)')
+    parser.add_argument('--db', default=config_manager.get().database.db_name, help='arquivo do banco de dados (padrão: database.db_name da configuração)')
+    parser.add_argument('--output', help='arquivo CSV de saída (padrão: stdout)')
+    args = parser.parse_args(argv)
+
+    connector.DB_NAME = args.db
+    # só leitura: o relatório não roda migrações nem cria tabelas no banco do totem
+    try:
+        connector.open_read_only()
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    missing = connector.missing_tables(REPORT_TABLES)
+    if missing:
+        raise SystemExit(f"Tabelas de agregados ausentes em '{args.db}': {', '.join(missing)}. Inicie o totem uma vez para criá-las.")
+
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as output:
+            written = export_csv(args.report, output, args.start, args.end)
+        print(f"{written} linha(s) exportada(s) para '{args.output}'.", file=sys.stderr)
+    else:
+        export_csv(args.report, sys.stdout, args.start, args.end)
+
+if __name__ == '__main__':
+    main()
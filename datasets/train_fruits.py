@@ -1,19 +1,253 @@
-from ultralytics import YOLO
+"""
+Pipeline reprodutível de treino, quantização e promoção do modelo de frutas.
+
+Etapas:
+    1. train     treina o yolov8n com seed fixa e treino determinístico;
+    2. export    exporta o modelo treinado para OpenVINO FP32;
+    3. quantize  quantização INT8 pós-treino (OpenVINO/NNCF) calibrada com o split 'train';
+    4. evaluate  mede mAP e latência de CPU de cada variante no split 'valid';
+    5. promote   copia o candidato para runs/detect/<destino>/weights/ se o mAP ficar dentro
+                 da tolerância em relação ao modelo em produção e a latência de CPU melhorar.
+                 Sem modelo em produção, promove a variante mais rápida dentro da tolerância
+                 em relação ao FP32 (que pode ser o próprio FP32).
+
+O backend exigido pelo modelo promovido (detector.backend / AI_TOTEM_BACKEND) é impresso
+e gravado no relatório: uma variante OpenVINO só é usada com backend 'openvino'.
+
+O relatório de cada execução (configuração, versões e métricas) é gravado em
+runs/detect/<nome>/pipeline_report.json.
+
+Exemplo:
+    python datasets/train_fruits.py --epochs 100 --name fruits_yolo_candidate
+    python datasets/train_fruits.py --weights runs/detect/fruits_yolo_candidate/weights/best.pt --skip-train
+"""
+import argparse
+import json
 import os
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+DATASET_DIR = PROJECT_ROOT / "datasets" / "fruits_yolo"
+RUNS_DIR = PROJECT_ROOT / "runs" / "detect"
+# pasta lida pelo ProductDetector (runs/detect/fruits_yolo_retrain/weights/best.pt)
+PRODUCTION_NAME = "fruits_yolo_retrain"
+SEED = 0
+
+def variant_backend(name):
+    """
+    :return: Backend do ProductDetector que carrega a variante (ex: 'openvino_int8' -> 'openvino').
+    """
+    return name.split('_', 1)[0]
+
+def load_dataset_config():
+    import yaml
+    with open(DATASET_DIR / "data.yaml", encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def write_data_yaml(output_dir, calibration=False):
+    """
+    Gera um data.yaml com caminhos absolutos do dataset local (o data.yaml do Roboflow usa '../').
+    Com calibration=True o split 'val' aponta para 'train': é dele que a quantização INT8
+    tira as imagens de calibração, deixando o 'valid' só para a avaliação.
+    """
+    import yaml
+    config = load_dataset_config()
+    data = {
+        'path': str(DATASET_DIR),
+        'train': 'train/images',
+        'val': 'train/images' if calibration else 'valid/images',
+        'test': 'test/images',
+        'nc': config['nc'],
+        'names': config['names'],
+    }
+    output_dir.mkdir(parents=True, exist_ok=True)
+    path = output_dir / ('calibration.yaml' if calibration else 'data.yaml')
+    path.write_text(yaml.safe_dump(data, sort_keys=False), encoding='utf-8')
+    return path
+
+def train(args, data_yaml):
+    from ultralytics import YOLO
+    model = YOLO(args.base_model)
+    model.train(
+        data=str(data_yaml),
+        epochs=args.epochs,
+        imgsz=args.imgsz,
+        batch=args.batch,
+        project=str(RUNS_DIR),
+        name=args.name,
+        exist_ok=True,
+        seed=SEED,
+        deterministic=True,
+        pretrained=True,
+        save=True,
+    )
+    return RUNS_DIR / args.name / "weights" / "best.pt"
+
+def export(weights, imgsz, calibration_yaml=None):
+    """
+    :param calibration_yaml: Se informado, exporta em INT8 calibrando com o split 'val' deste yaml.
+    :return: Caminho da pasta do modelo OpenVINO exportado.
+    """
+    from ultralytics import YOLO
+    options = {'format': 'openvino', 'imgsz': imgsz, 'dynamic': True}
+    if calibration_yaml:
+        options.update(int8=True, data=str(calibration_yaml))
+    return Path(YOLO(str(weights)).export(**options))
+
+def evaluate(model_path, data_yaml, imgsz):
+    """
+    Avalia no split 'valid' em CPU com lote 1, como o totem roda.
+
+    :return: Dicionário com mAP50, mAP50-95 e latência média (ms) de cada etapa.
+    """
+    from ultralytics import YOLO
+    metrics = YOLO(str(model_path), task='detect').val(data=str(data_yaml), split='val', imgsz=imgsz, batch=1, device='cpu', plots=False, verbose=False)
+    speed = metrics.speed
+    return {
+        'model': str(model_path),
+        'map50': round(float(metrics.box.map50), 4),
+        'map50_95': round(float(metrics.box.map), 4),
+        'latency_ms': round(speed['preprocess'] + speed['inference'] + speed['postprocess'], 2),
+        'inference_ms': round(speed['inference'], 2),
+    }
+
+def select_candidate(results, reference, tolerance, require_faster=True):
+    """
+    Escolhe a variante mais rápida cujo mAP50-95 não caia mais que tolerance (absoluto)
+    em relação ao reference e, com require_faster, cuja latência de CPU seja menor que a dele.
+
+    :param require_faster: False quando o reference é uma das próprias variantes (não há
+                           modelo em produção): ela mesma pode ser a escolhida.
+    :return: Tupla (variante escolhida ou None, lista de motivos de rejeição).
+    """
+    rejected = []
+    accepted = []
+    for name, result in results.items():
+        if result['map50_95'] < reference['map50_95'] - tolerance:
+            rejected.append(f"{name}: mAP50-95 {result['map50_95']} < {reference['map50_95']} - {tolerance}")
+        elif require_faster and result['latency_ms'] >= reference['latency_ms']:
+            rejected.append(f"{name}: latência {result['latency_ms']} ms >= {reference['latency_ms']} ms")
+        else:
+            accepted.append(name)
+    if not accepted:
+        return None, rejected
+    return min(accepted, key=lambda name: results[name]['latency_ms']), rejected
+
+def promote(weights, openvino_dir, destination):
+    """
+    Copia o best.pt e o export OpenVINO escolhido para a pasta lida pelo ProductDetector.
+    O export é gravado com o nome que o backend 'openvino' procura e depois do .pt,
+    para ser considerado atualizado e não ser exportado de novo.
+    """
+    weights_dir = RUNS_DIR / destination / "weights"
+    weights_dir.mkdir(parents=True, exist_ok=True)
+    target = weights_dir / "best.pt"
+    # --weights pode ser o próprio modelo em produção: só o export é atualizado
+    if not (target.exists() and target.samefile(weights)):
+        if target.exists():
+            shutil.copy2(target, weights_dir / "previous_best.pt")
+        shutil.copyfile(weights, target)
+
+    target_openvino = weights_dir / "best_openvino_model"
+    if target_openvino.exists():
+        shutil.rmtree(target_openvino)
+    if openvino_dir is not None:
+        shutil.copytree(openvino_dir, target_openvino)
+        # copytree preserva a data do export original; precisa ficar mais novo que o best.pt copiado
+        os.utime(target_openvino)
+    return target
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Treina, quantiza, avalia e promove o modelo de frutas.')
+    parser.add_argument('--base-model', default='yolov8n.pt')
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--batch', type=int, default=8)
+    parser.add_argument('--name', default='fruits_yolo_candidate', help='pasta do treino em runs/detect')
+    parser.add_argument('--weights', help='best.pt já treinado (usado com --skip-train)')
+    parser.add_argument('--skip-train', action='store_true')
+    parser.add_argument('--skip-quantize', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.01, help='queda máxima de mAP50-95 (absoluta) aceita')
+    parser.add_argument('--destination', default=PRODUCTION_NAME, help='pasta em runs/detect que recebe o modelo promovido')
+    parser.add_argument('--no-promote', action='store_true', help='só avalia, sem copiar o modelo')
+    args = parser.parse_args(argv)
+
+    import ultralytics
+    run_dir = RUNS_DIR / args.name
+    data_yaml = write_data_yaml(run_dir)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': vars(args),
+        'seed': SEED,
+        'versions': {'python': platform.python_version(), 'ultralytics': ultralytics.__version__},
+        'stages': {},
+    }
+
+    stage_start = time.perf_counter()
+    if args.skip_train:
+        if not args.weights:
+            parser.error('--skip-train exige --weights')
+        weights = Path(args.weights)
+    else:
+        weights = train(args, data_yaml)
+    report['stages']['train_s'] = round(time.perf_counter() - stage_start, 1)
+    print(f"Modelo treinado: {weights}")
+
+    stage_start = time.perf_counter()
+    variants = {'pytorch_fp32': weights, 'openvino_fp32': export(weights, args.imgsz)}
+    report['stages']['export_s'] = round(time.perf_counter() - stage_start, 1)
+
+    if not args.skip_quantize:
+        stage_start = time.perf_counter()
+        calibration_yaml = write_data_yaml(run_dir, calibration=True)
+        variants['openvino_int8'] = export(weights, args.imgsz, calibration_yaml)
+        report['stages']['quantize_s'] = round(time.perf_counter() - stage_start, 1)
+
+    stage_start = time.perf_counter()
+    results = {name: evaluate(path, data_yaml, args.imgsz) for name, path in variants.items()}
+    production_weights = RUNS_DIR / args.destination / "weights" / "best.pt"
+    has_production = production_weights.exists() and production_weights.resolve() != weights.resolve()
+    if has_production:
+        reference = evaluate(production_weights, data_yaml, args.imgsz)
+        reference_name = 'production'
+    else:
+        # sem modelo em produção, as variantes são comparadas ao próprio FP32, que também é candidato
+        reference = results['pytorch_fp32']
+        reference_name = 'pytorch_fp32'
+    report['stages']['evaluate_s'] = round(time.perf_counter() - stage_start, 1)
+    report['reference'] = dict(reference, name=reference_name)
+    report['results'] = results
+
+    for name, result in ([(reference_name, reference)] if has_production else []) + list(results.items()):
+        print(f"{name:<14} mAP50 {result['map50']:.4f}  mAP50-95 {result['map50_95']:.4f}  latência {result['latency_ms']:.1f} ms")
+
+    chosen, rejected = select_candidate(results, reference, args.tolerance, require_faster=has_production)
+    for reason in rejected:
+        print(f"❌ Rejeitado: {reason}")
+    report['chosen'] = chosen
+    report['backend'] = variant_backend(chosen) if chosen else None
+    report['promoted'] = False
+
+    if chosen and not args.no_promote:
+        openvino_dir = variants[chosen] if report['backend'] == 'openvino' else None
+        target = promote(weights, openvino_dir, args.destination)
+        report['promoted'] = True
+        print(f"✅ {chosen} promovido para {target}")
+        print(f"   Backend exigido: {report['backend']} (detector.backend na configuração ou AI_TOTEM_BACKEND={report['backend']})")
+    elif chosen:
+        print(f"✅ {chosen} aprovado (não promovido: --no-promote; backend exigido: {report['backend']})")
+    else:
+        print("Nenhuma variante aprovada; o modelo em produção foi mantido.")
+
+    report_path = run_dir / "pipeline_report.json"
+    report_path.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str) + '\n', encoding='utf-8')
+    print(f"Relatório salvo em: {report_path}")
+    return 0 if chosen else 1
 
-# 1. Carregar modelo base
-model = YOLO('yolov8n.pt') 
-
-# 2. Treinar com o dataset
-results = model.train(
-    data=os.path.join(r'C:\Users\User\Desktop\AI-Totem\datasets', r'C:\Users\User\Desktop\AI-Totem\datasets\fruits_yolo', r'C:\Users\User\Desktop\AI-Totem\datasets\fruits_yolo\data.yaml'),
-    epochs=100,
-    imgsz=640,
-    batch=8,
-    name='fruits_yolo',
-    save=True,
-    pretrained=True
-)
-
-# 3. Exportar modelo treinado
-model.export(format='onnx')  # Opcional para melhor performance
\ No newline at end of file
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,15 +6,40 @@ project_root = os.path.abspath(os.path.dirname(__file__))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from database.connector import init_db
+# importado primeiro: marca o início do processo para as métricas de inicialização
+from vision.pipeline_stats import pipeline_stats
+from config import config_manager
+from database import connector
+from database.connector import init_db, close_db
+from database.purchase_writer import purchase_writer, journal_path_for
+from database.audit_snapshots import audit_snapshots, snapshot_dir_for
+from database.reports import init_reports
+from database.catalog import init_catalog
 from ui.interface import AITotemApp
 
 
 def main():
-    
+    # o arquivo do banco vem da configuração (database.db_name); o journal fica ao lado dele
+    config = config_manager.get()
+    db_name = config.database.db_name
+    connector.DB_NAME = db_name
+    purchase_writer.journal_path = journal_path_for(db_name)
+    # os snapshots de auditoria também ficam ao lado do banco
+    audit_snapshots.configure(config.audit, snapshot_dir_for(db_name))
+
     init_db()
+    init_reports()
+    init_catalog()
+    pipeline_stats.mark_startup('database_ready')
+    # reaplica o journal de compras antes de qualquer novo id ser reservado
+    purchase_writer.start()
     
-    AITotemApp().run()
+    try:
+        AITotemApp().run()
+    finally:
+        purchase_writer.stop()
+        audit_snapshots.stop()
+        close_db()
 
 if __name__ == '__main__':
     main()
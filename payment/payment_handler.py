@@ -0,0 +1,294 @@
+"""
+Pagamentos assíncronos: um loop asyncio em thread própria atende todos os pagamentos
+em andamento (de um ou vários caixas) sem bloquear o loop do Kivy.
+
+Cada método de pagamento é atendido por um PaymentProvider. O handler cria o pagamento
+no provedor e consulta o status periodicamente, com timeout por requisição, novas
+tentativas com backoff, prazo total e cancelamento. A criação do pagamento leva uma
+chave de idempotência: repetir a chamada depois de um timeout devolve o mesmo
+pagamento em vez de cobrar o cliente duas vezes. O SimulatedTerminalProvider
+imita uma maquininha/PIX local com latência e taxa de falhas configuráveis.
+
+Exemplo (teste de carga com o simulador):
+    python -m payment.payment_handler --payments 500 --failure-rate 0.1 --latency-ms 50
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+import numpy as np
+
+# status finais e intermediários de um pagamento
+PENDING = 'pending'
+APPROVED = 'approved'
+DECLINED = 'declined'
+FAILED = 'failed'
+TIMEOUT = 'timeout'
+CANCELLED = 'cancelled'
+FINAL_STATUSES = (APPROVED, DECLINED, FAILED, TIMEOUT, CANCELLED)
+
+PaymentResult = namedtuple('PaymentResult', ['payment_id', 'method', 'amount', 'status', 'message', 'elapsed'])
+
+class PaymentProviderError(Exception):
+    """Falha transitória na comunicação com o provedor; a operação pode ser repetida."""
+
+class PaymentProvider:
+    """
+    Interface de um provedor de pagamento. Todos os métodos são corrotinas
+    executadas no loop do PaymentHandler.
+    """
+    async def create_payment(self, amount, method, idempotency_key):
+        """
+        :param idempotency_key: Chave única do pagamento; chamadas repetidas com a mesma
+                                chave devem devolver o pagamento já criado, sem cobrar de novo.
+        :return: Identificador do pagamento no provedor.
+        """
+        raise NotImplementedError
+
+    async def get_status(self, payment_id):
+        """:return: Um dos status deste módulo (PENDING, APPROVED, DECLINED...)."""
+        raise NotImplementedError
+
+    async def cancel_payment(self, payment_id):
+        """
+        Cancela um pagamento ainda pendente. Um pagamento já concluído (por exemplo,
+        aprovado) não é cancelado; quem chama deve consultar o status em seguida.
+        """
+        raise NotImplementedError
+
+class SimulatedTerminalProvider(PaymentProvider):
+    """
+    Terminal local simulado: cada chamada demora latency segundos (com jitter) e falha
+    com probabilidade failure_rate; o pagamento é aprovado (ou recusado, com
+    probabilidade decline_rate) após um tempo sorteado em approval_delay.
+    """
+    def __init__(self, latency=0.05, failure_rate=0.0, approval_delay=(2.0, 5.0), decline_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.approval_delay = approval_delay
+        self.decline_rate = decline_rate
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._payments = {}
+        self._payment_by_key = {}
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency * self._random.uniform(0.5, 1.5))
+        if self._random.random() < self.failure_rate:
+            raise PaymentProviderError("Terminal simulado não respondeu.")
+
+    async def create_payment(self, amount, method, idempotency_key):
+        await self._round_trip()
+        if idempotency_key in self._payment_by_key:
+            return self._payment_by_key[idempotency_key]
+        payment_id = self._payment_by_key[idempotency_key] = f'SIM-{next(self._ids)}'
+        ready_at = time.monotonic() + self._random.uniform(*self.approval_delay)
+        final_status = DECLINED if self._random.random() < self.decline_rate else APPROVED
+        self._payments[payment_id] = [ready_at, final_status]
+        return payment_id
+
+    async def get_status(self, payment_id):
+        await self._round_trip()
+        ready_at, final_status = self._payments[payment_id]
+        return final_status if time.monotonic() >= ready_at else PENDING
+
+    async def cancel_payment(self, payment_id):
+        await self._round_trip()
+        payment = self._payments.get(payment_id)
+        # como a maquininha de verdade, não desfaz um pagamento que já foi concluído
+        if payment is not None and time.monotonic() < payment[0]:
+            payment[:] = [time.monotonic(), CANCELLED]
+
+class PaymentHandler:
+    """
+    Executa os pagamentos em um loop asyncio próprio. submit() pode ser chamado de
+    qualquer thread e devolve um concurrent.futures.Future com o PaymentResult;
+    future.cancel() cancela o pagamento também no provedor.
+    """
+    def __init__(self, providers, poll_interval=0.5, timeout=120.0, request_timeout=3.0, max_retries=3, retry_backoff=0.2):
+        """
+        :param providers: Dicionário {método de pagamento: PaymentProvider}.
+        :param poll_interval: Intervalo (s) entre consultas de status.
+        :param timeout: Prazo total (s) para o pagamento ser concluído.
+        :param request_timeout: Tempo máximo (s) de cada chamada ao provedor.
+        :param max_retries: Novas tentativas de uma chamada que falhou ou estourou o tempo.
+        :param retry_backoff: Espera (s) antes da primeira nova tentativa; dobra a cada tentativa.
+        """
+        self.providers = providers
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.loop = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        self._thread = threading.Thread(target=run_loop, name='payment-handler', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        async def cancel_pending():
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_pending(), self.loop).result(timeout=5.0)
+        except concurrent.futures.TimeoutError:
+            # cancelamentos no provedor ainda em novas tentativas: não segura o encerramento do app
+            print("Aviso: pagamentos em andamento não terminaram de cancelar no provedor.")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5.0)
+        if not self._thread.is_alive():
+            self.loop.close()
+        self._thread = None
+        self.loop = None
+
+    def submit(self, amount, method, on_status=None):
+        """
+        :param on_status: Chamado (na thread do handler) a cada mudança de status, com (status, mensagem).
+        :return: concurrent.futures.Future com o PaymentResult.
+        """
+        if self.loop is None:
+            raise RuntimeError("PaymentHandler não foi iniciado.")
+        return asyncio.run_coroutine_threadsafe(self.process_payment(amount, method, on_status), self.loop)
+
+    async def _call(self, operation, *args):
+        # timeout por chamada e novas tentativas com backoff exponencial para falhas transitórias
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await asyncio.wait_for(operation(*args), self.request_timeout)
+            except (PaymentProviderError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise PaymentProviderError(f"{operation.__name__} falhou após {attempt + 1} tentativas: {str(e) or 'timeout'}")
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def process_payment(self, amount, method, on_status=None):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        provider = self.providers.get(method)
+
+        def finish(payment_id, status, message):
+            if on_status:
+                on_status(status, message)
+            return PaymentResult(payment_id, method, amount, status, message, time.monotonic() - start)
+
+        if provider is None:
+            return finish(None, FAILED, f"Método de pagamento não suportado: {method}")
+
+        try:
+            # a mesma chave em todas as tentativas: um timeout depois de o provedor criar o pagamento não gera uma segunda cobrança
+            payment_id = await self._call(provider.create_payment, amount, method, uuid.uuid4().hex)
+        except PaymentProviderError as e:
+            return finish(None, FAILED, str(e))
+        if on_status:
+            on_status(PENDING, "Awaiting payment...")
+
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(min(self.poll_interval, max(deadline - time.monotonic(), 0)))
+                try:
+                    status = await self._call(provider.get_status, payment_id)
+                except PaymentProviderError as e:
+                    # o cliente pode já ter pago: continua consultando até o prazo total
+                    print(f"Erro ao consultar o pagamento {payment_id}: {e}")
+                    continue
+                if status in FINAL_STATUSES:
+                    return finish(payment_id, status, 'Payment approved!' if status == APPROVED else f'Payment {status}.')
+        except asyncio.CancelledError:
+            # o cliente pode ter pago enquanto a consulta estava em andamento: uma aprovação nunca é descartada
+            if await self._cancel_quietly(provider, payment_id) == APPROVED:
+                return finish(payment_id, APPROVED, 'Payment approved!')
+            if on_status:
+                on_status(CANCELLED, "Payment cancelled.")
+            raise
+
+        if await self._cancel_quietly(provider, payment_id) == APPROVED:
+            return finish(payment_id, APPROVED, 'Payment approved!')
+        return finish(payment_id, TIMEOUT, "Payment timed out.")
+
+    async def _cancel_quietly(self, provider, payment_id):
+        """
+        Cancela o pagamento no provedor e relê o status, porque o cancelamento não desfaz
+        um pagamento já concluído.
+
+        :return: Status do pagamento depois do cancelamento, ou None se não foi possível consultá-lo.
+        """
+        try:
+            await self._call(provider.cancel_payment, payment_id)
+        except Exception as e:
+            print(f"Erro ao cancelar o pagamento {payment_id}: {e}")
+        try:
+            return await self._call(provider.get_status, payment_id)
+        except Exception as e:
+            print(f"Erro ao consultar o pagamento {payment_id} após o cancelamento: {e}")
+            return None
+
+def run_load_test(payments, latency, failure_rate, approval_delay, decline_rate, timeout):
+    """
+    Dispara payments pagamentos simultâneos no simulador e resume os resultados.
+    """
+    provider = SimulatedTerminalProvider(latency=latency, failure_rate=failure_rate, approval_delay=approval_delay, decline_rate=decline_rate, seed=0)
+    handler = PaymentHandler({'Simulated': provider}, poll_interval=0.2, timeout=timeout)
+    handler.start()
+    try:
+        start = time.perf_counter()
+        futures = [handler.submit(10.0, 'Simulated') for _ in range(payments)]
+        results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+    finally:
+        handler.stop()
+
+    statuses = {}
+    for result in results:
+        statuses[result.status] = statuses.get(result.status, 0) + 1
+    durations = np.array([result.elapsed for result in results])
+    return {
+        'payments': payments,
+        'wall_time_s': round(elapsed, 2),
+        'statuses': statuses,
+        'duration_s': {
+            'p50': round(float(np.percentile(durations, 50)), 3),
+            'p95': round(float(np.percentile(durations, 95)), 3),
+            'max': round(float(durations.max()), 3),
+        },
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do PaymentHandler com o terminal simulado.')
+    parser.add_argument('--payments', type=int, default=100, help='pagamentos simultâneos')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='latência de cada chamada ao terminal')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='probabilidade de uma chamada falhar')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='probabilidade de um pagamento ser recusado')
+    parser.add_argument('--approval-delay', type=float, nargs=2, default=(0.5, 2.0), metavar=('MIN', 'MAX'), help='tempo (s) até o pagamento ser concluído')
+    parser.add_argument('--timeout', type=float, default=30.0, help='prazo total de cada pagamento')
+    args = parser.parse_args(argv)
+
+    summary = run_load_test(args.payments, args.latency_ms / 1000, args.failure_rate, tuple(args.approval_delay), args.decline_rate, args.timeout)
+    print(f"{summary['payments']} pagamentos em {summary['wall_time_s']}s: {summary['statuses']}")
+    print(f"duração p50 {summary['duration_s']['p50']}s / p95 {summary['duration_s']['p95']}s / máx {summary['duration_s']['max']}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""
+Benchmark headless do ProductDetector sobre o split de teste do dataset.
+
+Mede o tempo de warm-up, a latência (p50/p95/p99), a vazão e o mAP calculado a partir
+dos labels, e grava o resultado em JSON para comparar execuções. A latência é medida
+com a confiança usada no totem (--conf); o mAP vem de uma segunda passada com
+confiança ACCURACY_CONF, como na validação do ultralytics, para não cortar a curva
+precisão x recall no limiar de produção.
+
+Exemplo:
+    python tests/benchmark.py --backend pytorch --imgsz 416 --threads 4 --output bench_pt_416.json
+    python tests/benchmark.py --backend onnx --imgsz 416 --output bench_onnx_416.json
+    python tests/benchmark.py --backend onnx --compare bench_onnx_416.json
+    python tests/benchmark.py --backend onnx --tiles 2,2 --compare bench_onnx_416.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+DATASET_DIR = PROJECT_ROOT / "datasets" / "fruits_yolo"
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+# limiares de IoU do mAP50-95 (padrão COCO)
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+# confiança da passada de acurácia (mAP)
+ACCURACY_CONF = 0.001
+# o ultralytics cria as sessões do ONNX Runtime e do OpenVINO sem expor o número de threads
+THREAD_BACKENDS = ('pytorch',)
+
+def load_class_names(data_yaml):
+    import yaml
+    with open(data_yaml, encoding='utf-8') as f:
+        return yaml.safe_load(f)['names']
+
+def load_labels(label_path, width, height):
+    """
+    Lê um label YOLO (caixa 'classe cx cy w h' ou polígono 'classe x1 y1 x2 y2 ...',
+    normalizados) e devolve as caixas em pixels.
+
+    :return: Tupla (array de class ids, array (N, 4) com x1, y1, x2, y2).
+    """
+    classes, boxes = [], []
+    if label_path.exists():
+        for line in label_path.read_text().splitlines():
+            values = line.split()
+            if len(values) < 5:
+                continue
+            coords = np.array(values[1:], dtype=np.float64)
+            if len(coords) == 4:
+                cx, cy, w, h = coords
+                box = [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+            else:
+                # polígono de segmentação: usa a caixa que o envolve
+                xs, ys = coords[0::2], coords[1::2]
+                box = [xs.min(), ys.min(), xs.max(), ys.max()]
+            classes.append(int(values[0]))
+            boxes.append(np.array(box) * [width, height, width, height])
+    return np.array(classes, dtype=int), np.array(boxes, dtype=np.float64).reshape(-1, 4)
+
+def box_iou(boxes_a, boxes_b):
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+def match_predictions(pred_classes, pred_boxes, pred_confs, gt_classes, gt_boxes):
+    """
+    :return: Array booleano (N_pred, len(IOU_THRESHOLDS)) indicando verdadeiros positivos.
+    """
+    correct = np.zeros((len(pred_classes), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(pred_classes) or not len(gt_classes):
+        return correct
+    ious = box_iou(pred_boxes, gt_boxes)
+    ious[pred_classes[:, None] != gt_classes[None, :]] = 0.0
+    order = np.argsort(-pred_confs)
+    for t, threshold in enumerate(IOU_THRESHOLDS):
+        matched_gt = set()
+        for pred_index in order:
+            candidates = np.where(ious[pred_index] >= threshold)[0]
+            candidates = [gt_index for gt_index in candidates[np.argsort(-ious[pred_index, candidates])] if gt_index not in matched_gt]
+            if candidates:
+                matched_gt.add(candidates[0])
+                correct[pred_index, t] = True
+    return correct
+
+def average_precision(recall, precision):
+    # interpolação de 101 pontos (COCO)
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    return float(np.mean(np.interp(points, recall, precision)))
+
+def compute_map(records, num_classes):
+    """
+    :param records: Lista de tuplas (correct, confs, pred_classes, gt_classes) por imagem.
+    :return: Tupla (mAP50, mAP50-95, AP50 por classe).
+    """
+    correct = np.concatenate([r[0] for r in records]) if records else np.zeros((0, len(IOU_THRESHOLDS)), dtype=bool)
+    confs = np.concatenate([r[1] for r in records]) if records else np.zeros(0)
+    pred_classes = np.concatenate([r[2] for r in records]) if records else np.zeros(0, dtype=int)
+    gt_classes = np.concatenate([r[3] for r in records]) if records else np.zeros(0, dtype=int)
+
+    order = np.argsort(-confs)
+    correct, pred_classes = correct[order], pred_classes[order]
+    ap = np.zeros((num_classes, len(IOU_THRESHOLDS)))
+    present = np.zeros(num_classes, dtype=bool)
+    for cls in range(num_classes):
+        n_gt = int((gt_classes == cls).sum())
+        if n_gt == 0:
+            continue
+        present[cls] = True
+        cls_correct = correct[pred_classes == cls]
+        if not len(cls_correct):
+            continue
+        true_positives = np.cumsum(cls_correct, axis=0)
+        false_positives = np.cumsum(~cls_correct, axis=0)
+        for t in range(len(IOU_THRESHOLDS)):
+            recall = true_positives[:, t] / n_gt
+            precision = true_positives[:, t] / (true_positives[:, t] + false_positives[:, t])
+            ap[cls, t] = average_precision(recall, precision)
+    if not present.any():
+        return 0.0, 0.0, {}
+    return float(ap[present, 0].mean()), float(ap[present].mean()), {cls: float(ap[cls, 0]) for cls in np.where(present)[0]}
+
+def set_thread_count(threads):
+    # precisa ser feito antes de importar torch/onnxruntime/openvino
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+
+def run_pass(detector, images, batch_size):
+    """
+    :return: Tupla (caixas por imagem, latência por imagem em segundos, tempo total em segundos).
+    """
+    latencies = []
+    predictions = []
+    total_start = time.perf_counter()
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        batch_start = time.perf_counter()
+        if batch_size == 1:
+            results = [detector.detect_products_array(batch[0])]
+        else:
+            results = detector.detect_products_array_batch(batch)
+        elapsed = time.perf_counter() - batch_start
+        latencies.extend([elapsed / len(batch)] * len(batch))
+        predictions.extend(results)
+    return predictions, latencies, time.perf_counter() - total_start
+
+def run_benchmark(args):
+    import cv2
+    if args.threads:
+        set_thread_count(args.threads)
+    from vision.product_detector import DEFAULT_CONF, ProductDetector
+    if args.conf is None:
+        args.conf = DEFAULT_CONF
+    if args.threads and args.backend == 'pytorch':
+        import torch
+        torch.set_num_threads(args.threads)
+
+    split_dir = DATASET_DIR / args.split
+    image_paths = sorted(p for p in (split_dir / "images").iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if args.limit:
+        image_paths = image_paths[:args.limit]
+
+    # as imagens são lidas antes para que o disco não entre na medição
+    images = []
+    readable_paths = []
+    for path in image_paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            print(f"Aviso: imagem ilegível ignorada: {path}", file=sys.stderr)
+            continue
+        images.append(image)
+        readable_paths.append(path)
+    image_paths = readable_paths
+    if not image_paths:
+        raise SystemExit(f"Nenhuma imagem legível encontrada em {split_dir / 'images'}")
+    dataset_names = load_class_names(DATASET_DIR / "data.yaml")
+
+    load_start = time.perf_counter()
+    detector = ProductDetector(backend=args.backend, batch_size=args.batch_size, imgsz=args.imgsz, model_path=args.model, conf=args.conf, tiles=args.tiles)
+    load_time = time.perf_counter() - load_start
+    # as classes são comparadas pelo nome, caso a ordem do modelo difira do data.yaml
+    model_to_dataset = {i: dataset_names.index(name) if name in dataset_names else -1 for i, name in enumerate(detector.class_names)}
+
+    warmup_start = time.perf_counter()
+    for i in range(args.warmup):
+        detector.detect_products_array(images[i % len(images)])
+    warmup_time = time.perf_counter() - warmup_start
+
+    # latência e vazão com o limiar de produção: menos caixas, menos pós-processamento
+    _, latencies, total_time = run_pass(detector, images, args.batch_size)
+    # acurácia com limiar baixo: o mAP integra a curva inteira de precisão x recall
+    detector.conf = ACCURACY_CONF
+    predictions, _, _ = run_pass(detector, images, args.batch_size)
+
+    records = []
+    for image, image_path, boxes in zip(images, image_paths, predictions):
+        height, width = image.shape[:2]
+        gt_classes, gt_boxes = load_labels(split_dir / "labels" / f"{image_path.stem}.txt", width, height)
+        pred_classes = np.array([model_to_dataset.get(int(c), -1) for c in boxes[:, 5]], dtype=int)
+        correct = match_predictions(pred_classes, boxes[:, :4].astype(np.float64), boxes[:, 4], gt_classes, gt_boxes)
+        records.append((correct, boxes[:, 4], pred_classes, gt_classes))
+    map50, map50_95, per_class = compute_map(records, len(dataset_names))
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'backend': detector.backend,
+            'model': str(detector.model_path),
+            'imgsz': args.imgsz,
+            'threads': args.threads,
+            'conf': args.conf,
+            'accuracy_conf': ACCURACY_CONF,
+            'batch_size': args.batch_size,
+            'tiles': args.tiles,
+            'split': args.split,
+            'images': len(images),
+        },
+        'platform': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count(),
+        },
+        'load_time_s': round(load_time, 3),
+        'warmup_time_s': round(warmup_time, 3),
+        'latency_ms': {
+            'mean': round(float(latencies_ms.mean()), 2),
+            'p50': round(float(np.percentile(latencies_ms, 50)), 2),
+            'p95': round(float(np.percentile(latencies_ms, 95)), 2),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 2),
+        },
+        'throughput_fps': round(len(images) / total_time, 2),
+        'map50': round(map50, 4),
+        'map50_95': round(map50_95, 4),
+        'ap50_per_class': {dataset_names[cls]: round(ap, 4) for cls, ap in per_class.items()},
+    }
+
+def compare_results(current, baseline, tolerance):
+    """
+    :return: Lista de regressões (latência p95 ou vazão piores, ou mAP menor que o baseline além da tolerância).
+    """
+    regressions = []
+    if current['latency_ms']['p95'] > baseline['latency_ms']['p95'] * (1 + tolerance):
+        regressions.append(f"latência p95 {current['latency_ms']['p95']} ms > baseline {baseline['latency_ms']['p95']} ms")
+    if current['throughput_fps'] < baseline['throughput_fps'] * (1 - tolerance):
+        regressions.append(f"vazão {current['throughput_fps']} fps < baseline {baseline['throughput_fps']} fps")
+    for metric in ('map50', 'map50_95'):
+        if current[metric] < baseline[metric] - tolerance * baseline[metric]:
+            regressions.append(f"{metric} {current[metric]} < baseline {baseline[metric]}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark headless do ProductDetector.')
+    parser.add_argument('--backend', default='pytorch', choices=['pytorch', 'onnx', 'openvino'])
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--threads', type=int, default=0, help='threads de CPU (0 = padrão da biblioteca); só no backend pytorch')
+    parser.add_argument('--conf', type=float, help='confiança da passada de latência (padrão: DEFAULT_CONF do detector, a do totem)')
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--tiles', type=lambda text: tuple(int(value) for value in text.split(',')), help="modo em tiles: grade 'colunas,linhas' (ex: 2,2)")
+    parser.add_argument('--model', help='caminho do modelo (padrão: o mesmo usado pelo totem)')
+    parser.add_argument('--split', default='test', choices=['train', 'valid', 'test'])
+    parser.add_argument('--warmup', type=int, default=3, help='inferências de aquecimento fora da medição')
+    parser.add_argument('--limit', type=int, default=0, help='usa apenas as N primeiras imagens')
+    parser.add_argument('--output', help='arquivo JSON de saída (padrão: stdout)')
+    parser.add_argument('--compare', help='JSON de uma execução anterior para detectar regressões')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='tolerância relativa na comparação')
+    args = parser.parse_args(argv)
+    if args.threads and args.backend not in THREAD_BACKENDS:
+        parser.error(f"--threads não é suportado no backend '{args.backend}': o ultralytics não repassa o número de threads à sessão")
+
+    results = run_benchmark(args)
+    report = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(report + '\n', encoding='utf-8')
+        print(f"Resultados salvos em: {args.output}")
+    else:
+        print(report)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        regressions = compare_results(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"❌ Regressão: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Nenhuma regressão em relação ao baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Teste de carga headless do pipeline captura → detecção → carrinho, sem Kivy e sem webcam.
+
+A fonte de frames pode ser 'synthetic', um vídeo ou um diretório de imagens (ver
+vision.frame_sources). Para cada taxa pedida o driver mede a latência entre a captura
+do frame e a atualização do carrinho e quantos frames o pipeline conseguiu processar.
+A maior taxa sustentável é a maior em que nenhum frame ficou para trás (dentro da
+tolerância) e a latência p95 coube no orçamento.
+
+Exemplo:
+    python tests/load_test.py --source datasets/fruits_yolo/test/images --fps 5,10,20,30 --duration 10
+    python tests/load_test.py --source synthetic --fps 0 --backend onnx --imgsz 416
+    python tests/load_test.py --source datasets/fruits_yolo/test/images --fps 10 --tiles 2,2
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from queue import Empty
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from database.catalog import ProductCatalog
+from vision.camera_handler import CameraHandler
+from vision.frame_sources import parse_source
+from vision.motion_detector import MotionDetector
+from vision.tracker import ProductTracker
+from vision.vision_worker import VisionWorker
+
+def create_detector(args):
+    if args.server:
+        from vision.inference_server import InferenceClient, parse_address
+        return InferenceClient(parse_address(args.server))
+    if args.workers:
+        from vision.process_pool import ProcessPoolDetector
+        return ProcessPoolDetector(num_workers=args.workers, backend=args.backend, imgsz=args.imgsz, tiles=args.tiles)
+    from vision.product_detector import ProductDetector
+    return ProductDetector(backend=args.backend, imgsz=args.imgsz, tiles=args.tiles)
+
+def run_load(detector, source, fps, duration, motion_gating=True):
+    """
+    Roda o mesmo caminho da tela de compras (VisionWorker com gate de movimento, tracker
+    e total do carrinho) durante duration segundos com a fonte entregando fps frames por segundo.
+
+    :param fps: Taxa da fonte; 0 entrega frames o mais rápido possível.
+    :return: Dicionário com as medidas da execução.
+    """
+    camera = CameraHandler(source=source, width=640, height=480, fps=fps)
+    motion_detector = MotionDetector(threshold=0.01, max_reuse_age=2.0) if motion_gating else None
+    worker = VisionWorker(camera, detector, motion_detector)
+    tracker = ProductTracker(iou_threshold=0.3, max_age=1.0, min_hits=2)
+    catalog = ProductCatalog(detector.class_names)
+
+    if not camera.start():
+        raise SystemExit(f"Não foi possível abrir a fonte de frames: {source}")
+    first_sequence = camera.latest_sequence
+    latencies = []
+
+    start = time.monotonic()
+    worker.start()
+    try:
+        while time.monotonic() - start < duration:
+            try:
+                detections, boxes, frame_size, captured_at, published_at = worker.results.get(timeout=0.5)
+            except Empty:
+                continue
+            tracker.update(detections, captured_at)
+            catalog.total_for_class_counts(tracker.counts_by_class_id(len(catalog.price_by_class)))
+            # latência ponta a ponta: da captura do frame até o carrinho refletir o resultado
+            latencies.append(time.monotonic() - captured_at)
+        elapsed = time.monotonic() - start
+        captured_frames = camera.latest_sequence - first_sequence + 1
+    finally:
+        worker.stop()
+        camera.stop()
+
+    latencies_ms = np.array(latencies or [0.0]) * 1000
+    return {
+        'requested_fps': fps,
+        'duration_s': round(elapsed, 2),
+        'captured_frames': int(captured_frames),
+        'processed_frames': len(latencies),
+        'skipped_frames': worker.frames_skipped,
+        'inferences': worker.inferences,
+        'capture_fps': round(captured_frames / elapsed, 2),
+        'processed_fps': round(len(latencies) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(float(np.percentile(latencies_ms, 50)), 2),
+            'p95': round(float(np.percentile(latencies_ms, 95)), 2),
+            'p99': round(float(np.percentile(latencies_ms, 99)), 2),
+            'max': round(float(latencies_ms.max()), 2),
+        },
+    }
+
+def is_sustainable(result, latency_budget_ms, tolerance):
+    # o pipeline acompanha a fonte se quase todos os frames capturados foram processados
+    keeps_up = result['processed_frames'] >= result['captured_frames'] * (1 - tolerance)
+    return keeps_up and result['latency_ms']['p95'] <= latency_budget_ms
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga headless do pipeline do AI-Totem.')
+    parser.add_argument('--source', default='synthetic', help="'synthetic', vídeo, diretório de imagens ou índice da câmera")
+    parser.add_argument('--fps', default='5,10,20,30', help='taxas da fonte separadas por vírgula (0 = sem limite)')
+    parser.add_argument('--duration', type=float, default=10.0, help='segundos por taxa')
+    parser.add_argument('--backend', default=None, choices=['pytorch', 'onnx', 'openvino'])
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--tiles', type=lambda text: tuple(int(value) for value in text.split(',')), help="modo em tiles: grade 'colunas,linhas' (ex: 2,2)")
+    parser.add_argument('--workers', type=int, default=0, help='processos de inferência (0 = no próprio processo)')
+    parser.add_argument('--server', help='host:porta de um servidor de inferência')
+    parser.add_argument('--no-motion-gating', action='store_true', help='roda o modelo em todos os frames')
+    parser.add_argument('--latency-budget-ms', type=float, default=200.0, help='latência p95 máxima aceita')
+    parser.add_argument('--tolerance', type=float, default=0.05, help='fração de frames que podem ficar para trás')
+    parser.add_argument('--output', help='arquivo JSON de saída')
+    args = parser.parse_args(argv)
+
+    source = parse_source(args.source)
+    detector = create_detector(args)
+    results = []
+    for fps in [float(value) for value in args.fps.split(',')]:
+        result = run_load(detector, source, fps, args.duration, motion_gating=not args.no_motion_gating)
+        result['sustainable'] = is_sustainable(result, args.latency_budget_ms, args.tolerance)
+        results.append(result)
+        print(f"{fps:>5.0f} fps pedidos: {result['processed_fps']:6.1f} fps processados de {result['capture_fps']:.1f} capturados, "
+              f"latência p50 {result['latency_ms']['p50']:.1f} ms / p95 {result['latency_ms']['p95']:.1f} ms "
+              f"{'✅' if result['sustainable'] else '❌'}")
+
+    sustainable = [r['processed_fps'] for r in results if r['sustainable']]
+    max_sustainable_fps = max(sustainable) if sustainable else 0.0
+    print(f"Maior taxa sustentável: {max_sustainable_fps:.1f} fps")
+
+    if args.output:
+        report = {'config': vars(args), 'backend': getattr(detector, 'backend', None), 'max_sustainable_fps': max_sustainable_fps, 'runs': results}
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+        print(f"Resultados salvos em: {args.output}")
+    if hasattr(detector, 'close'):
+        detector.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Testes da retenção dos snapshots de auditoria: o índice em memória apaga os
+diretórios mais antigos sem varrer o disco a cada compra.
+
+    python -m pytest tests/test_audit_snapshots.py
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+pytest.importorskip('cv2')
+
+from database.audit_snapshots import AuditSnapshotWriter
+from vision.snapshot_ring import Snapshot
+
+def make_old_purchase(directory, purchase_id, size, age_days):
+    purchase_dir = directory / f'purchase_{purchase_id}'
+    purchase_dir.mkdir(parents=True)
+    (purchase_dir / 'frame_0.jpg').write_bytes(b'x' * size)
+    mtime = time.time() - age_days * 86400
+    os.utime(purchase_dir, (mtime, mtime))
+    return purchase_dir
+
+def snapshots():
+    frame = np.random.default_rng(0).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    return [Snapshot(frame, np.array([[10, 10, 50, 50, 0.9, 0]], dtype=np.float32), time.time())]
+
+def test_retention_uses_index_built_at_startup(tmp_path, monkeypatch):
+    expired = make_old_purchase(tmp_path, 1, 1000, age_days=40)
+    kept = make_old_purchase(tmp_path, 2, 1000, age_days=1)
+    writer = AuditSnapshotWriter(directory=str(tmp_path), max_age_days=30)
+    writer.start()
+    writer.submit(3, snapshots(), ['apple'])
+    writer.stop()
+
+    assert not expired.exists()
+    assert kept.exists() and (tmp_path / 'purchase_3' / 'detections.json').exists()
+    assert list(writer._index) == [str(kept), str(tmp_path / 'purchase_3')]
+    assert writer._total_size == sum(f.stat().st_size for d in (kept, tmp_path / 'purchase_3') for f in d.iterdir())
+
+    # depois da varredura inicial o diretório não é mais percorrido
+    monkeypatch.setattr(writer, '_load_index', lambda: pytest.fail('rescan do diretório de snapshots'))
+    writer.max_total_mb = (writer._total_size - 1) / (1024 * 1024)
+    writer.start()
+    writer.submit(4, snapshots(), ['apple'])
+    writer.stop()
+    assert not kept.exists()
+    assert (tmp_path / 'purchase_4').exists()
@@ -0,0 +1,62 @@
+"""
+Testes do estoque do catálogo: não controlado até ser definido e nunca negativo.
+
+    python -m pytest tests/test_catalog.py
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from database import catalog, connector
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(connector, 'DB_NAME', str(tmp_path / 'totem.db'))
+    monkeypatch.setattr(connector, 'LEGACY_DB_NAME', str(tmp_path / 'missing_OLD.db'))
+    connector.close_db()
+    connector.init_db()
+    yield tmp_path
+    connector.close_db()
+
+def sell(purchase_id, cart_items):
+    conn = connector.get_connection()
+    with connector.db_lock(), conn:
+        connector.insert_purchase(conn.cursor(), purchase_id, cart_items, 1.0, 'PIX', '2025-01-01 10:00:00')
+
+def stock_of(product_name):
+    return {name: stock for name, _, stock in catalog.list_catalog()}[product_name]
+
+def test_stock_is_untracked_until_set(database):
+    catalog.init_catalog()
+    sell(1, {'Apple': 2})
+    assert stock_of('Apple') is None
+    assert catalog.list_stock_shortfalls() == []
+
+def test_sale_larger_than_stock_clamps_and_signals(database):
+    catalog.init_catalog()
+    assert catalog.set_stock('Kiwi', 3)
+    product_catalog = catalog.ProductCatalog(['Kiwi'])
+    product_catalog.refresh()
+    assert product_catalog.out_of_stock == frozenset()
+
+    sell(1, {'Kiwi': 5})
+    assert stock_of('Kiwi') == 0
+    assert catalog.list_stock_shortfalls() == [('2025-01-01 10:00:00', 1, 'Kiwi', 5, 3)]
+    # esgotar muda a versão: o cache recarrega e sinaliza o produto
+    assert product_catalog.refresh()
+    assert product_catalog.out_of_stock == frozenset({'Kiwi'})
+
+def test_old_schema_stock_becomes_untracked(database):
+    conn = connector.get_connection()
+    with connector.db_lock(), conn:
+        conn.execute('CREATE TABLE catalog (product_name TEXT PRIMARY KEY, price REAL NOT NULL, stock INTEGER NOT NULL DEFAULT 0, updated_at DATETIME NOT NULL)')
+        conn.execute("INSERT INTO catalog VALUES ('Apple', 7.0, -2, 'x'), ('Kiwi', 5.0, 10, 'x')")
+    catalog.init_catalog()
+    assert stock_of('Apple') is None
+    assert stock_of('Kiwi') == 10
+    assert stock_of('Banana') is None
@@ -0,0 +1,49 @@
+"""
+Testes da validação da configuração: valores fora da faixa são rejeitados na leitura
+e, no hot reload, a configuração anterior continua valendo.
+
+    python -m pytest tests/test_config.py
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import ConfigManager, load_config
+
+@pytest.mark.parametrize('section, values', [
+    ('camera', {'display_fps': 0}),
+    ('pipeline', {'result_poll_interval': -0.1}),
+    ('detector', {'conf': 5}),
+    ('detector', {'roi': [10, 20]}),
+    ('detector', {'roi': [100, 20, 50, 80]}),
+    ('detector', {'tiles': [2, 0]}),
+    ('detector', {'imgsz': 500}),
+    ('audit', {'image_format': 'png'}),
+])
+def test_out_of_range_values_are_rejected(tmp_path, section, values):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({section: values}))
+    with pytest.raises(ValueError):
+        load_config(str(path), environ={})
+
+def test_reload_keeps_previous_config_when_invalid(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps({'camera': {'display_fps': 15}}))
+    manager = ConfigManager(str(path))
+    received = []
+    manager.subscribe(lambda new, old: received.append(new))
+
+    path.write_text(json.dumps({'camera': {'display_fps': 0}, 'detector': {'roi': [1, 2]}}))
+    assert not manager.reload()
+    assert manager.get().camera.display_fps == 15
+    assert received == []
+
+    path.write_text(json.dumps({'camera': {'display_fps': 10}}))
+    assert manager.reload()
+    assert received[-1].camera.display_fps == 10
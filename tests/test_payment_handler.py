@@ -0,0 +1,71 @@
+"""
+Testes do PaymentHandler com o terminal simulado: um pagamento aprovado nunca é
+perdido, nem quando o cliente cancela depois da aprovação.
+
+    python -m pytest tests/test_payment_handler.py
+"""
+import asyncio
+import sys
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from payment.payment_handler import (APPROVED, CANCELLED, PENDING, PaymentHandler, PaymentProviderError,
+                                     SimulatedTerminalProvider)
+
+def test_simulator_does_not_cancel_approved_payment():
+    provider = SimulatedTerminalProvider(latency=0, approval_delay=(0, 0))
+
+    async def scenario():
+        pending = await provider.create_payment(10.0, 'PIX', 'a')
+        await provider.cancel_payment(pending)
+        return await provider.get_status(pending)
+
+    assert asyncio.run(scenario()) == APPROVED
+
+    provider = SimulatedTerminalProvider(latency=0, approval_delay=(60, 60))
+
+    async def scenario():
+        pending = await provider.create_payment(10.0, 'PIX', 'b')
+        await provider.cancel_payment(pending)
+        return await provider.get_status(pending)
+
+    assert asyncio.run(scenario()) == CANCELLED
+
+def test_cancel_after_approval_reports_approved():
+    # aprovado logo após a criação, mas a primeira consulta só viria depois de 10 s
+    handler = PaymentHandler({'PIX': SimulatedTerminalProvider(latency=0, approval_delay=(0, 0))}, poll_interval=10.0)
+    statuses = []
+    pending, finished = threading.Event(), threading.Event()
+
+    def on_status(status, message):
+        statuses.append(status)
+        (pending if status == PENDING else finished).set()
+
+    handler.start()
+    try:
+        future = handler.submit(10.0, 'PIX', on_status=on_status)
+        assert pending.wait(2.0)
+        future.cancel()
+        assert finished.wait(2.0)
+    finally:
+        handler.stop()
+    assert statuses == [PENDING, APPROVED]
+
+def test_timeout_reason_is_not_blank():
+    class SlowProvider(SimulatedTerminalProvider):
+        async def create_payment(self, amount, method, idempotency_key):
+            await asyncio.sleep(1.0)
+
+    handler = PaymentHandler({'PIX': SlowProvider()}, request_timeout=0.01, max_retries=0)
+
+    async def scenario():
+        try:
+            await handler._call(handler.providers['PIX'].create_payment, 10.0, 'PIX', 'a')
+        except PaymentProviderError as e:
+            return str(e)
+
+    assert asyncio.run(scenario()).endswith(': timeout')
@@ -0,0 +1,95 @@
+"""
+Testes do journal do PurchaseWriter: uma queda entre o fsync do journal e a
+gravação no banco não pode perder nem duplicar compras.
+
+    python -m pytest tests/test_purchase_writer.py
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from database import connector
+from database.purchase_writer import PurchaseWriter
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(connector, 'DB_NAME', str(tmp_path / 'totem.db'))
+    # o banco legado do diretório atual não deve ser importado no banco de teste
+    monkeypatch.setattr(connector, 'LEGACY_DB_NAME', str(tmp_path / 'missing_OLD.db'))
+    connector.close_db()
+    connector.init_db()
+    yield tmp_path
+    connector.close_db()
+
+def stored_purchases():
+    conn = connector.get_connection()
+    with connector.db_lock():
+        purchases = conn.execute('SELECT id, products_json, total_value, payment_method FROM purchases ORDER BY id').fetchall()
+        items = conn.execute('SELECT purchase_id, product_name, quantity FROM purchase_items ORDER BY purchase_id, product_name').fetchall()
+    return purchases, items
+
+def crash_before_database_write(writer):
+    # simula a queda do processo logo depois do fsync do journal: o lote nunca chega ao banco
+    writer._write_batch = lambda entries: None
+
+def test_replay_after_crash_restores_journaled_purchases(database):
+    journal_path = database / 'totem_journal.jsonl'
+    writer = PurchaseWriter(journal_path=str(journal_path))
+    crash_before_database_write(writer)
+    writer.start()
+    first = writer.submit({'Apple': 2}, 5.0, 'PIX').result(timeout=5)
+    second = writer.submit({'Banana': 1, 'Grape': 3}, 9.5, 'Credit Card').result(timeout=5)
+    writer.running = False
+
+    assert stored_purchases() == ([], [])
+    assert [json.loads(line)['id'] for line in journal_path.read_text().splitlines()] == [first, second]
+
+    # "reinício": conexão nova e outro writer com o mesmo journal
+    connector.close_db()
+    restarted = PurchaseWriter(journal_path=str(journal_path))
+    assert restarted.replay_journal() == 2
+
+    purchases, items = stored_purchases()
+    assert purchases == [(first, json.dumps({'Apple': 2}), 5.0, 'PIX'), (second, json.dumps({'Banana': 1, 'Grape': 3}), 9.5, 'Credit Card')]
+    assert items == [(first, 'Apple', 2), (second, 'Banana', 1), (second, 'Grape', 3)]
+    assert journal_path.read_text() == ''
+
+def test_replay_skips_duplicates_and_torn_last_line(database):
+    journal_path = database / 'totem_journal.jsonl'
+    entry = {'id': 7, 'cart_items': {'Apple': 1}, 'total_price': 2.5, 'payment_method': 'PIX', 'timestamp': '2024-01-01 10:00:00'}
+    # a compra 7 já foi gravada antes da queda, que cortou a escrita da linha seguinte
+    journal_path.write_text(json.dumps(entry) + '\n' + json.dumps(entry) + '\n' + '{"id": 8, "cart_ite')
+    conn = connector.get_connection()
+    with connector.db_lock(), conn:
+        connector.insert_purchase(conn.cursor(), 7, entry['cart_items'], entry['total_price'], entry['payment_method'], entry['timestamp'])
+
+    writer = PurchaseWriter(journal_path=str(journal_path))
+    assert writer.replay_journal() == 0
+    assert stored_purchases() == ([(7, json.dumps({'Apple': 1}), 2.5, 'PIX')], [(7, 'Apple', 1)])
+    assert journal_path.read_text() == ''
+
+def test_ids_after_replay_do_not_collide(database):
+    journal_path = database / 'totem_journal.jsonl'
+    writer = PurchaseWriter(journal_path=str(journal_path))
+    crash_before_database_write(writer)
+    writer.start()
+    lost = writer.submit({'Apple': 1}, 2.5, 'PIX').result(timeout=5)
+    writer.running = False
+
+    connector.close_db()
+    restarted = PurchaseWriter(journal_path=str(journal_path))
+    restarted.start()
+    try:
+        new = restarted.submit({'Kiwi': 4}, 8.0, 'Debit Card').result(timeout=5)
+        assert restarted.flush(timeout=5)
+    finally:
+        restarted.stop()
+
+    assert new > lost
+    assert [row[0] for row in stored_purchases()[0]] == [lost, new]
@@ -0,0 +1,42 @@
+"""
+Testes da fusão entre tiles do ProductDetector: um item na divisa entre tiles
+deve virar uma única caixa.
+
+    python -m pytest tests/test_tiles.py
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from vision.product_detector import ProductDetector, TILE_MERGE_IOS, non_max_suppression, tile_windows
+
+def boxes(*rows):
+    return np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+def test_ios_merges_partial_box_that_iou_keeps():
+    # item inteiro e o pedaço fino dele visto por outro tile: IoU baixo, mas o pedaço está contido no item
+    merged = boxes([100, 100, 200, 200, 0.9, 1], [100, 100, 120, 200, 0.8, 1])
+    assert len(non_max_suppression(merged, 0.25)) == 2
+    assert len(non_max_suppression(merged, TILE_MERGE_IOS, metric='ios')) == 1
+
+def test_ios_keeps_other_classes_and_separate_items():
+    separate = boxes([100, 100, 200, 200, 0.9, 1], [100, 100, 130, 200, 0.8, 2], [300, 100, 400, 200, 0.7, 1])
+    assert len(non_max_suppression(separate, TILE_MERGE_IOS, metric='ios')) == 3
+
+def test_drop_cut_boxes_only_on_inner_borders():
+    windows = tile_windows(400, 600, (2, 1), 0.2)
+    left, right = windows
+    tile_width = left[2] - left[0]
+    # caixa que encosta na divisa direita do tile da esquerda (interna) e outra na borda esquerda do frame
+    data = boxes([tile_width - 40, 10, tile_width, 60, 0.9, 0], [0, 10, 40, 60, 0.9, 0])
+    kept = ProductDetector._drop_cut_boxes(data.copy(), left, (400, 600, 3))
+    assert kept[:, 0].tolist() == [0]
+    # no tile da direita a borda esquerda é interna e a direita é a borda do frame
+    data = boxes([0, 10, 40, 60, 0.9, 0], [tile_width - 40, 10, tile_width, 60, 0.9, 0])
+    kept = ProductDetector._drop_cut_boxes(data.copy(), right, (400, 600, 3))
+    assert kept[:, 0].tolist() == [tile_width - 40]
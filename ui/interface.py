@@ -1,4 +1,3 @@
-import cv2
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.button import Button
@@ -6,7 +5,8 @@ from kivy.uix.label import Label
 from kivy.uix.screenmanager import ScreenManager, Screen
 from kivy.uix.image import Image as KivyImage
 from kivy.graphics.texture import Texture
-from kivy.graphics import Color, Rectangle
+from kivy.graphics import Color, Rectangle, Line, InstructionGroup
+from kivy.core.text import Label as CoreLabel
 from kivy.clock import Clock
 from kivy.properties import DictProperty, NumericProperty, StringProperty
 from kivy.uix.scrollview import ScrollView
@@ -14,33 +14,80 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.metrics import dp
 
 # <<< MUDANÇA AQUI >>> Importa a função do banco de dados
-from database.connector import save_purchase 
+from database.purchase_writer import save_purchase_async
+from database.audit_snapshots import audit_snapshots
+from database.catalog import ProductCatalog
+from payment.payment_handler import PaymentHandler, SimulatedTerminalProvider, APPROVED, PENDING
 import numpy as np
 import threading
-from queue import Queue, Empty
+from queue import Empty
 import time
 
+from config import config_manager
+
 # Importar o ProductDetector
 from vision.product_detector import ProductDetector
-
-# Variável global para armazenar o detector e a fila de comunicação
+from vision.inference_server import InferenceClient, parse_address
+from vision.process_pool import ProcessPoolDetector
+from vision.camera_handler import CameraHandler
+from vision.frame_sources import parse_source
+from vision.motion_detector import MotionDetector
+from vision.tracker import ProductTracker
+from vision.pipeline_stats import pipeline_stats
+from vision.vision_worker import VisionWorker
+from vision.snapshot_ring import SnapshotRing
+
+# Variável global para armazenar o detector
 product_detector = None
-frame_queue = Queue(maxsize=1)
-detection_queue = Queue(maxsize=1)
-
-# --- Definição dos Preços dos Produtos ---
-PRODUCT_PRICES = {
-    "Banana": 5.99,
-    "Orange": 3.50,
-    "Apple": 7.00,
-    "Pineapple": 12.00,
-    "Grapes": 7.00,
-    "Kiwi": 5.35,
-    "Mango": 3.82,
-    "Sugerapple": 2.50,
-    "Watermelon": 3.0,
-}
-UNKNOWN_PRODUCT_PRICE = 0.00
+
+def detector_options(detector_config):
+    """
+    Opções do ProductDetector que podem ser trocadas com o app rodando (ver update_settings).
+    roi: região da bandeja (x1, y1, x2, y2) em pixels do frame da câmera.
+    latency_budget: orçamento de inferência por frame; ativa o imgsz adaptativo.
+    tiles: grade (colunas, linhas) do modo em tiles.
+    """
+    latency_budget_ms = detector_config.latency_budget_ms
+    return {
+        'conf': detector_config.conf,
+        'iou': detector_config.iou,
+        'roi': detector_config.roi,
+        'latency_budget': latency_budget_ms / 1000 if latency_budget_ms else None,
+        'imgsz': detector_config.imgsz,
+        'tiles': detector_config.tiles,
+        'tile_overlap': detector_config.tile_overlap,
+    }
+
+def create_detector():
+    detector_config = config_manager.get().detector
+    # com inference_server=host:porta o modelo fica no servidor compartilhado entre os totens
+    options = detector_options(detector_config)
+    if detector_config.inference_server:
+        client = InferenceClient(parse_address(detector_config.inference_server))
+        client.warn_settings_mismatch(options)
+        return client
+    # com workers=N a inferência roda em N processos, fora do GIL da interface
+    if detector_config.workers > 0:
+        return ProcessPoolDetector(num_workers=detector_config.workers, backend=detector_config.backend, **options)
+    return ProductDetector(backend=detector_config.backend, batch_size=detector_config.batch_size, **options)
+
+def warm_up_detector(detector):
+    # a primeira inferência inicializa o runtime e aloca os buffers: melhor pagar isso antes do primeiro cliente
+    # o frame de aquecimento tem o formato dos frames da câmera
+    camera_config = config_manager.get().camera
+    detector.detect_products_array(np.zeros((camera_config.height, camera_config.width, 3), dtype=np.uint8))
+
+# --- Preços dos Produtos ---
+# os preços vêm da tabela 'catalog' do banco, com cache em memória invalidado por versão
+product_catalog = ProductCatalog()
+
+# --- Pagamentos ---
+# um único handler assíncrono atende os pagamentos; por enquanto todos os métodos usam o terminal simulado
+payment_handler = PaymentHandler({
+    'PIX': SimulatedTerminalProvider(approval_delay=(3.0, 6.0)),
+    'Credit Card': SimulatedTerminalProvider(approval_delay=(3.0, 6.0)),
+    'Debit Card': SimulatedTerminalProvider(approval_delay=(3.0, 6.0)),
+})
 
 class ShoppingCart(Screen):
     cart_items = DictProperty({})
@@ -55,6 +102,28 @@ class ShoppingCart(Screen):
         
         self.camera_display = KivyImage(size_hint_x=0.6, allow_stretch=True, keep_ratio=False)
         content_layout.add_widget(self.camera_display)
+
+        # as caixas detectadas são desenhadas como instruções de canvas sobre a textura da câmera
+        self.detection_overlay = InstructionGroup()
+        self.camera_display.canvas.after.add(self.detection_overlay)
+        self.overlay_boxes = None
+        self.overlay_frame_size = None
+        self.label_textures = {}
+        self.camera_display.bind(size=self.redraw_detection_overlay, pos=self.redraw_detection_overlay)
+
+        # uma textura pré-alocada por resolução, reaproveitada a cada frame
+        self.camera_textures = {}
+
+        config = config_manager.get()
+
+        # painel opcional com os tempos de cada estágio do pipeline (metrics.stats_overlay)
+        self.stats_overlay = None
+        self.stats_event = None
+        if config.metrics.stats_overlay:
+            self.stats_overlay = Label(font_size='12sp', halign='left', valign='top', color=(1, 1, 0, 1))
+            self.camera_display.add_widget(self.stats_overlay)
+            self.camera_display.bind(pos=self.stats_overlay.setter('pos'), size=self.stats_overlay.setter('size'))
+            self.stats_overlay.bind(size=self.stats_overlay.setter('text_size'))
         
         cart_layout = BoxLayout(orientation='vertical', size_hint_x=0.4, padding=dp(10), spacing=dp(5))
         cart_layout.add_widget(Label(text='🛒 Shopping Cart:', font_size='22sp', size_hint_y=None, height=dp(30), halign='left', text_size=(cart_layout.width, None)))
@@ -63,6 +132,11 @@ class ShoppingCart(Screen):
         self.cart_grid_layout = GridLayout(cols=1, size_hint_y=None, row_default_height=dp(30), row_force_default=True)
         self.cart_grid_layout.bind(minimum_height=self.cart_grid_layout.setter('height'))
         self.product_list_scrollview.add_widget(self.cart_grid_layout)
+        # uma Label por produto, reaproveitada entre atualizações; só o texto das linhas que mudaram é trocado
+        self.cart_rows = {}
+        # versão do catálogo usada nas linhas; uma troca de preço ou falta de estoque refaz as linhas
+        self.displayed_catalog_version = None
+        self.empty_cart_label = Label(text='No products detected.', font_size='18sp', color=(1, 1, 1, 0.7))
         cart_layout.add_widget(self.product_list_scrollview)
 
         self.detection_info_label = Label(text=self.current_detection_info, font_size='16sp', size_hint_y=None, height=dp(30), halign='left', text_size=(cart_layout.width, None))
@@ -82,16 +156,31 @@ class ShoppingCart(Screen):
         
         self.add_widget(main_layout)
 
-        self.capture = None
+        # a captura roda em thread própria; exibição e inferência leem do ring buffer
+        # camera.source troca a webcam por um vídeo, diretório de imagens ou 'synthetic'
+        camera_config = config.camera
+        self.camera = CameraHandler(source=parse_source(camera_config.source), width=camera_config.width, height=camera_config.height, buffer_size=camera_config.buffer_size)
+        self.last_displayed_sequence = -1
         self.detector = None
+        pipeline_config = config.pipeline
+        # com a cena parada as últimas detecções são reaproveitadas sem rodar o YOLO
+        self.motion_detector = MotionDetector(threshold=pipeline_config.motion_threshold, max_reuse_age=pipeline_config.motion_max_reuse_age)
+        # últimos frames com detecções, entregues ao checkout para auditoria da compra (audit.enabled)
+        audit_config = config.audit
+        self.snapshot_ring = SnapshotRing(audit_config.ring_size, audit_config.min_interval) if audit_config.enabled else None
+        self.checkout_snapshots = []
+        # criado no primeiro on_enter; pausado enquanto o cliente está nas telas de pagamento
+        self.vision_worker = None
         self.camera_event = None
         self.list_update_event = None
-        self.detected_products_history = {}
-        self.HISTORY_TIMEOUT = 1.0
+        # as quantidades do carrinho vêm de tracks estáveis, não da contagem de cada frame
+        self.tracker = ProductTracker(iou_threshold=pipeline_config.tracker_iou_threshold, max_age=pipeline_config.history_timeout, min_hits=pipeline_config.tracker_min_hits)
 
         self.bind(cart_items=self.update_cart_display)
         self.bind(total_price=self.update_total_label_text)
         self.bind(current_detection_info=self.detection_info_label.setter('text'))
+        # mudanças no arquivo de configuração chegam pela thread do ConfigManager
+        config_manager.subscribe(lambda new_config, old_config: Clock.schedule_once(lambda dt: self.apply_config(new_config, old_config)))
 
     def update_total_label_text(self, instance, value):
         self.total_label.text = f'Total: R$ {value:.2f}'
@@ -100,141 +189,299 @@ class ShoppingCart(Screen):
         global product_detector
         if product_detector is None:
             try:
-                product_detector = ProductDetector()
+                product_detector = create_detector()
             except Exception as e:
                 print(f"Failed to initialize ProductDetector: {e}")
                 self.current_detection_info = f"Error: {e}\nFailed to start detection."
                 return
 
         self.detector = product_detector
-        self.capture = cv2.VideoCapture(0)
-        if not self.capture.isOpened():
-            print("Error opening camera!")
+        # o array de preços por class id só é reconstruído se o catálogo mudou
+        if product_catalog.class_names != self.detector.class_names:
+            product_catalog.set_class_names(self.detector.class_names)
+        product_catalog.refresh()
+        if not self.camera.start():
             self.current_detection_info = "Error: Could not access camera."
             return
 
-        self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        if self.vision_worker is None:
+            self.vision_worker = VisionWorker(self.camera, self.detector, self.motion_detector, snapshot_ring=self.snapshot_ring)
+            self.vision_worker.start()
+        else:
+            self.vision_worker.resume()
+
+        self.schedule_ui_updates(config_manager.get())
+        self.stats_event = Clock.schedule_interval(self.update_pipeline_stats, 1.0)
 
-        # <<< MUDANÇA AQUI >>> Reduzindo FPS para melhorar performance
-        self.camera_event = Clock.schedule_interval(self.update_camera_frame, 1.0 / 20.0)
-        
-        self.vision_thread = threading.Thread(target=self.run_vision_processing, daemon=True)
-        self.vision_thread.start()
-        
-        self.list_update_event = Clock.schedule_interval(self.process_detection_results, 0.1) 
+    def schedule_ui_updates(self, config):
+        # <<< MUDANÇA AQUI >>> Reduzindo FPS para melhorar performance (camera.display_fps)
+        if self.camera_event:
+            self.camera_event.cancel()
+        if self.list_update_event:
+            self.list_update_event.cancel()
+        self.camera_event = Clock.schedule_interval(self.update_camera_frame, 1.0 / config.camera.display_fps)
+        self.list_update_event = Clock.schedule_interval(self.process_detection_results, config.pipeline.result_poll_interval)
+
+    def apply_config(self, config, old_config):
+        """
+        Aplica uma configuração recarregada do arquivo. Backend, processos, fonte e
+        resolução da câmera só mudam no próximo início do app. Roda em um callback do
+        Clock: um erro aqui é registrado e a tela continua com o que já foi aplicado.
+        """
+        try:
+            self._apply_config(config, old_config)
+        except Exception as e:
+            print(f"Erro ao aplicar a nova configuração: {e}")
+
+    def _apply_config(self, config, old_config):
+        pipeline_config = config.pipeline
+        self.motion_detector.threshold = pipeline_config.motion_threshold
+        self.motion_detector.max_reuse_age = pipeline_config.motion_max_reuse_age
+        self.tracker.iou_threshold = pipeline_config.tracker_iou_threshold
+        self.tracker.max_age = pipeline_config.history_timeout
+        self.tracker.min_hits = pipeline_config.tracker_min_hits
+
+        # detectores em outros processos (pool ou servidor) mantêm a configuração do início
+        if hasattr(self.detector, 'update_settings') and config.detector != old_config.detector:
+            try:
+                self.detector.update_settings(**detector_options(config.detector))
+            except (TypeError, ValueError) as e:
+                print(f"Configuração do detector ignorada: {e}")
+        elif hasattr(self.detector, 'warn_settings_mismatch') and config.detector != old_config.detector:
+            self.detector.warn_settings_mismatch(detector_options(config.detector))
+
+        # só reagenda os intervalos se a tela estiver ativa
+        if self.camera_event is not None and (config.camera.display_fps, pipeline_config.result_poll_interval) != (old_config.camera.display_fps, old_config.pipeline.result_poll_interval):
+            self.schedule_ui_updates(config)
 
     def on_leave(self, *args):
         if self.camera_event:
             self.camera_event.cancel()
+            self.camera_event = None
         if self.list_update_event:
             self.list_update_event.cancel()
-        if self.capture:
-            self.capture.release()
+            self.list_update_event = None
+        if self.stats_event:
+            self.stats_event.cancel()
+        if self.vision_worker is not None:
+            self.vision_worker.pause()
+        self.camera.stop()
+        self.draw_detection_overlay(None, None)
 
     def update_camera_frame(self, dt):
-        ret, frame = self.capture.read()
-        if ret:
-            try:
-                frame_queue.put_nowait(frame) 
-            except Exception:
-                pass 
-
-            buf = cv2.flip(frame, 0).tobytes()
-            image_texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='bgr')
-            image_texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-            self.camera_display.texture = image_texture
-        else:
+        captured = self.camera.get_latest_frame()
+        if captured is None:
             print("Could not read frame from camera.")
-
-    def run_vision_processing(self):
-        while True:
-            try:
-                frame = frame_queue.get(timeout=0.5) 
-                if self.detector:
-                    detections, frame_with_detections = self.detector.detect_products(frame)
-                    try:
-                        detection_queue.put_nowait((detections, frame_with_detections))
-                    except Exception:
-                        pass
-                frame_queue.task_done()
-            except Empty:
-                continue
-            except Exception as e:
-                print(f"Error in vision thread: {e}")
-                break
+        elif captured.sequence != self.last_displayed_sequence:
+            pipeline_stats.mark_startup('first_camera_frame')
+            self.last_displayed_sequence = captured.sequence
+            frame = captured.frame
+
+            upload_start = time.perf_counter()
+            image_texture = self.get_camera_texture(frame.shape[1], frame.shape[0])
+            # envia direto do buffer do numpy, sem cv2.flip nem tobytes()
+            image_texture.blit_buffer(frame.reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+            if self.camera_display.texture is not image_texture:
+                self.camera_display.texture = image_texture
+            else:
+                self.camera_display.canvas.ask_update()
+            pipeline_stats.record('ui_upload', time.perf_counter() - upload_start)
+
+    def get_camera_texture(self, width, height):
+        image_texture = self.camera_textures.get((width, height))
+        if image_texture is None:
+            image_texture = Texture.create(size=(width, height), colorfmt='bgr')
+            # a orientação vertical é corrigida pelas coordenadas UV em vez de inverter os pixels
+            image_texture.flip_vertical()
+            self.camera_textures[(width, height)] = image_texture
+        return image_texture
 
     def process_detection_results(self, dt):
         try:
-            detections, frame_with_detections = detection_queue.get_nowait()
+            detections, boxes, frame_size, captured_at, published_at = self.vision_worker.results.get_nowait()
+            now = time.monotonic()
+            pipeline_stats.record('result_wait', now - published_at)
+            pipeline_stats.record('frame_to_ui', now - captured_at)
             
-            buf = cv2.flip(frame_with_detections, 0).tobytes()
-            image_texture = Texture.create(size=(frame_with_detections.shape[1], frame_with_detections.shape[0]), colorfmt='bgr')
-            image_texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-            self.camera_display.texture = image_texture
+            ui_start = time.perf_counter()
+            self.draw_detection_overlay(boxes, frame_size)
 
             self.update_cart_from_detections(detections)
+            pipeline_stats.record('cart_update', time.perf_counter() - ui_start)
+            pipeline_stats.mark_startup('first_detection')
         except Empty: 
-            self.update_cart_from_detections([]) 
+            self.update_cart_from_detections(None) 
         except Exception as e:
             print(f"Error processing detections for UI: {e}")
 
+    def update_pipeline_stats(self, dt):
+        pipeline_stats.set_gauge('camera_fps', self.camera.fps)
+        pipeline_stats.set_gauge('camera_dropped_frames', self.camera.dropped_frames)
+        pipeline_stats.set_gauge('camera_failed_reads', self.camera.failed_reads)
+        if self.stats_overlay is not None:
+            self.stats_overlay.text = pipeline_stats.format_overlay()
+
+    def draw_detection_overlay(self, boxes, frame_size):
+        self.overlay_boxes = boxes
+        self.overlay_frame_size = frame_size
+        self.redraw_detection_overlay()
+
+    def redraw_detection_overlay(self, *args):
+        self.detection_overlay.clear()
+        if self.overlay_boxes is None or not len(self.overlay_boxes):
+            return
+
+        # a imagem é esticada para o widget inteiro (keep_ratio=False)
+        frame_height, frame_width = self.overlay_frame_size
+        widget = self.camera_display
+        scale_x = widget.width / frame_width
+        scale_y = widget.height / frame_height
+
+        self.detection_overlay.add(Color(0.2, 0.8, 0.2, 1))
+        for x1, y1, x2, y2, conf, cls_id in self.overlay_boxes:
+            # o eixo y da imagem cresce para baixo e o do Kivy para cima
+            left = widget.x + x1 * scale_x
+            bottom = widget.y + (frame_height - y2) * scale_y
+            width = (x2 - x1) * scale_x
+            height = (y2 - y1) * scale_y
+            self.detection_overlay.add(Line(rectangle=(left, bottom, width, height), width=dp(1.5)))
+
+            label_texture = self.get_label_texture(self.detector.class_name(int(cls_id)))
+            self.detection_overlay.add(Rectangle(texture=label_texture, size=label_texture.size, pos=(left, bottom + height)))
+
+    def get_label_texture(self, class_name):
+        # textura do nome da classe é criada uma vez e reaproveitada
+        texture = self.label_textures.get(class_name)
+        if texture is None:
+            core_label = CoreLabel(text=class_name, font_size=dp(14))
+            core_label.refresh()
+            texture = core_label.texture
+            self.label_textures[class_name] = texture
+        return texture
+
     def update_cart_from_detections(self, detections):
         current_time = time.time()
         
-        detected_in_current_frame = set()
-        for d in detections:
-            product_name = d['class']
-            self.detected_products_history[product_name] = current_time
-            detected_in_current_frame.add(product_name)
+        # detections=None: nenhum resultado novo chegou, os tracks apenas envelhecem
+        if detections is None:
+            self.tracker.prune(current_time)
+        else:
+            self.tracker.update(detections, current_time)
 
         if detections:
             best_detection = max(detections, key=lambda x: x['confidence'])
             self.current_detection_info = f"Detected: {best_detection['class'].capitalize()} ({best_detection['confidence']:.2f})"
-        else:
-            if self.detected_products_history:
-                most_recent_product = max(self.detected_products_history.items(), key=lambda item: item[1])[0]
+        elif self.tracker.tracks:
+            if detections is not None:
+                most_recent_product = max(self.tracker.tracks, key=lambda track: track.last_seen).class_name
                 self.current_detection_info = f"Waiting... (Last: {most_recent_product.capitalize()})"
-            else:
-                self.current_detection_info = "No fruit detected."
-        
-        products_to_remove = [product for product, timestamp in list(self.detected_products_history.items()) if current_time - timestamp > self.HISTORY_TIMEOUT]
-        for product in products_to_remove:
-            del self.detected_products_history[product]
+        else:
+            self.current_detection_info = "No fruit detected."
 
-        new_cart_items = {}
-        new_total_price = 0.0
-        
-        for product_name in self.detected_products_history.keys():
-            count_in_current_frame = sum(1 for p in detections if p['class'] == product_name)
-            quantity = count_in_current_frame if count_in_current_frame > 0 else 1 
-            new_cart_items[product_name] = quantity
-            price_per_unit = PRODUCT_PRICES.get(product_name, UNKNOWN_PRODUCT_PRICE)
-            new_total_price += quantity * price_per_unit
+        new_cart_items = self.tracker.counts()
+        class_counts = self.tracker.counts_by_class_id(len(product_catalog.price_by_class))
+        new_total_price = product_catalog.total_for_class_counts(class_counts)
 
-        self.cart_items = new_cart_items
-        self.total_price = new_total_price
+        # atribuir um valor igual ainda dispararia o rebuild da lista e do total
+        if new_cart_items != self.cart_items:
+            self.cart_items = new_cart_items
+        if new_total_price != self.total_price:
+            self.total_price = new_total_price
+        # o catálogo é recarregado em segundo plano (ProductCatalog.start_auto_refresh)
+        if product_catalog.version != self.displayed_catalog_version:
+            self.update_cart_display(self, self.cart_items)
 
     def update_cart_display(self, instance, value):
-        self.cart_grid_layout.clear_widgets()
+        grid = self.cart_grid_layout
+        self.displayed_catalog_version = product_catalog.version
+        # remove só as linhas de produtos que saíram do carrinho; as Labels ficam guardadas para reuso
+        for item_name, item_label in self.cart_rows.items():
+            if item_name not in value and item_label.parent is not None:
+                grid.remove_widget(item_label)
+
         if not value:
-            self.cart_grid_layout.add_widget(Label(text='No products detected.', font_size='18sp', color=(1, 1, 1, 0.7)))
-        else:
-            for item_name, quantity in value.items():
-                price_per_unit = PRODUCT_PRICES.get(item_name, UNKNOWN_PRODUCT_PRICE)
-                item_total = quantity * price_per_unit
-                item_label = Label(
-                    text=f'{item_name.capitalize()}: {quantity} unit(s) - R$ {item_total:.2f}',
+            if self.empty_cart_label.parent is None:
+                grid.add_widget(self.empty_cart_label)
+            return
+        if self.empty_cart_label.parent is not None:
+            grid.remove_widget(self.empty_cart_label)
+
+        for item_name, quantity in value.items():
+            price_per_unit = product_catalog.price(item_name)
+            item_total = quantity * price_per_unit
+            text = f'{item_name.capitalize()}: {quantity} unit(s) - R$ {item_total:.2f}'
+            if item_name in product_catalog.out_of_stock:
+                text += ' (out of stock)'
+            item_label = self.cart_rows.get(item_name)
+            if item_label is None:
+                item_label = self.cart_rows[item_name] = Label(
+                    text=text,
                     font_size='18sp', color=(1, 1, 1, 1), halign='left',
-                    text_size=(self.cart_grid_layout.width - dp(20), None)
+                    text_size=(grid.width - dp(20), None)
                 )
-                self.cart_grid_layout.add_widget(item_label)
+            elif item_label.text != text:
+                # a textura da Label só é renderizada de novo quando o texto muda
+                item_label.text = text
+            if item_label.parent is None:
+                grid.add_widget(item_label)
+
+    def shutdown(self):
+        if self.vision_worker is not None:
+            self.vision_worker.stop()
+        self.camera.stop()
+
+    def take_checkout_snapshots(self):
+        """
+        :return: Snapshots do último checkout (uma única vez) e os nomes das classes para anotá-los.
+        """
+        snapshots, self.checkout_snapshots = self.checkout_snapshots, []
+        return snapshots, self.detector.class_names if self.detector is not None else []
 
     def checkout(self, instance):
+        # só move os buffers do anel, sem cópia nem compressão: o botão responde na hora
+        if self.snapshot_ring is not None:
+            self.checkout_snapshots = self.snapshot_ring.detach()
         checkout_screen = self.manager.get_screen('checkout')
         checkout_screen.set_cart_details(self.cart_items, self.total_price)
         self.manager.current = 'checkout'
 
+class SplashScreen(Screen):
+    """
+    Primeira tela do app: carrega e aquece o detector em uma thread
+    enquanto a interface já responde, e abre a tela de compras ao terminar.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        layout = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(20))
+        layout.add_widget(Label(text='AI-Totem', font_size='40sp', bold=True, size_hint_y=0.6))
+        self.status_label = Label(text='Loading detection model...', font_size='20sp', size_hint_y=0.4, color=(0.8, 0.8, 0.8, 1))
+        layout.add_widget(self.status_label)
+        self.add_widget(layout)
+        self.loader_thread = None
+
+    def on_enter(self):
+        if self.loader_thread is None:
+            self.loader_thread = threading.Thread(target=self.load_detector, daemon=True)
+            self.loader_thread.start()
+
+    def load_detector(self):
+        global product_detector
+        try:
+            detector = create_detector()
+            warm_up_detector(detector)
+            product_detector = detector
+            pipeline_stats.mark_startup('detector_ready')
+            Clock.schedule_once(self.open_shopping)
+        except Exception as e:
+            print(f"Failed to initialize ProductDetector: {e}")
+            # a tela de compras tenta de novo e mostra o erro ao cliente
+            message = f'Error: {e}'
+            Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', message))
+            Clock.schedule_once(self.open_shopping, 3)
+
+    def open_shopping(self, dt):
+        self.manager.current = 'shopping'
+
 class CheckOut(Screen):
     total_checkout_price = NumericProperty(0.0)
 
@@ -292,12 +539,117 @@ class CheckOut(Screen):
     def go_back(self, instance):
         self.manager.current = 'shopping'
 
-class PixPaymentScreen(Screen):
+class PaymentWaitingScreen(Screen):
+    """
+    Base das telas que aguardam um pagamento: o PaymentHandler consulta o provedor
+    em outra thread e as respostas voltam para a interface pelo Clock.
+
+    Um pagamento aprovado é sempre gravado, mesmo que o cliente tenha saído da tela
+    antes de a resposta chegar: o cliente já foi cobrado. As subclasses guardam o
+    botão de voltar em self.back_btn, desativado assim que o provedor aprova.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cart_items = {}
+        self.payment_future = None
+        self.back_btn = None
+
+    def start_payment(self, method, total):
+        self.cancel_payment()
+        self.set_back_enabled(True)
+        # o carrinho e o total vão junto com o pagamento: a aprovação pode chegar depois de a tela mudar
+        cart_items = dict(self.cart_items)
+        # o APPROVED chega por on_status, emitido uma única vez antes de o pagamento terminar;
+        # o Future pode acabar marcado como cancelado se o cliente voltar nesse meio-tempo
+        future = payment_handler.submit(total, method, on_status=lambda status, message: Clock.schedule_once(
+            lambda dt: self.payment_status_changed(future, status, message, method, cart_items, total)))
+        future.add_done_callback(lambda f: Clock.schedule_once(lambda dt: self.payment_finished(f)))
+        self.payment_future = future
+
+    def set_back_enabled(self, enabled):
+        if self.back_btn is not None:
+            self.back_btn.disabled = not enabled
+
+    def cancel_payment(self):
+        if self.payment_future is not None and not self.payment_future.done():
+            self.payment_future.cancel()
+        self.payment_future = None
+
+    def payment_status_changed(self, future, status, message, method, cart_items, total):
+        if status == APPROVED:
+            self.payment_approved(future, message, method, cart_items, total)
+        elif future is self.payment_future:
+            self.show_payment_status(status, message)
+
+    def payment_approved(self, future, message, method, cart_items, total):
+        """
+        Grava a compra de um pagamento aprovado, mesmo que o cliente já tenha saído da tela:
+        a cobrança já foi feita e voltar não a desfaz.
+        """
+        if future is self.payment_future:
+            self.payment_future = None
+        else:
+            # o cliente voltou e iniciou outro pagamento para o mesmo carrinho, que não é mais necessário
+            self.cancel_payment()
+        self.set_back_enabled(False)
+        self.show_payment_status(APPROVED, message)
+        # o id e o fsync do journal ficam na thread do purchase_writer; a confirmação volta pelo Clock
+        save_future = save_purchase_async(
+            cart_items=cart_items,
+            total_price=total,
+            payment_method=method
+        )
+        save_future.add_done_callback(lambda f: Clock.schedule_once(lambda dt: self.purchase_saved(f)))
+
+    def payment_finished(self, future):
+        # aprovações já foram tratadas em payment_approved; respostas de um pagamento
+        # cancelado ou substituído são ignoradas
+        if future is not self.payment_future or future.cancelled():
+            return
+        self.payment_future = None
+        try:
+            result = future.result()
+        except Exception as e:
+            message = f'Payment error: {e}'
+        else:
+            if result.status == APPROVED:
+                return
+            message = result.message
+        self.show_payment_error(message)
+        # Volta para a tela de checkout em caso de erro
+        Clock.schedule_once(lambda x: setattr(self.manager, 'current', 'checkout'), 3)
+
+    def purchase_saved(self, future):
+        self.set_back_enabled(True)
+        try:
+            purchase_id = future.result()
+        except Exception:
+            self.show_payment_error('Error saving purchase!')
+            Clock.schedule_once(lambda x: setattr(self.manager, 'current', 'checkout'), 3)
+            return
+
+        # os frames do checkout são anotados, comprimidos e gravados na thread do audit_snapshots
+        snapshots, class_names = self.manager.get_screen('shopping').take_checkout_snapshots()
+        audit_snapshots.submit(purchase_id, snapshots, class_names)
+        thank_you_screen = self.manager.get_screen('thank_you')
+        thank_you_screen.show_confirmation(purchase_id)
+        self.manager.current = 'thank_you'
+
+    def show_payment_status(self, status, message):
+        pass
+
+    def show_payment_error(self, message):
+        pass
+
+    def on_leave(self):
+        # sair da tela (Back) cancela o pagamento também no provedor
+        self.cancel_payment()
+
+class PixPaymentScreen(PaymentWaitingScreen):
     total_display_pix = NumericProperty(0.0)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.cart_items = {} # <<< MUDANÇA AQUI >>> Adicionado para guardar o carrinho
         layout = BoxLayout(orientation='vertical')
         title = Label(text='PIX Payment', size_hint_y=0.2, font_size='25sp', bold=True)
         layout.add_widget(title)
@@ -308,14 +660,13 @@ class PixPaymentScreen(Screen):
         self.total_label = Label(text=f'Total: R$ {self.total_display_pix:.2f}', size_hint_y=0.1, font_size='25sp', bold=True, color=(0.2, 0.8, 0.2, 1))
         layout.add_widget(self.total_label)
 
-        # <<< MUDANÇA AQUI >>> Adicionado botão de confirmação
+        # a confirmação vem do provedor de PIX, sem botão manual
         btn_layout = BoxLayout(size_hint_y=0.2, padding=dp(10), spacing=dp(10))
-        confirm_btn = Button(text='Confirm Payment', font_size='20sp')
-        confirm_btn.bind(on_press=self.confirm_pix_payment)
-        btn_layout.add_widget(confirm_btn)
-        back_btn = Button(text='Back', font_size='20sp')
-        back_btn.bind(on_press=self.go_back)
-        btn_layout.add_widget(back_btn)
+        self.status_label = Label(text='Awaiting payment...', font_size='20sp', color=(1, 0.5, 0, 1))
+        btn_layout.add_widget(self.status_label)
+        self.back_btn = Button(text='Back', font_size='20sp')
+        self.back_btn.bind(on_press=self.go_back)
+        btn_layout.add_widget(self.back_btn)
         layout.add_widget(btn_layout)
         
         self.add_widget(layout)
@@ -329,28 +680,27 @@ class PixPaymentScreen(Screen):
         self.cart_items = cart_items
         self.total_display_pix = total
 
-    # <<< MUDANÇA AQUI >>> Novo método para confirmar e salvar
-    def confirm_pix_payment(self, instance):
-        purchase_id = save_purchase(
-            cart_items=self.cart_items,
-            total_price=self.total_display_pix,
-            payment_method='PIX'
-        )
-        if purchase_id:
-            thank_you_screen = self.manager.get_screen('thank_you')
-            thank_you_screen.show_confirmation(purchase_id)
-            self.manager.current = 'thank_you'
+    def on_enter(self):
+        self.status_label.text = 'Awaiting payment...'
+        self.status_label.color = (1, 0.5, 0, 1)
+        self.start_payment('PIX', self.total_display_pix)
+
+    def show_payment_status(self, status, message):
+        self.status_label.text = message
+
+    def show_payment_error(self, message):
+        self.status_label.text = message
+        self.status_label.color = (1, 0, 0, 1)
 
     def go_back(self, instance):
         self.manager.current = 'checkout'
 
-class CardWaitingScreen(Screen):
+class CardWaitingScreen(PaymentWaitingScreen):
     total_display_card = NumericProperty(0.0)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         # <<< MUDANÇA AQUI >>> Adicionado para guardar detalhes da compra
-        self.cart_items = {}
         self.payment_method_text = ''
         
         with self.canvas.before:
@@ -397,27 +747,17 @@ class CardWaitingScreen(Screen):
         self.status_label.text = 'Awaiting payment...'
         self.status_label.color = (1,0.5,0,1)
         self.card_icon.text = '💳'
-        Clock.schedule_once(self.simulate_payment, 5)
-
-    # <<< MUDANÇA AQUI >>> Lógica de simulação refeita para salvar no DB e limpar carrinho
-    def simulate_payment(self, dt):
-        purchase_id = save_purchase(
-            cart_items=self.cart_items,
-            total_price=self.total_display_card,
-            payment_method=self.payment_method_text
-        )
+        # o status da maquininha é consultado pelo PaymentHandler, sem bloquear a interface
+        self.start_payment(self.payment_method_text, self.total_display_card)
 
-        if purchase_id:
-            # Navega para a tela de agradecimento
-            thank_you_screen = self.manager.get_screen('thank_you')
-            thank_you_screen.show_confirmation(purchase_id)
-            self.manager.current = 'thank_you'
-        else:
-            self.status_label.text = 'Error saving purchase!'
-            self.status_label.color = (1, 0, 0, 1)
-            self.card_icon.text = '❌'
-            # Volta para a tela de checkout em caso de erro
-            Clock.schedule_once(lambda x: setattr(self.manager, 'current', 'checkout'), 3)
+    def show_payment_status(self, status, message):
+        if status == PENDING:
+            self.status_label.text = message
+
+    def show_payment_error(self, message):
+        self.status_label.text = message
+        self.status_label.color = (1, 0, 0, 1)
+        self.card_icon.text = '❌'
 
     def go_back_from_card_screen(self, instance):
         self.manager.current = 'checkout'
@@ -446,16 +786,35 @@ class ThankYouScreen(Screen):
         shopping_screen = self.manager.get_screen('shopping')
         shopping_screen.cart_items = {} # Esvazia o carrinho
         shopping_screen.total_price = 0.0 # Zera o total
-        shopping_screen.detected_products_history = {} # Limpa o histórico de detecção
+        shopping_screen.tracker.reset() # Limpa os tracks de detecção
         self.manager.current = 'shopping'
 
 class AITotemApp(App):
     def build(self):
+        metrics_config = config_manager.get().metrics
+        pipeline_stats.start_exporters(metrics_config.file, metrics_config.port)
+        # o arquivo de configuração é relido quando muda (ver ShoppingCart.apply_config)
+        config_manager.start_watching()
+        # preços e estoque alterados pelo CLI do catálogo aparecem sem o cliente sair do carrinho
+        product_catalog.start_auto_refresh(config_manager.get().database.catalog_refresh_interval)
+        payment_handler.start()
         sm = ScreenManager()
+        # a tela de abertura é a primeira adicionada e, portanto, a inicial
+        sm.add_widget(SplashScreen(name='splash'))
         sm.add_widget(ShoppingCart(name='shopping'))
         sm.add_widget(CheckOut(name='checkout'))
         sm.add_widget(PixPaymentScreen(name='pix_payment'))
         sm.add_widget(CardWaitingScreen(name='card_waiting'))
         # <<< MUDANÇA AQUI >>> Registra a nova tela
         sm.add_widget(ThankYouScreen(name='thank_you'))
-        return sm
\ No newline at end of file
+        # chamado no primeiro frame desenhado: a interface já responde ao toque
+        Clock.schedule_once(lambda dt: pipeline_stats.mark_startup('first_interactive_frame'))
+        return sm
+
+    def on_stop(self):
+        # encerra as threads de visão e a câmera antes de o processo sair
+        self.root.get_screen('shopping').shutdown()
+        payment_handler.stop()
+        product_catalog.stop_auto_refresh()
+        if hasattr(product_detector, 'close'):
+            product_detector.close()
\ No newline at end of file
@@ -0,0 +1,191 @@
+import numpy as np
+import threading
+import time
+from collections import namedtuple
+
+from vision.frame_sources import open_frame_source
+
+# frame entregue aos consumidores: 'frame' é uma view do slot no ring buffer
+CapturedFrame = namedtuple('CapturedFrame', ['frame', 'sequence', 'timestamp'])
+
+DEFAULT_BUFFER_SIZE = 8
+
+class CameraHandler:
+    """
+    Captura frames da câmera em uma thread própria e os grava em um ring buffer
+    de frames pré-alocados. Exibição e inferência leem do buffer de forma independente.
+
+    Os frames retornados são views do buffer: o slot só é sobrescrito depois de
+    buffer_size novas capturas, então quem precisar segurar o frame por mais tempo
+    deve pedir copy=True.
+    """
+    def __init__(self, source=0, width=640, height=480, buffer_size=DEFAULT_BUFFER_SIZE, fps=None):
+        """
+        :param source: Índice da câmera, vídeo, diretório de imagens ou 'synthetic' (ver vision.frame_sources).
+        :param fps: Taxa de entrega das fontes de replay e sintéticas (0 = sem limite).
+        """
+        if buffer_size < 2:
+            raise ValueError("buffer_size deve ser maior ou igual a 2")
+        self.source = source
+        self.width = width
+        self.height = height
+        self.buffer_size = buffer_size
+        self.fps_limit = fps
+
+        self.capture = None
+        self.running = False
+        self._thread = None
+        self._stop_event = None
+        self._condition = threading.Condition()
+
+        self._frames = None
+        self._sequences = np.full(buffer_size, -1, dtype=np.int64)
+        self._timestamps = np.zeros(buffer_size, dtype=np.float64)
+        self._consumed = np.zeros(buffer_size, dtype=bool)
+        self.latest_sequence = -1
+
+        self.dropped_frames = 0 # frames sobrescritos sem nunca terem sido lidos
+        self.failed_reads = 0
+
+    def start(self):
+        """
+        Abre a câmera, aloca o ring buffer e inicia a thread de captura.
+
+        :return: True se a câmera foi aberta, False caso contrário.
+        """
+        if self.running:
+            return True
+
+        self.capture = open_frame_source(self.source, self.width, self.height, self.fps_limit)
+        if not self.capture.isOpened():
+            print("Error opening camera!")
+            self.capture = None
+            return False
+
+        # o primeiro frame define o formato real entregue pela câmera
+        ret, first_frame = self.capture.read()
+        if not ret:
+            print("Could not read frame from camera.")
+            self.capture.release()
+            self.capture = None
+            return False
+
+        with self._condition:
+            if self._frames is None or self._frames.shape[1:] != first_frame.shape:
+                self._frames = np.empty((self.buffer_size,) + first_frame.shape, dtype=first_frame.dtype)
+            self._sequences.fill(-1)
+            self._consumed.fill(False)
+            # latest_sequence não é zerado: a numeração continua crescente entre reinícios
+            self.dropped_frames = 0
+            self.failed_reads = 0
+            slot = self._claim_slot()
+            self._publish_slot(slot, first_frame)
+
+        self.running = True
+        # cada thread de captura tem o seu sinal de parada: uma thread antiga ainda presa em read()
+        # não volta a rodar se a câmera for reiniciada
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._capture_loop, args=(self.capture, self._stop_event), daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self.running = False
+        if self._thread is not None:
+            self._stop_event.set()
+            self._thread.join(timeout=1.0)
+            if self._thread.is_alive():
+                print("Aviso: a captura ainda está bloqueada em read(); a câmera será liberada quando a leitura terminar.")
+            self._thread = None
+        # a thread de captura é dona da câmera e a libera ao sair, mesmo depois deste timeout
+        self.capture = None
+        with self._condition:
+            self._condition.notify_all()
+
+    def _claim_slot(self):
+        # chamado com o lock adquirido: invalida o slot antes de ele ser sobrescrito
+        slot = (self.latest_sequence + 1) % self.buffer_size
+        if self._sequences[slot] >= 0 and not self._consumed[slot]:
+            self.dropped_frames += 1
+        self._sequences[slot] = -1
+        return slot
+
+    def _publish_slot(self, slot, frame):
+        # chamado com o lock adquirido
+        if not np.shares_memory(frame, self._frames[slot]):
+            # o backend da câmera ignorou o buffer de saída e alocou outro array
+            self._frames[slot] = frame
+        self.latest_sequence += 1
+        self._sequences[slot] = self.latest_sequence
+        self._timestamps[slot] = time.monotonic()
+        self._consumed[slot] = False
+        self._condition.notify_all()
+
+    def _capture_loop(self, capture, stop_event):
+        try:
+            while not stop_event.is_set():
+                with self._condition:
+                    slot = self._claim_slot()
+                # grava direto no slot pré-alocado, sem alocar um novo array por frame
+                ret, frame = capture.read(self._frames[slot])
+                if not ret or frame.shape != self._frames[slot].shape:
+                    self.failed_reads += 1
+                    time.sleep(0.01)
+                    continue
+
+                with self._condition:
+                    # parada pedida durante a leitura: o frame não é publicado
+                    if stop_event.is_set():
+                        break
+                    self._publish_slot(slot, frame)
+        finally:
+            capture.release()
+
+    def _read_slot(self, slot, copy):
+        self._consumed[slot] = True
+        frame = self._frames[slot]
+        return CapturedFrame(frame.copy() if copy else frame, int(self._sequences[slot]), float(self._timestamps[slot]))
+
+    def get_latest_frame(self, copy=False):
+        """
+        :return: CapturedFrame mais recente ou None se nada foi capturado ainda.
+        """
+        with self._condition:
+            if self.latest_sequence < 0:
+                return None
+            return self._read_slot(self.latest_sequence % self.buffer_size, copy)
+
+    def get_frame(self, sequence, copy=False):
+        """
+        :param sequence: Número de sequência do frame desejado.
+        :return: CapturedFrame ou None se o frame ainda não existe ou já foi sobrescrito.
+        """
+        with self._condition:
+            slot = sequence % self.buffer_size
+            if sequence < 0 or self._sequences[slot] != sequence:
+                return None
+            return self._read_slot(slot, copy)
+
+    def wait_for_frame(self, after_sequence, timeout=None, copy=False):
+        """
+        Bloqueia até existir um frame mais novo que after_sequence.
+
+        :return: O CapturedFrame mais recente ou None se o timeout expirar.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.latest_sequence > after_sequence, timeout):
+                return None
+            return self._read_slot(self.latest_sequence % self.buffer_size, copy)
+
+    @property
+    def fps(self):
+        """
+        Taxa de captura alcançada, calculada sobre os frames presentes no ring buffer.
+        """
+        with self._condition:
+            valid = self._sequences >= 0
+            count = int(valid.sum())
+            if count < 2:
+                return 0.0
+            elapsed = self._timestamps[valid].max() - self._timestamps[valid].min()
+            return (count - 1) / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,180 @@
+"""
+Fontes de frames intercambiáveis com a câmera, para testar o pipeline sem webcam.
+
+Todas seguem a interface do cv2.VideoCapture usada pelo CameraHandler
+(isOpened, read(image) e release) e entregam frames no tamanho pedido.
+
+Formatos aceitos por open_frame_source:
+    0, 1, ...                      câmera local (cv2.VideoCapture)
+    caminho/do/video.mp4           replay de um vídeo em loop
+    datasets/fruits_yolo/test/images   replay de um diretório de imagens em loop
+    synthetic                      frames sintéticos com caixas coloridas em movimento
+
+O parâmetro fps limita a taxa de entrega (0 = sem limite); sem ele vídeos usam a
+taxa do arquivo, imagens e frames sintéticos usam DEFAULT_REPLAY_FPS.
+"""
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_REPLAY_FPS = 20.0
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class _FramePacer:
+    """
+    Libera um frame a cada 1/fps segundos. Se o consumidor atrasar, o ritmo é
+    retomado a partir de agora em vez de entregar uma rajada de frames atrasados.
+    """
+    def __init__(self, fps):
+        self.interval = 1.0 / fps if fps else 0.0
+        self._next = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next is None or now - self._next > self.interval:
+            self._next = now
+        elif self._next > now:
+            time.sleep(self._next - now)
+        self._next += self.interval
+
+def _deliver(frame, image):
+    # copia para o buffer do chamador (slot do ring buffer) quando ele é compatível
+    if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+        np.copyto(image, frame)
+        return True, image
+    return True, frame.copy()
+
+class ImageDirectorySource:
+    """
+    Reproduz as imagens de um diretório em ordem alfabética e em loop. As imagens são
+    decodificadas e redimensionadas uma vez na abertura, para o disco e o JPEG não
+    entrarem na medição do pipeline.
+    """
+    def __init__(self, directory, width=640, height=480, fps=None, loop=True):
+        import cv2
+        paths = sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        self.frames = []
+        for path in paths:
+            image = cv2.imread(str(path))
+            if image is not None:
+                self.frames.append(cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA))
+        self.paths = paths
+        self.loop = loop
+        self._index = 0
+        self._pacer = _FramePacer(DEFAULT_REPLAY_FPS if fps is None else fps)
+
+    def isOpened(self):
+        return bool(self.frames)
+
+    def read(self, image=None):
+        if self._index >= len(self.frames):
+            if not self.loop or not self.frames:
+                return False, None
+            self._index = 0
+        self._pacer.wait()
+        frame = self.frames[self._index]
+        self._index += 1
+        return _deliver(frame, image)
+
+    def release(self):
+        self.frames = []
+
+class VideoFileSource:
+    """
+    Reproduz um arquivo de vídeo em loop, no ritmo do próprio vídeo ou no fps pedido.
+    """
+    def __init__(self, path, width=640, height=480, fps=None, loop=True):
+        import cv2
+        self._cv2 = cv2
+        self.capture = cv2.VideoCapture(str(path))
+        self.size = (width, height)
+        self.loop = loop
+        file_fps = self.capture.get(cv2.CAP_PROP_FPS) if self.capture.isOpened() else 0
+        self._pacer = _FramePacer((file_fps or DEFAULT_REPLAY_FPS) if fps is None else fps)
+        self._decoded = None
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self, image=None):
+        ret, self._decoded = self.capture.read(self._decoded)
+        if not ret and self.loop:
+            self.capture.set(self._cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, self._decoded = self.capture.read(self._decoded)
+        if not ret:
+            return False, None
+        self._pacer.wait()
+        if self._decoded.shape[1::-1] == self.size:
+            return _deliver(self._decoded, image)
+        if image is not None and image.shape[1::-1] == self.size:
+            return True, self._cv2.resize(self._decoded, self.size, dst=image, interpolation=self._cv2.INTER_AREA)
+        return True, self._cv2.resize(self._decoded, self.size, interpolation=self._cv2.INTER_AREA)
+
+    def release(self):
+        self.capture.release()
+
+class SyntheticSource:
+    """
+    Gera frames sem nenhum arquivo: fundo cinza com caixas coloridas que se movem,
+    o bastante para o MotionDetector considerar que a cena mudou a cada frame.
+    """
+    def __init__(self, width=640, height=480, fps=None, boxes=4, seed=0):
+        rng = np.random.default_rng(seed)
+        self.width = width
+        self.height = height
+        self._background = np.full((height, width, 3), 96, dtype=np.uint8)
+        self._frame = np.empty_like(self._background)
+        self._colors = rng.integers(0, 256, size=(boxes, 3), dtype=np.uint8)
+        self._origins = rng.uniform(0, 1, size=(boxes, 2))
+        self._speeds = rng.uniform(-0.01, 0.01, size=(boxes, 2))
+        self._box_size = (max(width // 8, 1), max(height // 8, 1))
+        self._index = 0
+        self._pacer = _FramePacer(DEFAULT_REPLAY_FPS if fps is None else fps)
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        self._pacer.wait()
+        frame = image if image is not None and image.shape == self._frame.shape else self._frame
+        np.copyto(frame, self._background)
+        box_width, box_height = self._box_size
+        # posições em fração da área útil, refletidas nas bordas (movimento de vai e volta)
+        positions = np.abs((self._origins + self._speeds * self._index + 1) % 2 - 1)
+        for color, (fx, fy) in zip(self._colors, positions):
+            x = int(fx * (self.width - box_width))
+            y = int(fy * (self.height - box_height))
+            frame[y:y + box_height, x:x + box_width] = color
+        self._index += 1
+        return True, frame if frame is image else frame.copy()
+
+    def release(self):
+        pass
+
+def parse_source(text):
+    """
+    Converte o valor de AI_TOTEM_FRAME_SOURCE/--source: números viram o índice da câmera.
+    """
+    return int(text) if str(text).isdigit() else text
+
+def open_frame_source(source, width=640, height=480, fps=None):
+    """
+    :param source: Índice da câmera, caminho de vídeo, diretório de imagens ou 'synthetic'.
+    :param fps: Taxa máxima de entrega, 0 para sem limite (ignorado para câmeras).
+    :return: Objeto com a interface do cv2.VideoCapture (isOpened, read, release).
+    """
+    if isinstance(source, int):
+        import cv2
+        capture = cv2.VideoCapture(source)
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        return capture
+    if source == 'synthetic':
+        return SyntheticSource(width, height, fps)
+    if os.path.isdir(source):
+        return ImageDirectorySource(source, width, height, fps)
+    return VideoFileSource(source, width, height, fps)
@@ -0,0 +1,371 @@
+"""
+Servidor local de inferência compartilhado entre vários totens.
+
+O servidor carrega um único ProductDetector e atende vários clientes (um por caixa).
+Os pixels trafegam por memória compartilhada: o cliente copia o frame para um
+segmento SharedMemory próprio e envia pelo socket apenas uma mensagem curta.
+As requisições de todos os clientes são agrupadas em lotes dinâmicos, limitados
+pelo tamanho máximo do lote e pelo tempo máximo de espera (orçamento de latência).
+
+As mensagens do multiprocessing.connection são objetos pickle, então só clientes
+autenticados podem falar com o servidor. A chave vem de AI_TOTEM_INFERENCE_AUTHKEY ou,
+na falta dela, de DEFAULT_AUTHKEY_FILE, gerado pelo servidor na primeira execução e lido
+pelos totens da mesma máquina. Como os frames passam por memória compartilhada, o
+servidor e os totens rodam na mesma máquina e o servidor só ouve em endereços de loopback.
+
+As opções do detector (conf, ROI, tiles, orçamento de latência) são as do servidor,
+passadas na linha de comando; o cliente avisa quando a configuração do totem é diferente.
+
+Exemplo:
+    python -m vision.inference_server --port 6001 --batch-size 8 --max-wait-ms 10 --backend onnx --roi 80 60 560 420
+    AI_TOTEM_INFERENCE_SERVER=127.0.0.1:6001 python main.py
+"""
+import argparse
+import ipaddress
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import Listener, Client
+from queue import Queue, Empty
+
+import numpy as np
+
+DEFAULT_ADDRESS = ('127.0.0.1', 6001)
+AUTHKEY_ENV = 'AI_TOTEM_INFERENCE_AUTHKEY'
+DEFAULT_AUTHKEY_FILE = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')), 'inference_authkey')
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return (host or DEFAULT_ADDRESS[0], int(port))
+
+def is_loopback(host):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+def _read_authkey_file(path):
+    with open(path, 'rb') as f:
+        authkey = f.read().strip()
+    if not authkey:
+        raise ValueError(f"Arquivo de chave vazio: {path}")
+    return authkey
+
+def load_authkey(path=DEFAULT_AUTHKEY_FILE, create=False, environ=None):
+    """
+    :param path: Arquivo com a chave, usado quando AI_TOTEM_INFERENCE_AUTHKEY não está definida.
+    :param create: Gera uma chave aleatória em path (permissão 0600) se o arquivo não existir.
+    :return: A chave em bytes.
+    """
+    environ = os.environ if environ is None else environ
+    if environ.get(AUTHKEY_ENV):
+        return environ[AUTHKEY_ENV].encode()
+    if os.path.exists(path):
+        return _read_authkey_file(path)
+    if not create:
+        raise FileNotFoundError(f"Chave do servidor de inferência não encontrada: defina {AUTHKEY_ENV} ou inicie o servidor para gerar {path}.")
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # outro processo gerou a chave ao mesmo tempo
+        return _read_authkey_file(path)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(32))
+    print(f"Chave do servidor de inferência gerada em: {path}")
+    return _read_authkey_file(path)
+
+def attach_shared_memory(name):
+    """
+    Abre um segmento criado por outro processo sem assumir a posse dele:
+    quem cria o segmento é o responsável por removê-lo.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 não tem track=False: tira o segmento do resource_tracker manualmente
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == 'posix':
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+class _ClientSession:
+    def __init__(self, connection, client_id, retired):
+        """
+        :param retired: Lista (do servidor) dos segmentos trocados ou abandonados; só a thread
+                        dos lotes os fecha, quando nenhum lote em andamento pode mais lê-los.
+        """
+        self.connection = connection
+        self.client_id = client_id
+        self.send_lock = threading.Lock()
+        self.retired = retired
+        self.shm = None
+        self.frame = None
+
+    def attach(self, shm_name, shape, dtype):
+        shm = attach_shared_memory(shm_name)
+        # o frame novo é publicado antes de o segmento antigo ser aposentado
+        previous, self.shm = self.shm, shm
+        self.frame = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if previous is not None:
+            self.retired.append(previous)
+
+    def detach(self):
+        self.frame = None
+        if self.shm is not None:
+            self.retired.append(self.shm)
+            self.shm = None
+
+    def send(self, message):
+        with self.send_lock:
+            self.connection.send(message)
+
+class InferenceServer:
+    def __init__(self, detector, authkey, address=DEFAULT_ADDRESS, max_batch_size=8, max_wait=0.010):
+        """
+        :param detector: ProductDetector já carregado.
+        :param authkey: Chave que os clientes precisam ter (ver load_authkey).
+        :param max_batch_size: Máximo de frames por chamada do modelo.
+        :param max_wait: Tempo máximo (s) que a primeira requisição do lote espera por outras.
+        """
+        if not authkey:
+            raise ValueError("O servidor de inferência exige uma chave de autenticação.")
+        self.detector = detector
+        self.address = address
+        self.authkey = authkey
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._requests = Queue()
+        self._retired_segments = []
+        self._next_client_id = 0
+        self.batches = 0
+        self.frames = 0
+
+    def serve_forever(self):
+        threading.Thread(target=self._batch_loop, daemon=True).start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"Servidor de inferência ouvindo em {self.address[0]}:{self.address[1]} (lote máx. {self.max_batch_size}, espera máx. {self.max_wait * 1000:.0f} ms)")
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    print(f"Conexão recusada: {e}")
+                    continue
+                self._next_client_id += 1
+                session = _ClientSession(connection, self._next_client_id, self._retired_segments)
+                threading.Thread(target=self._client_loop, args=(session,), daemon=True).start()
+
+    def _client_loop(self, session):
+        print(f"Cliente #{session.client_id} conectado.")
+        try:
+            session.send({'type': 'hello', 'class_names': list(self.detector.class_names), 'settings': self.detector.settings()})
+            while True:
+                message = session.connection.recv()
+                if message['type'] == 'attach':
+                    session.attach(message['shm_name'], tuple(message['shape']), message['dtype'])
+                elif message['type'] == 'detect':
+                    self._requests.put((session, message['request_id'], time.monotonic()))
+                elif message['type'] == 'close':
+                    break
+        except (EOFError, OSError):
+            pass
+        finally:
+            session.detach()
+            session.connection.close()
+            print(f"Cliente #{session.client_id} desconectado.")
+
+    def _collect_batch(self):
+        # bloqueia pela primeira requisição e espera outras até o orçamento de latência esgotar
+        first = self._requests.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._requests.get(timeout=max(remaining, 0)) if remaining > 0 else self._requests.get_nowait())
+            except Empty:
+                break
+        return batch
+
+    def _close_retired_segments(self):
+        # chamado entre lotes: um segmento aposentado durante o lote anterior pode ter sido lido
+        # por ele, mas os lotes seguintes já leem o frame novo da sessão
+        while self._retired_segments:
+            shm = self._retired_segments.pop()
+            try:
+                shm.close()
+            except BufferError:
+                # ainda referenciado: o segmento é liberado pelo GC
+                pass
+
+    def _batch_loop(self):
+        while True:
+            self._close_retired_segments()
+            batch = [request for request in self._collect_batch() if request[0].frame is not None]
+            if not batch:
+                continue
+            try:
+                results = self.detector.detect_products_array_batch([session.frame for session, _, _ in batch])
+            except Exception as e:
+                print(f"Erro na inferência em lote: {e}")
+                results = [None] * len(batch)
+
+            for (session, request_id, _), boxes in zip(batch, results):
+                try:
+                    session.send({'type': 'result', 'request_id': request_id, 'boxes': boxes})
+                except (EOFError, OSError):
+                    pass
+
+            self.batches += 1
+            self.frames += len(batch)
+            if self.batches % 500 == 0:
+                print(f"Servidor de inferência: {self.frames} frames em {self.batches} lotes (média {self.frames / self.batches:.2f} frames/lote)")
+
+class InferenceClient:
+    """
+    Cliente do InferenceServer com a mesma interface de detecção usada pela interface
+    (detect_products_array, detections_to_dicts, class_name), podendo substituir o ProductDetector.
+    """
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, timeout=5.0):
+        """
+        :param authkey: Chave do servidor; por padrão AI_TOTEM_INFERENCE_AUTHKEY ou DEFAULT_AUTHKEY_FILE.
+        """
+        self.connection = Client(address, authkey=authkey or load_authkey())
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._request_id = 0
+        self.shm = None
+        self.frame = None
+
+        if not self.connection.poll(self.timeout):
+            self.connection.close()
+            raise TimeoutError("O servidor de inferência não respondeu a tempo.")
+        hello = self.connection.recv()
+        self.class_names = hello['class_names']
+        # opções do detector do servidor, no formato de ProductDetector.update_settings
+        self.settings = hello['settings']
+        self.backend = f'server {address[0]}:{address[1]}'
+        print(f"Conectado ao servidor de inferência em {address[0]}:{address[1]}")
+
+    def _ensure_buffer(self, frame):
+        if self.frame is not None and self.frame.shape == frame.shape and self.frame.dtype == frame.dtype:
+            return
+        self._release_buffer()
+        self.shm = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+        self.frame = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self.shm.buf)
+        self.connection.send({'type': 'attach', 'shm_name': self.shm.name, 'shape': frame.shape, 'dtype': frame.dtype.str})
+
+    def _release_buffer(self):
+        self.frame = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def class_name(self, cls_id):
+        return self.class_names[cls_id] if cls_id < len(self.class_names) else f'classe_{cls_id}'
+
+    def warn_settings_mismatch(self, options):
+        """
+        As opções do detector ficam no servidor, compartilhado entre os totens: avisa quais
+        opções do totem (ver ProductDetector.update_settings) não são as do servidor.
+
+        :return: Lista com os nomes das opções diferentes.
+        """
+        def normalized(value):
+            # listas (JSON) e tuplas (ProductDetector) com os mesmos valores são a mesma opção
+            return tuple(value) if isinstance(value, (list, tuple)) else value
+
+        mismatched = [name for name, value in options.items() if name in self.settings and normalized(self.settings[name]) != normalized(value)]
+        if mismatched:
+            details = ', '.join(f"{name}={options[name]!r} (servidor: {self.settings[name]!r})" for name in mismatched)
+            print(f"Aviso: opções do detector ignoradas com o servidor de inferência: {details}. Ajuste-as na linha de comando do servidor.")
+        return mismatched
+
+    def detect_products_array(self, frame):
+        with self._lock:
+            self._ensure_buffer(frame)
+            # a única cópia do frame: para a memória compartilhada
+            self.frame[...] = frame
+            self._request_id += 1
+            self.connection.send({'type': 'detect', 'request_id': self._request_id})
+            while True:
+                if not self.connection.poll(self.timeout):
+                    # o servidor ainda pode ler o frame desta requisição: o próximo vai para um segmento novo
+                    # (o atual é desvinculado, mas continua válido para quem já o mapeou)
+                    self._release_buffer()
+                    raise TimeoutError("O servidor de inferência não respondeu a tempo.")
+                message = self.connection.recv()
+                if message.get('request_id') == self._request_id:
+                    break
+            if message['boxes'] is None:
+                raise RuntimeError("O servidor de inferência falhou ao processar o frame.")
+            return message['boxes']
+
+    def detections_to_dicts(self, boxes):
+        return [{
+            'class': self.class_name(int(cls_id)),
+            'class_id': int(cls_id),
+            'confidence': float(conf),
+            'bbox': [float(x1), float(y1), float(x2), float(y2)]
+        } for x1, y1, x2, y2, conf, cls_id in boxes]
+
+    def close(self):
+        with self._lock:
+            try:
+                self.connection.send({'type': 'close'})
+            except (EOFError, OSError):
+                pass
+            self.connection.close()
+            self._release_buffer()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servidor local de inferência compartilhado entre totens.')
+    parser.add_argument('--host', default=DEFAULT_ADDRESS[0], help='endereço de loopback ouvido (os frames passam por memória compartilhada)')
+    parser.add_argument('--port', type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument('--backend', default=None, choices=['pytorch', 'onnx', 'openvino'])
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=None, help='confiança mínima (padrão do ProductDetector)')
+    parser.add_argument('--iou', type=float, default=None, help='IoU do NMS (padrão do ProductDetector)')
+    parser.add_argument('--roi', type=int, nargs=4, default=None, metavar=('X1', 'Y1', 'X2', 'Y2'), help='região da bandeja no frame')
+    parser.add_argument('--tiles', type=int, nargs=2, default=None, metavar=('COLUNAS', 'LINHAS'), help='grade do modo em tiles')
+    parser.add_argument('--tile-overlap', type=float, default=None, help='sobreposição entre tiles')
+    parser.add_argument('--latency-budget-ms', type=float, default=None, help='orçamento por frame; ativa o imgsz adaptativo')
+    parser.add_argument('--batch-size', type=int, default=8, help='máximo de frames por lote')
+    parser.add_argument('--max-wait-ms', type=float, default=10.0, help='orçamento de latência para formar o lote')
+    parser.add_argument('--authkey-file', help=f'arquivo com a chave dos clientes (padrão: {AUTHKEY_ENV} ou {DEFAULT_AUTHKEY_FILE}, gerado se não existir)')
+    args = parser.parse_args(argv)
+
+    # um cliente de outra máquina não conseguiria abrir o segmento de memória compartilhada do frame
+    if not is_loopback(args.host):
+        parser.error(f"--host {args.host} não é um endereço de loopback: os frames passam por memória compartilhada, então os totens precisam estar na mesma máquina do servidor.")
+    try:
+        authkey = load_authkey(args.authkey_file or DEFAULT_AUTHKEY_FILE, create=args.authkey_file is None)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    if project_root not in sys.path:
+        sys.path.insert(0, project_root)
+    from vision.product_detector import ProductDetector
+
+    options = {
+        'conf': args.conf,
+        'iou': args.iou,
+        'roi': args.roi,
+        'tiles': args.tiles,
+        'tile_overlap': args.tile_overlap,
+        'latency_budget': args.latency_budget_ms / 1000 if args.latency_budget_ms else None,
+    }
+    detector = ProductDetector(backend=args.backend, batch_size=args.batch_size, imgsz=args.imgsz, **{name: value for name, value in options.items() if value is not None})
+    server = InferenceServer(detector, authkey, (args.host, args.port), max_batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Servidor de inferência encerrado.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import numpy as np
+import time
+
+class MotionDetector:
+    """
+    Detector de mudança barato colocado antes do ProductDetector: compara uma versão
+    reduzida e em tons de cinza do frame com a do último frame que passou pelo modelo.
+    Enquanto a cena não muda, as detecções anteriores podem ser reaproveitadas.
+    """
+    def __init__(self, threshold=0.01, pixel_threshold=25, max_reuse_age=2.0, size=(80, 60)):
+        """
+        :param threshold: Fração mínima de pixels alterados para considerar que a cena mudou.
+        :param pixel_threshold: Diferença mínima de intensidade (0-255) para um pixel contar como alterado.
+        :param max_reuse_age: Tempo máximo (s) reaproveitando detecções antes de forçar uma nova inferência.
+        :param size: Resolução (largura, altura) usada na comparação.
+        """
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_reuse_age = max_reuse_age
+        self.size = size
+
+        # buffers pré-alocados para não alocar memória a cada frame
+        self._small = None
+        self._gray = np.empty((size[1], size[0]), dtype=np.uint8)
+        self._diff = np.empty_like(self._gray)
+        self._reference = np.empty_like(self._gray)
+
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.reset()
+
+    def reset(self):
+        # força inferência no próximo frame
+        self._has_reference = False
+        self._reference_time = 0.0
+
+    def needs_inference(self, frame, now=None):
+        """
+        :param frame: Frame BGR.
+        :param now: Timestamp monotônico do frame (usa time.monotonic() se omitido).
+        :return: True se a cena mudou (ou as detecções expiraram) e o modelo deve rodar.
+                 Nesse caso o frame passa a ser a nova referência.
+        """
+        # importado aqui para o cv2 não pesar na inicialização do app
+        import cv2
+        now = time.monotonic() if now is None else now
+        self.frames_checked += 1
+
+        self._small = cv2.resize(frame, self.size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+        if self._has_reference and now - self._reference_time <= self.max_reuse_age:
+            cv2.absdiff(self._gray, self._reference, dst=self._diff)
+            changed_pixels = np.count_nonzero(self._diff > self.pixel_threshold)
+            if changed_pixels / self._diff.size <= self.threshold:
+                self.frames_skipped += 1
+                return False
+
+        self._reference[:] = self._gray
+        self._has_reference = True
+        self._reference_time = now
+        return True
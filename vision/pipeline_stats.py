@@ -0,0 +1,192 @@
+import gc
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# limites (ms) dos buckets do histograma exportado no formato Prometheus
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+class RollingHistogram:
+    """
+    Guarda as últimas window amostras de um estágio em um array pré-alocado
+    (para percentis recentes) e contadores acumulados por bucket (para exportação).
+    """
+    def __init__(self, window=512):
+        self._samples = np.zeros(window, dtype=np.float64)
+        self._cursor = 0
+        self._filled = 0
+        self.count = 0
+        self.total = 0.0
+        self.bucket_counts = np.zeros(len(HISTOGRAM_BUCKETS_MS) + 1, dtype=np.int64)
+
+    def add(self, value_ms):
+        self._samples[self._cursor] = value_ms
+        self._cursor = (self._cursor + 1) % len(self._samples)
+        self._filled = min(self._filled + 1, len(self._samples))
+        self.count += 1
+        self.total += value_ms
+        self.bucket_counts[np.searchsorted(HISTOGRAM_BUCKETS_MS, value_ms)] += 1
+
+    def summary(self):
+        if not self._filled:
+            return {'count': self.count, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        recent = self._samples[:self._filled]
+        p50, p95, p99 = np.percentile(recent, (50, 95, 99))
+        return {
+            'count': self.count,
+            'mean_ms': round(float(recent.mean()), 2),
+            'p50_ms': round(float(p50), 2),
+            'p95_ms': round(float(p95), 2),
+            'p99_ms': round(float(p99), 2),
+            'max_ms': round(float(recent.max()), 2),
+        }
+
+class PipelineStats:
+    """
+    Tempos por estágio do pipeline (captura → inferência → interface), contadores
+    e medidas instantâneas. Seguro para uso por várias threads.
+    """
+    def __init__(self, window=512):
+        self.window = window
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started_at = time.time()
+        # referência dos tempos de inicialização: o módulo é importado logo no início do main.py
+        self._process_start = time.perf_counter()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = RollingHistogram(self.window)
+            histogram.add(seconds * 1000)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def mark_startup(self, event):
+        """
+        Registra uma única vez o tempo (s) desde o início do processo até event,
+        como a medida 'startup_<event>_s'.
+        """
+        name = f'startup_{event}_s'
+        with self._lock:
+            if name in self.gauges:
+                return
+            elapsed = time.perf_counter() - self._process_start
+            self.gauges[name] = round(elapsed, 3)
+        print(f"Inicialização: {event} em {elapsed:.2f}s")
+
+    def snapshot(self):
+        with self._lock:
+            gauges = dict(self.gauges)
+            gauges['gc_gen0_collections'] = gc.get_stats()[0]['collections']
+            return {
+                'timestamp': time.time(),
+                'uptime_s': round(time.time() - self.started_at, 1),
+                'stages': {name: histogram.summary() for name, histogram in self.stages.items()},
+                'counters': dict(self.counters),
+                'gauges': gauges,
+            }
+
+    def format_overlay(self):
+        snapshot = self.snapshot()
+        lines = [f"{name}: {s['p50_ms']:.1f} / {s['p95_ms']:.1f} ms" for name, s in snapshot['stages'].items()]
+        lines += [f"{name}: {value}" for name, value in snapshot['counters'].items()]
+        lines += [f"{name}: {value:.1f}" if isinstance(value, float) else f"{name}: {value}" for name, value in snapshot['gauges'].items()]
+        return '\n'.join(lines)
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, histogram in self.stages.items():
+                metric = f'ai_totem_stage_{name}_ms'
+                lines.append(f'# TYPE {metric} histogram')
+                cumulative = np.cumsum(histogram.bucket_counts)
+                for bound, value in zip(HISTOGRAM_BUCKETS_MS, cumulative):
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {value}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {cumulative[-1]}')
+                lines.append(f'{metric}_sum {histogram.total:.3f}')
+                lines.append(f'{metric}_count {histogram.count}')
+            for name, value in self.counters.items():
+                lines.append(f'# TYPE ai_totem_{name}_total counter')
+                lines.append(f'ai_totem_{name}_total {value}')
+            for name, value in self.gauges.items():
+                lines.append(f'# TYPE ai_totem_{name} gauge')
+                lines.append(f'ai_totem_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        # grava em arquivo temporário e renomeia para o leitor nunca ver um JSON pela metade
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temp_path, path)
+
+    def start_file_export(self, path, interval=5.0):
+        def export_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_json(path)
+                except Exception as e:
+                    print(f"Erro ao gravar métricas em {path}: {e}")
+        threading.Thread(target=export_loop, daemon=True).start()
+        print(f"Métricas do pipeline gravadas em '{path}' a cada {interval:.0f}s.")
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """
+        Serve /metrics (formato Prometheus) e /stats.json em uma thread própria.
+        """
+        stats = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body, content_type = stats.to_prometheus(), 'text/plain; version=0.0.4'
+                elif self.path == '/stats.json':
+                    body, content_type = json.dumps(stats.snapshot()), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                payload = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Métricas do pipeline em http://{host}:{port}/metrics")
+        return server
+
+    def start_exporters(self, metrics_file=None, metrics_port=None):
+        """
+        :param metrics_file: Caminho do JSON gravado periodicamente (config metrics.file / AI_TOTEM_METRICS_FILE).
+        :param metrics_port: Porta local do endpoint HTTP (config metrics.port / AI_TOTEM_METRICS_PORT).
+        """
+        if metrics_file:
+            self.start_file_export(metrics_file)
+        if metrics_port:
+            try:
+                self.start_http_server(int(metrics_port))
+            except Exception as e:
+                print(f"Erro ao iniciar o endpoint de métricas na porta {metrics_port}: {e}")
+
+# instância compartilhada pelo pipeline do totem
+pipeline_stats = PipelineStats()
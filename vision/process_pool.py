@@ -0,0 +1,288 @@
+"""
+Inferência em processos separados, fora do GIL do processo da interface.
+
+Cada processo de trabalho carrega o seu próprio ProductDetector. Os frames são
+copiados para slots pré-alocados de um segmento SharedMemory e os processos
+recebem pela fila apenas o índice do slot; só as caixas detectadas (N x 6) voltam
+serializadas. Com vários processos, várias threads de visão podem chamar
+detect_products_array ao mesmo tempo e cada frame vai para o primeiro processo livre.
+
+Um slot só volta a ficar livre quando o resultado do frame chega (ou quando o processo
+que o lia morre), mesmo que quem pediu já tenha desistido por timeout. Um processo que
+morre é substituído por outro, até MAX_RESTARTS vezes.
+
+Exemplo:
+    AI_TOTEM_INFERENCE_WORKERS=2 python main.py
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from queue import Empty, Queue
+
+import numpy as np
+
+DEFAULT_START_TIMEOUT = 300.0
+# intervalo (s) entre as verificações dos processos de inferência
+MONITOR_INTERVAL = 1.0
+# substituições de processos mortos antes de o pool desistir
+MAX_RESTARTS = 5
+
+def _worker_main(tasks, results, backend, imgsz, threads, detector_options, worker_index=0, current_requests=None):
+    # limita as threads de cada processo para os processos não disputarem os mesmos núcleos
+    if threads:
+        os.environ.setdefault('OMP_NUM_THREADS', str(threads))
+    try:
+        from vision.product_detector import ProductDetector
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        detector = ProductDetector(backend=backend, imgsz=imgsz, **detector_options)
+        # aquece cada processo antes de ele receber frames
+        detector.detect_products_array(np.zeros((480, 640, 3), dtype=np.uint8))
+    except Exception as e:
+        results.put(('error', None, str(e)))
+        return
+    results.put(('ready', None, list(detector.class_names)))
+
+    buffers = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        request_id, shm_name, shape, dtype, slot = task
+        # o processo principal lê este valor se o processo morrer no meio do frame
+        if current_requests is not None:
+            current_requests[worker_index] = request_id
+        try:
+            if shm_name not in buffers:
+                # os processos filhos usam o mesmo resource_tracker do pai, que já registrou o segmento
+                shm = shared_memory.SharedMemory(name=shm_name)
+                buffers[shm_name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+            frames = buffers[shm_name][1]
+            results.put(('result', request_id, detector.detect_products_array(frames[slot])))
+        except Exception as e:
+            results.put(('failed', request_id, str(e)))
+        if current_requests is not None:
+            current_requests[worker_index] = 0
+
+    for shm, _ in buffers.values():
+        shm.close()
+
+class ProcessPoolDetector:
+    """
+    Mesma interface de detecção do ProductDetector (detect_products_array,
+    detections_to_dicts, class_name), com a inferência distribuída entre processos.
+    """
+    def __init__(self, num_workers=2, backend=None, imgsz=640, threads_per_worker=None, timeout=5.0, **detector_options):
+        """
+        :param num_workers: Quantidade de processos de inferência.
+        :param threads_per_worker: Threads do torch em cada processo; por padrão divide os núcleos entre os processos.
+        :param timeout: Tempo máximo (s) de espera pelo resultado de um frame.
+        :param detector_options: Demais argumentos do ProductDetector (ex: roi, latency_budget).
+        """
+        if num_workers < 1:
+            raise ValueError("num_workers deve ser maior ou igual a 1.")
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.backend = f'{backend or os.environ.get("AI_TOTEM_BACKEND", "pytorch")} x{num_workers} processos'
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // num_workers)
+
+        # 'spawn' evita herdar por fork o estado do Kivy e as threads do processo da interface
+        self._context = multiprocessing.get_context('spawn')
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        # request_id que cada processo está processando (0 = nenhum)
+        self._current_requests = self._context.Array('q', num_workers, lock=False)
+        self._worker_args = (self._tasks, self._results, backend, imgsz, threads_per_worker, detector_options)
+        self._workers = [self._start_worker(index) for index in range(num_workers)]
+        self.restarts = 0
+
+        self.class_names = None
+        try:
+            ready = 0
+            deadline = time.monotonic() + DEFAULT_START_TIMEOUT
+            while ready < num_workers:
+                try:
+                    kind, _, payload = self._results.get(timeout=MONITOR_INTERVAL)
+                except Empty:
+                    # um processo que morre ao carregar (ex: sem memória) não manda mensagem nenhuma
+                    dead = [worker for worker in self._workers if not worker.is_alive()]
+                    if dead:
+                        raise RuntimeError(f"O processo de inferência morreu ao carregar o modelo (código {dead[0].exitcode}).")
+                    if time.monotonic() > deadline:
+                        raise TimeoutError("Os processos de inferência não carregaram o modelo a tempo.")
+                    continue
+                if kind == 'error':
+                    raise RuntimeError(f"Falha ao carregar o modelo no processo de inferência: {payload}")
+                self.class_names = payload
+                ready += 1
+        except Exception:
+            self._stop_workers()
+            raise
+
+        # dois slots por processo: um frame em inferência e o próximo já copiado
+        self._slot_count = num_workers * 2
+        self._free_slots = Queue()
+        for slot in range(self._slot_count):
+            self._free_slots.put(slot)
+        self._lock = threading.Lock()
+        # request_id -> (future, slot); o slot volta para _free_slots quando a entrada sai daqui
+        self._pending = {}
+        self._request_id = 0
+        self._buffers = {}
+        self._closed = False
+        self._failure = None
+
+        self._result_thread = threading.Thread(target=self._result_loop, daemon=True)
+        self._result_thread.start()
+        self._monitor_stop = threading.Event()
+        self._monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
+        self._monitor_thread.start()
+        print(f"Inferência em {num_workers} processo(s), {threads_per_worker} thread(s) cada.")
+
+    def _start_worker(self, index):
+        worker = self._context.Process(target=_worker_main, args=self._worker_args + (index, self._current_requests), daemon=True)
+        worker.start()
+        return worker
+
+    def _finish_request(self, request_id):
+        """
+        Tira o pedido de _pending e devolve o slot dele, uma única vez por pedido.
+
+        :return: O Future do pedido ou None se ele já foi finalizado.
+        """
+        with self._lock:
+            entry = self._pending.pop(request_id, None)
+        if entry is None:
+            return None
+        future, slot = entry
+        self._free_slots.put(slot)
+        return future
+
+    def _monitor_loop(self):
+        while not self._monitor_stop.wait(MONITOR_INTERVAL):
+            for index, worker in enumerate(self._workers):
+                if worker.is_alive() or self._closed:
+                    continue
+                # o frame que o processo lia nunca terá resposta: falha o pedido e libera o slot
+                request_id = self._current_requests[index]
+                self._current_requests[index] = 0
+                future = self._finish_request(request_id) if request_id else None
+                if future is not None:
+                    future.set_exception(RuntimeError(f"O processo de inferência morreu (código {worker.exitcode}) ao processar o frame."))
+                if self.restarts >= MAX_RESTARTS:
+                    self._fail_pool(f"processos de inferência morreram {self.restarts + 1} vezes")
+                    return
+                self.restarts += 1
+                print(f"Processo de inferência #{index} morreu (código {worker.exitcode}); reiniciando ({self.restarts}/{MAX_RESTARTS}).")
+                self._workers[index] = self._start_worker(index)
+
+    def _fail_pool(self, reason):
+        # sem processos para atender: os pedidos em espera e os próximos falham na hora
+        print(f"Pool de inferência desativado: {reason}.")
+        self._failure = reason
+        with self._lock:
+            request_ids = list(self._pending)
+        for request_id in request_ids:
+            future = self._finish_request(request_id)
+            if future is not None:
+                future.set_exception(RuntimeError(f"O pool de inferência foi desativado: {reason}."))
+
+    def _frames_for(self, frame):
+        # um segmento por formato de frame, criado no primeiro uso e reaproveitado
+        key = (frame.shape, frame.dtype.str)
+        entry = self._buffers.get(key)
+        if entry is None:
+            shm = shared_memory.SharedMemory(create=True, size=frame.nbytes * self._slot_count)
+            entry = self._buffers[key] = (shm, np.ndarray((self._slot_count,) + frame.shape, dtype=frame.dtype, buffer=shm.buf))
+        return entry
+
+    def _result_loop(self):
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            kind, request_id, payload = message
+            if kind == 'error':
+                # um processo reiniciado não conseguiu carregar o modelo; o monitor o substitui
+                print(f"Falha ao carregar o modelo no processo de inferência: {payload}")
+                continue
+            future = self._finish_request(request_id) if request_id is not None else None
+            if future is None:
+                continue
+            if kind == 'result':
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(f"O processo de inferência falhou ao processar o frame: {payload}"))
+
+    def class_name(self, cls_id):
+        return self.class_names[cls_id] if cls_id < len(self.class_names) else f'classe_{cls_id}'
+
+    def detect_products_array(self, frame):
+        """
+        Bloqueia só a thread chamadora (sem segurar o GIL) até um processo devolver as caixas.
+        """
+        if self._failure is not None:
+            raise RuntimeError(f"O pool de inferência foi desativado: {self._failure}.")
+        try:
+            slot = self._free_slots.get(timeout=self.timeout)
+        except Empty:
+            # todos os slots presos em frames que ainda não voltaram
+            raise TimeoutError("Nenhum slot livre: os processos de inferência não estão respondendo.")
+        future = Future()
+        try:
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("O pool de inferência foi encerrado.")
+                shm, frames = self._frames_for(frame)
+                self._request_id += 1
+                request_id = self._request_id
+            # a única cópia do frame: para o slot na memória compartilhada
+            frames[slot][...] = frame
+            with self._lock:
+                self._pending[request_id] = (future, slot)
+            self._tasks.put((request_id, shm.name, frames.shape, frames.dtype.str, slot))
+        except BaseException:
+            # o pedido não chegou a nenhum processo: o slot volta direto
+            self._free_slots.put(slot)
+            raise
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # o pedido continua em _pending: o slot só é liberado quando o resultado chegar
+            raise TimeoutError("O processo de inferência não respondeu a tempo.")
+
+    def detections_to_dicts(self, boxes):
+        return [{
+            'class': self.class_name(int(cls_id)),
+            'class_id': int(cls_id),
+            'confidence': float(conf),
+            'bbox': [float(x1), float(y1), float(x2), float(y2)]
+        } for x1, y1, x2, y2, conf, cls_id in boxes]
+
+    def _stop_workers(self):
+        for _ in self._workers:
+            self._tasks.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5.0)
+            if worker.is_alive():
+                worker.terminate()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._monitor_stop.set()
+        self._monitor_thread.join(timeout=MONITOR_INTERVAL * 2)
+        self._stop_workers()
+        self._results.put(None)
+        self._result_thread.join(timeout=1.0)
+        for shm, _ in self._buffers.values():
+            shm.close()
+            shm.unlink()
+        self._buffers = {}
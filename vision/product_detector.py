@@ -1,30 +1,130 @@
-import cv2
-from ultralytics import YOLO
 import numpy as np
+import os
+import threading
+import time
 from pathlib import Path
 
+# backends de inferência suportados: o nome é o mesmo 'format' usado por model.export()
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+# a cada quantos frames o tempo médio de inferência é impresso
+TIMING_LOG_INTERVAL = 100
+
+# tamanho padrão do lote em detect_products_batch e lado da imagem de entrada do modelo
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_IMGSZ = 640
+
+# limiares do NMS: confiança mínima e IoU acima do qual caixas sobrepostas são fundidas
+DEFAULT_CONF = 0.70
+DEFAULT_IOU = 0.25
+
+# modo adaptativo: lados de entrada (múltiplos de 32) usados quando a latência estoura o orçamento
+ADAPTIVE_IMGSZ_STEPS = (640, 512, 416, 320)
+# só volta para a resolução maior quando a latência média fica abaixo desta fração do orçamento
+ADAPTIVE_HEADROOM = 0.5
+# frames medidos após cada troca antes de reavaliar (evita oscilar entre duas resoluções)
+ADAPTIVE_COOLDOWN_FRAMES = 15
+
+# modo em tiles: fração de cada tile compartilhada com o vizinho (um item na divisa aparece inteiro em um deles)
+DEFAULT_TILE_OVERLAP = 0.2
+# fusão entre tiles: caixas da mesma classe cuja interseção cobre esta fração da menor delas são o mesmo item
+TILE_MERGE_IOS = 0.6
+# distância (px) de uma divisa interna a partir da qual a caixa de um tile é considerada cortada
+TILE_BORDER_MARGIN = 2
+
+def tile_windows(height, width, tiles, overlap):
+    """
+    :param tiles: Grade (colunas, linhas).
+    :return: Array int (N, 4) com x1, y1, x2, y2 de cada tile, todos do mesmo tamanho, cobrindo a imagem inteira.
+    """
+    def starts(length, count):
+        # tamanho do tile para count tiles com a sobreposição pedida cobrirem length pixels
+        size = min(int(np.ceil(length / (count - (count - 1) * overlap))), length)
+        if count == 1:
+            return [0], size
+        step = (length - size) / (count - 1)
+        return [int(round(i * step)) for i in range(count)], size
+
+    xs, tile_width = starts(width, tiles[0])
+    ys, tile_height = starts(height, tiles[1])
+    return np.array([(x, y, x + tile_width, y + tile_height) for y in ys for x in xs], dtype=np.int32)
+
+def non_max_suppression(boxes, iou_threshold, metric='iou'):
+    """
+    NMS por classe sobre o array (N, 6) de detect_products_array; mantém a caixa de maior confiança.
+
+    :param metric: 'iou' (interseção sobre união) ou 'ios' (interseção sobre a menor caixa, que
+                   também funde o pedaço de um item cortado na divisa com a caixa do item inteiro).
+    """
+    if len(boxes) < 2:
+        return boxes
+    # desloca cada classe para uma região própria: caixas de classes diferentes nunca se sobrepõem
+    shift = boxes[:, 5:6] * (boxes[:, :4].max() + 1)
+    x1, y1, x2, y2 = (boxes[:, :4] + shift).T
+    areas = (x2 - x1) * (y2 - y1)
+    order = np.argsort(-boxes[:, 4], kind='stable')
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        width = np.clip(np.minimum(x2[best], x2[rest]) - np.maximum(x1[best], x1[rest]), 0, None)
+        height = np.clip(np.minimum(y2[best], y2[rest]) - np.maximum(y1[best], y1[rest]), 0, None)
+        intersection = width * height
+        if metric == 'ios':
+            overlap = intersection / (np.minimum(areas[best], areas[rest]) + 1e-9)
+        else:
+            overlap = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[overlap <= iou_threshold]
+    return boxes[np.array(keep)]
+
 class ProductDetector:
-    def __init__(self):
+    def __init__(self, backend=None, batch_size=DEFAULT_BATCH_SIZE, imgsz=DEFAULT_IMGSZ, model_path=None, roi=None, latency_budget=None, conf=DEFAULT_CONF, iou=DEFAULT_IOU, tiles=None, tile_overlap=DEFAULT_TILE_OVERLAP):
+        """
+        :param conf: Confiança mínima de uma detecção.
+        :param iou: IoU do NMS entre caixas da mesma classe.
+        :param roi: Região da bandeja (x1, y1, x2, y2) em pixels do frame; só ela é enviada ao modelo.
+        :param latency_budget: Orçamento (s) de inferência por frame; se definido, ativa o imgsz adaptativo.
+                               No modo em tiles o orçamento vale para o frame inteiro (todos os tiles e o recorte).
+        :param tiles: Grade (colunas, linhas) do modo em tiles para bandejas cheias de itens pequenos;
+                      None roda o modelo uma vez no frame inteiro.
+        :param tile_overlap: Fração de sobreposição entre tiles vizinhos.
+        """
+        # o backend pode vir do construtor ou da variável de ambiente AI_TOTEM_BACKEND
+        self.backend = (backend or os.environ.get('AI_TOTEM_BACKEND', 'pytorch')).lower()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Backend '{self.backend}' inválido. Use um de: {', '.join(BACKENDS)}")
+        if batch_size < 1:
+            raise ValueError("batch_size deve ser maior ou igual a 1")
+        self.batch_size = batch_size
+        self.conf = conf
+        self.iou = iou
+        # todos os frames de um lote são redimensionados com letterbox para imgsz x imgsz
+        self.imgsz = imgsz
+        self.roi = self._validate_roi(roi)
+        self._set_tiles(tiles, tile_overlap)
+
+        # no modo adaptativo o imgsz desce pelos degraus quando a latência passa do orçamento;
+        # o lock impede que o hot reload troque os degraus no meio de uma troca de degrau da thread de visão
+        self.latency_budget = latency_budget
+        self._adaptive_lock = threading.Lock()
+        self._reset_adaptive_imgsz(imgsz)
+
         try:
             project_root = Path(__file__).resolve().parents[1] 
            
-            self.model_path = project_root / "runs" / "detect" / "fruits_yolo_retrain" / "weights" / "best.pt"
+            # model_path permite avaliar outro modelo (ex: benchmark); por padrão usa o melhor treino disponível
+            self.model_path = Path(model_path) if model_path else project_root / "runs" / "detect" / "fruits_yolo_retrain" / "weights" / "best.pt"
             
+            if model_path and not self.model_path.exists():
+                raise FileNotFoundError(f"Modelo não encontrado em: {self.model_path}")
             if not self.model_path.exists():
                 self.model_path = project_root / "runs" / "detect" / "fruits_yolo3" / "weights" / "best.pt"
                 if not self.model_path.exists():
                     raise FileNotFoundError(f"Modelo não encontrado em: {project_root / 'runs' / 'detect' / 'fruits_yolo_retrain' / 'weights' / 'best.pt'} ou {project_root / 'runs' / 'detect' / 'fruits_yolo3' / 'weights' / 'best.pt'}")
 
 
-            self.model = YOLO(str(self.model_path))
-            print(f"Modelo YOLO carregado com sucesso de: {self.model_path}")
-            
-            
-            # limiar de confiança: reduzi para ser menos restritivo.
-            self.model.conf = 0.70 
-
-        
-            self.model.iou = 0.25 
+            self.model = self._load_model()
+            print(f"Modelo YOLO ({self.backend}) carregado com sucesso de: {self.model_path}")
 
         except Exception as e:
             print(f"Erro ao carregar o modelo YOLO: {e}")
@@ -35,27 +135,304 @@ class ProductDetector:
         # converte os valores do dicionário para uma lista de strings
         if isinstance(self.class_names, dict):
             self.class_names = list(self.class_names.values())
-        
-    def detect_products(self, frame):
-        results = self.model(frame) 
+
+        # acumuladores para o log de tempo por frame
+        self._timing_total = 0.0
+        self._timing_frames = 0
+        self._timing_inputs = 0
+
+    @staticmethod
+    def _validate_roi(roi):
+        roi = tuple(int(v) for v in roi) if roi else None
+        if roi and len(roi) != 4:
+            raise ValueError(f"ROI inválida: {roi}. Use 4 valores (x1, y1, x2, y2).")
+        if roi and (roi[2] <= roi[0] or roi[3] <= roi[1]):
+            raise ValueError(f"ROI inválida: {roi}. Use (x1, y1, x2, y2) com x2 > x1 e y2 > y1.")
+        return roi
+
+    @property
+    def tiles(self):
+        return self._tiling[0]
+
+    @property
+    def tile_overlap(self):
+        return self._tiling[1]
+
+    def _set_tiles(self, tiles, tile_overlap):
+        tiles = tuple(int(v) for v in tiles) if tiles else None
+        if tiles and (len(tiles) != 2 or min(tiles) < 1):
+            raise ValueError(f"tiles inválido: {tiles}. Use (colunas, linhas) com valores >= 1.")
+        if not 0 <= tile_overlap < 1:
+            raise ValueError(f"tile_overlap deve estar em [0, 1): {tile_overlap}")
+        # grade, sobreposição e o cache de geometria/buffer por formato do recorte trocam juntos, em uma
+        # única atribuição: a thread de visão lê a tupla uma vez por frame e nunca vê uma troca pela metade
+        self._tiling = (tiles if tiles != (1, 1) else None, tile_overlap, {})
+
+    def _tile_layout(self, shape, tiling):
+        """
+        :param tiling: Tupla (tiles, tile_overlap, cache) lida de self._tiling no início do frame.
+        :return: (janelas (N, 4) dos tiles no recorte, buffer (N, altura, largura, canais) reaproveitado entre frames).
+        """
+        tiles, tile_overlap, layouts = tiling
+        layout = layouts.get(shape)
+        if layout is None:
+            windows = tile_windows(shape[0], shape[1], tiles, tile_overlap)
+            tile_height = windows[0, 3] - windows[0, 1]
+            tile_width = windows[0, 2] - windows[0, 0]
+            buffer = np.empty((len(windows), tile_height, tile_width) + tuple(shape[2:]), dtype=np.uint8)
+            layout = layouts[shape] = (windows, buffer)
+        return layout
+
+    def _reset_adaptive_imgsz(self, imgsz):
+        with self._adaptive_lock:
+            self._imgsz_steps = (imgsz,) + tuple(size for size in ADAPTIVE_IMGSZ_STEPS if size < imgsz)
+            self._imgsz_index = 0
+            self.imgsz = imgsz
+            self._latency_average = None
+            self._frames_since_switch = 0
+
+    def update_settings(self, conf=None, iou=None, roi=None, latency_budget=None, imgsz=None, tiles=None, tile_overlap=DEFAULT_TILE_OVERLAP):
+        """
+        Aplica uma nova configuração sem recarregar o modelo (ver config.ConfigManager).
+        roi, latency_budget e tiles são aplicados como vieram, inclusive None (sem ROI / sem modo adaptativo / sem tiles).
+        """
+        roi = self._validate_roi(roi)
+        if (tuple(tiles) if tiles else None, tile_overlap) != (self.tiles, self.tile_overlap):
+            self._set_tiles(tiles, tile_overlap)
+        if conf is not None:
+            self.conf = conf
+        if iou is not None:
+            self.iou = iou
+        self.roi = roi
+        with self._adaptive_lock:
+            self.latency_budget = latency_budget
+        if imgsz is not None and imgsz != self._imgsz_steps[0]:
+            self._reset_adaptive_imgsz(imgsz)
+
+    def settings(self):
+        """
+        :return: Opções atuais no formato de update_settings; imgsz é o configurado, não o degrau do modo adaptativo.
+        """
+        return {
+            'conf': self.conf,
+            'iou': self.iou,
+            'roi': self.roi,
+            'latency_budget': self.latency_budget,
+            'imgsz': self._imgsz_steps[0],
+            'tiles': self.tiles,
+            'tile_overlap': self.tile_overlap,
+        }
+
+    def _exported_model_path(self):
+        # caminho onde o ultralytics grava o export ao lado do best.pt
+        if self.backend == 'onnx':
+            return self.model_path.with_suffix('.onnx')
+        return self.model_path.parent / f"{self.model_path.stem}_openvino_model"
+
+    def _load_model(self):
+        # ultralytics (e o torch) só são importados quando o modelo é de fato carregado
+        from ultralytics import YOLO
+        if self.backend == 'pytorch':
+            return YOLO(str(self.model_path))
+
+        # o export é feito uma única vez e reaproveitado enquanto for mais novo que o best.pt
+        exported_path = self._exported_model_path()
+        if not exported_path.exists() or exported_path.stat().st_mtime < self.model_path.stat().st_mtime:
+            print(f"Exportando modelo para {self.backend} (apenas no primeiro uso)...")
+            # dynamic=True permite lotes de tamanho variável em detect_products_batch
+            exported_path = Path(YOLO(str(self.model_path)).export(format=self.backend, imgsz=self.imgsz, dynamic=True))
+
+        return YOLO(str(exported_path), task='detect')
+
+    def _log_inference_time(self, elapsed, frames=1, inputs=None):
+        """
+        :param inputs: Imagens enviadas ao modelo para esses frames (no modo em tiles, tiles + recorte por frame).
+        """
+        self._timing_total += elapsed
+        self._timing_frames += frames
+        self._timing_inputs += inputs or frames
+        if self._timing_frames >= TIMING_LOG_INTERVAL:
+            average_ms = self._timing_total / self._timing_frames * 1000
+            per_input = f", {self._timing_inputs / self._timing_frames:.0f} entradas do modelo por frame" if self._timing_inputs != self._timing_frames else ''
+            print(f"[{self.backend}] Tempo médio de inferência: {average_ms:.1f} ms/frame ({self._timing_frames} frames{per_input})")
+            self._timing_total = 0.0
+            self._timing_frames = 0
+            self._timing_inputs = 0
+
+    def _update_adaptive_imgsz(self, elapsed_per_frame):
+        with self._adaptive_lock:
+            budget = self.latency_budget
+            if budget is None:
+                return
+            # média móvel exponencial da latência na resolução atual
+            if self._latency_average is None:
+                self._latency_average = elapsed_per_frame
+            else:
+                self._latency_average = 0.8 * self._latency_average + 0.2 * elapsed_per_frame
+            self._frames_since_switch += 1
+            if self._frames_since_switch < ADAPTIVE_COOLDOWN_FRAMES:
+                return
+
+            index = self._imgsz_index
+            if self._latency_average > budget and index < len(self._imgsz_steps) - 1:
+                index += 1
+            elif self._latency_average < budget * ADAPTIVE_HEADROOM and index > 0:
+                index -= 1
+            else:
+                return
+            print(f"[{self.backend}] Latência média {self._latency_average * 1000:.1f} ms (orçamento {budget * 1000:.0f} ms): imgsz {self.imgsz} -> {self._imgsz_steps[index]}")
+            self._imgsz_index = index
+            self.imgsz = self._imgsz_steps[index]
+            self._latency_average = None
+            self._frames_since_switch = 0
+
+    def _crop(self, frame):
+        """
+        :return: (view da ROI sem cópia, deslocamento (x, y) da ROI no frame).
+        """
+        if self.roi is None:
+            return frame, (0, 0)
+        height, width = frame.shape[:2]
+        x1, y1 = min(max(self.roi[0], 0), width - 1), min(max(self.roi[1], 0), height - 1)
+        x2, y2 = min(self.roi[2], width), min(self.roi[3], height)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def _to_frame_coordinates(self, boxes, offset):
+        # as caixas saem em coordenadas da ROI; desloca x1, y1, x2, y2 de volta para o frame inteiro
+        if offset != (0, 0) and len(boxes):
+            boxes[:, [0, 2]] += offset[0]
+            boxes[:, [1, 3]] += offset[1]
+        return boxes
+
+    def class_name(self, cls_id):
+        return self.class_names[cls_id] if cls_id < len(self.class_names) else f'classe_{cls_id}'
+
+    def _parse_result(self, result, offset=(0, 0)):
         detections = []
+        if result.boxes: # verifica se há caixas detectadas
+            # coordenadas [x1, y1, x2, y2] no frame inteiro, mesmo com ROI
+            boxes = self._to_frame_coordinates(result.boxes.data.cpu().numpy(), offset)
+            detections = self.detections_to_dicts(boxes)
         
-        # iterar sobre os resultados (pode haver mais de um se batch for maior que 1)
-        for result in results:
-            if result.boxes: # verifica se há caixas detectadas
-                boxes = result.boxes.xyxy.cpu().numpy()
-                confs = result.boxes.conf.cpu().numpy()
-                cls_ids = result.boxes.cls.cpu().numpy().astype(int)
-                
-                for box, conf, cls_id in zip(boxes, confs, cls_ids):
-                    class_name = self.class_names[cls_id] if cls_id < len(self.class_names) else f'classe_{cls_id}'
-                    detections.append({
-                        'class': class_name,
-                        'confidence': float(conf),
-                        'bbox': box.tolist() # coordenadas [x1, y1, x2, y2]
-                    })
-            
-            # o método .plot() desenha as caixas e labels no frame
-            frame_with_detections = result.plot()
-                
-        return detections, frame_with_detections
\ No newline at end of file
+        # o método .plot() desenha as caixas e labels no frame (com ROI, apenas na região recortada)
+        frame_with_detections = result.plot()
+        return detections, frame_with_detections
+
+    def detect_products(self, frame):
+        crop, offset = self._crop(frame)
+        start_time = time.perf_counter()
+        results = self.model(crop, imgsz=self.imgsz, conf=self.conf, iou=self.iou)
+        elapsed = time.perf_counter() - start_time
+        self._log_inference_time(elapsed)
+        self._update_adaptive_imgsz(elapsed)
+        return self._parse_result(results[0], offset)
+
+    def _predict_batches(self, frames):
+        """
+        :return: Gerador de pares (result, deslocamento da ROI) na mesma ordem dos frames.
+        """
+        for start in range(0, len(frames), self.batch_size):
+            crops, offsets = zip(*(self._crop(frame) for frame in frames[start:start + self.batch_size]))
+            start_time = time.perf_counter()
+            results = self.model(list(crops), imgsz=self.imgsz, conf=self.conf, iou=self.iou)
+            elapsed = time.perf_counter() - start_time
+            self._log_inference_time(elapsed, frames=len(crops))
+            self._update_adaptive_imgsz(elapsed / len(crops))
+            yield from zip(results, offsets)
+
+    def detect_products_batch(self, frames):
+        """
+        Executa a detecção em vários frames, agrupando até batch_size frames por chamada do modelo.
+
+        :param frames: Lista de frames BGR (podem ter tamanhos diferentes; o letterbox iguala o formato).
+        :return: Lista com um par (detections, frame_with_detections) por frame, na mesma ordem da entrada.
+        """
+        return [self._parse_result(result, offset) for result, offset in self._predict_batches(frames)]
+
+    @staticmethod
+    def _drop_cut_boxes(data, window, crop_shape):
+        """
+        Remove as caixas de um tile que encostam em uma divisa interna: são pedaços de um item
+        que aparece inteiro no tile vizinho (sobreposição) ou no recorte inteiro.
+        """
+        x1, y1, x2, y2 = window
+        width, height = x2 - x1, y2 - y1
+        margin = TILE_BORDER_MARGIN
+        cut = np.zeros(len(data), dtype=bool)
+        if x1 > 0:
+            cut |= data[:, 0] <= margin
+        if y1 > 0:
+            cut |= data[:, 1] <= margin
+        if x2 < crop_shape[1]:
+            cut |= data[:, 2] >= width - margin
+        if y2 < crop_shape[0]:
+            cut |= data[:, 3] >= height - margin
+        return data[~cut]
+
+    def _detect_tiles(self, frame, tiling):
+        """
+        Modo em tiles: cada tile é ampliado para imgsz, então itens pequenos ocupam mais pixels
+        na entrada do modelo. Os tiles e o recorte inteiro (para itens grandes que cruzam a
+        divisa) vão ao modelo em um único lote. Caixas cortadas por uma divisa interna são
+        descartadas e as restantes são unidas por um NMS de interseção sobre a menor caixa.
+        """
+        crop, offset = self._crop(frame)
+        windows, buffer = self._tile_layout(crop.shape, tiling)
+        # copia os tiles para o buffer contíguo do lote, sem alocar nada por frame
+        for tile, (x1, y1, x2, y2) in zip(buffer, windows):
+            np.copyto(tile, crop[y1:y2, x1:x2])
+
+        start_time = time.perf_counter()
+        results = self.model(list(buffer) + [crop], imgsz=self.imgsz, conf=self.conf, iou=self.iou)
+        elapsed = time.perf_counter() - start_time
+        # o lote inteiro é um frame da câmera: é a latência dele que o orçamento limita
+        self._log_inference_time(elapsed, inputs=len(buffer) + 1)
+        self._update_adaptive_imgsz(elapsed)
+
+        boxes = [
+            self._to_frame_coordinates(self._drop_cut_boxes(result.boxes.data.cpu().numpy(), window, crop.shape), (offset[0] + window[0], offset[1] + window[1]))
+            for result, window in zip(results, windows)
+        ]
+        boxes.append(self._to_frame_coordinates(results[-1].boxes.data.cpu().numpy(), offset))
+        return non_max_suppression(np.concatenate(boxes), TILE_MERGE_IOS, metric='ios')
+
+    def detect_products_array(self, frame):
+        """
+        Modo sem renderização: não chama result.plot(), então o frame não é copiado nem desenhado.
+        Com tiles definido usa o modo em tiles.
+
+        :param frame: Frame BGR.
+        :return: Array float32 (N, 6) com colunas x1, y1, x2, y2, confidence, class_id.
+        """
+        tiling = self._tiling
+        if tiling[0]:
+            return self._detect_tiles(frame, tiling)
+        crop, offset = self._crop(frame)
+        start_time = time.perf_counter()
+        results = self.model(crop, imgsz=self.imgsz, conf=self.conf, iou=self.iou)
+        elapsed = time.perf_counter() - start_time
+        self._log_inference_time(elapsed)
+        self._update_adaptive_imgsz(elapsed)
+        return self._to_frame_coordinates(results[0].boxes.data.cpu().numpy(), offset)
+
+    def detect_products_array_batch(self, frames):
+        """
+        Versão em lote de detect_products_array. No modo em tiles cada frame já é um lote.
+
+        :return: Lista com um array (N, 6) por frame, na mesma ordem da entrada.
+        """
+        tiling = self._tiling
+        if tiling[0]:
+            return [self._detect_tiles(frame, tiling) for frame in frames]
+        return [self._to_frame_coordinates(result.boxes.data.cpu().numpy(), offset) for result, offset in self._predict_batches(frames)]
+
+    def detections_to_dicts(self, boxes):
+        """
+        Converte o array de detect_products_array para a lista de dicionários de detect_products.
+        """
+        return [{
+            'class': self.class_name(int(cls_id)),
+            'class_id': int(cls_id),
+            'confidence': float(conf),
+            'bbox': [float(x1), float(y1), float(x2), float(y2)]
+        } for x1, y1, x2, y2, conf, cls_id in boxes]
\ No newline at end of file
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+# frame (cópia própria, não um slot da câmera), caixas (N, 6) e horário de captura (time.time())
+Snapshot = namedtuple('Snapshot', ['frame', 'boxes', 'captured_at'])
+
+class SnapshotRing:
+    """
+    Guarda em memória os últimos frames com detecções, para auditar a compra no checkout.
+
+    add() é chamado pela thread de visão e copia o frame para um buffer reaproveitado
+    (no máximo um a cada min_interval segundos). detach() entrega os snapshots ao
+    checkout sem copiar nada: os buffers passam a ser de quem os pegou e o anel
+    aloca novos na próxima captura, fora da thread da interface.
+    """
+    def __init__(self, capacity=4, min_interval=0.5):
+        """
+        :param capacity: Quantidade de frames mantidos.
+        :param min_interval: Intervalo mínimo (s) entre dois snapshots, para o anel cobrir os últimos segundos.
+        """
+        if capacity < 1:
+            raise ValueError("capacity deve ser maior ou igual a 1")
+        self.capacity = capacity
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._snapshots = deque()
+        self._free_frames = []
+        self._last_timestamp = None
+
+    def due(self, timestamp):
+        """
+        :param timestamp: Horário de captura (time.monotonic()) do frame candidato.
+        """
+        last = self._last_timestamp
+        return last is None or timestamp - last >= self.min_interval
+
+    def add(self, frame, boxes, timestamp, is_valid=None):
+        """
+        :param timestamp: Horário de captura do frame (time.monotonic(), como no CameraHandler).
+        :param is_valid: Chamado depois da cópia; se devolver False o frame foi sobrescrito
+                         durante a cópia (slot reaproveitado pela câmera) e é descartado.
+        :return: True se o snapshot foi guardado.
+        """
+        with self._lock:
+            if not self.due(timestamp):
+                return False
+            self._last_timestamp = timestamp
+            # reaproveita o buffer do snapshot mais antigo (ou um livre) antes de alocar outro
+            if len(self._snapshots) >= self.capacity:
+                buffer = self._snapshots.popleft().frame
+            else:
+                buffer = self._free_frames.pop() if self._free_frames else None
+
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            buffer = np.empty_like(frame)
+        # a cópia fica fora do lock: detach() nunca espera por ela
+        np.copyto(buffer, frame)
+        if is_valid is not None and not is_valid():
+            with self._lock:
+                self._free_frames.append(buffer)
+            return False
+
+        captured_at = time.time() - (time.monotonic() - timestamp)
+        with self._lock:
+            self._snapshots.append(Snapshot(buffer, np.array(boxes, dtype=np.float32, copy=True), captured_at))
+        return True
+
+    def detach(self):
+        """
+        :return: Lista de Snapshot, do mais antigo ao mais recente; o anel fica vazio.
+        """
+        with self._lock:
+            snapshots = list(self._snapshots)
+            self._snapshots.clear()
+            self._last_timestamp = None
+        return snapshots
+
+    def clear(self):
+        with self._lock:
+            self._free_frames.extend(snapshot.frame for snapshot in self._snapshots)
+            self._snapshots.clear()
+            self._last_timestamp = None
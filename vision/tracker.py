@@ -0,0 +1,118 @@
+import numpy as np
+import time
+from itertools import count
+
+class Track:
+    __slots__ = ('track_id', 'class_name', 'class_id', 'bbox', 'confidence', 'hits', 'first_seen', 'last_seen')
+
+    def __init__(self, track_id, class_name, class_id, bbox, confidence, now):
+        self.track_id = track_id
+        self.class_name = class_name
+        self.class_id = class_id
+        self.bbox = bbox
+        self.confidence = confidence
+        self.hits = 1
+        self.first_seen = now
+        self.last_seen = now
+
+def iou_matrix(boxes_a, boxes_b):
+    """
+    :param boxes_a: Array (N, 4) no formato [x1, y1, x2, y2].
+    :param boxes_b: Array (M, 4) no formato [x1, y1, x2, y2].
+    :return: Array (N, M) com o IoU de cada par.
+    """
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+class ProductTracker:
+    """
+    Rastreador leve por IoU: associa as detecções de cada frame aos tracks existentes
+    da mesma classe e mantém IDs persistentes. Um track sobrevive a frames sem detecção
+    por até max_age segundos, cobrindo os intervalos entre inferências.
+    """
+    def __init__(self, iou_threshold=0.3, max_age=1.0, min_hits=2):
+        """
+        :param iou_threshold: IoU mínimo para associar uma detecção a um track.
+        :param max_age: Tempo (s) sem detecção após o qual o track é descartado.
+        :param min_hits: Detecções necessárias para o track ser confirmado e entrar no carrinho.
+        """
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self._ids = count(1)
+        self.tracks = []
+
+    def reset(self):
+        self.tracks = []
+
+    def update(self, detections, now=None):
+        """
+        :param detections: Lista de dicionários no formato de ProductDetector.detect_products.
+        :param now: Timestamp (s); usa time.time() se omitido.
+        :return: Lista de tracks ativos.
+        """
+        now = time.time() if now is None else now
+        matched_detections = set()
+
+        if self.tracks and detections:
+            track_boxes = np.array([track.bbox for track in self.tracks], dtype=np.float32)
+            detection_boxes = np.array([d['bbox'] for d in detections], dtype=np.float32)
+            ious = iou_matrix(track_boxes, detection_boxes)
+
+            # só associa detecções da mesma classe do track
+            track_classes = np.array([track.class_name for track in self.tracks])
+            detection_classes = np.array([d['class'] for d in detections])
+            ious[track_classes[:, None] != detection_classes[None, :]] = 0.0
+
+            # associação gulosa: pares com maior IoU primeiro
+            matched_tracks = set()
+            for flat_index in np.argsort(ious, axis=None)[::-1]:
+                track_index, detection_index = np.unravel_index(flat_index, ious.shape)
+                if ious[track_index, detection_index] < self.iou_threshold:
+                    break
+                if track_index in matched_tracks or detection_index in matched_detections:
+                    continue
+                matched_tracks.add(track_index)
+                matched_detections.add(detection_index)
+
+                track = self.tracks[track_index]
+                detection = detections[detection_index]
+                track.bbox = detection['bbox']
+                track.confidence = detection['confidence']
+                track.hits += 1
+                track.last_seen = now
+
+        for index, detection in enumerate(detections):
+            if index not in matched_detections:
+                self.tracks.append(Track(next(self._ids), detection['class'], detection.get('class_id', -1), detection['bbox'], detection['confidence'], now))
+
+        self.prune(now)
+        return self.tracks
+
+    def prune(self, now=None):
+        now = time.time() if now is None else now
+        self.tracks = [track for track in self.tracks if now - track.last_seen <= self.max_age]
+
+    def confirmed_tracks(self):
+        return [track for track in self.tracks if track.hits >= self.min_hits]
+
+    def counts(self):
+        """
+        :return: Dicionário {classe: quantidade} contando apenas tracks confirmados.
+        """
+        product_counts = {}
+        for track in self.confirmed_tracks():
+            product_counts[track.class_name] = product_counts.get(track.class_name, 0) + 1
+        return product_counts
+
+    def counts_by_class_id(self, num_classes):
+        """
+        :return: Array (num_classes,) com a quantidade de tracks confirmados de cada class id.
+        """
+        class_ids = [track.class_id for track in self.confirmed_tracks() if 0 <= track.class_id < num_classes]
+        return np.bincount(np.array(class_ids, dtype=np.intp), minlength=num_classes)
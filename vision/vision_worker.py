@@ -0,0 +1,162 @@
+import threading
+import time
+from queue import Queue, Empty, Full
+
+from vision.pipeline_stats import pipeline_stats
+
+class VisionWorker:
+    """
+    Threads de visão com ciclo de vida explícito: leem os frames do CameraHandler,
+    rodam o detector (pulando frames sem movimento) e publicam o resultado mais
+    recente em results. Uma thread por processo de inferência do detector.
+
+    Estados: 'stopped' → start() → 'running' ⇄ pause()/resume() ⇄ 'paused' → stop().
+    Pausadas, as threads ficam bloqueadas em uma Condition, sem consumir CPU.
+    """
+    STOPPED = 'stopped'
+    RUNNING = 'running'
+    PAUSED = 'paused'
+
+    def __init__(self, camera, detector, motion_detector=None, threads=None, snapshot_ring=None):
+        """
+        :param motion_detector: MotionDetector opcional; sem ele o modelo roda em todos os frames.
+        :param snapshot_ring: SnapshotRing opcional que recebe os frames publicados, para auditoria do checkout.
+        :param threads: Threads de visão; por padrão uma por processo de inferência (detector.num_workers).
+        """
+        self.camera = camera
+        self.detector = detector
+        self.motion_detector = motion_detector
+        self.snapshot_ring = snapshot_ring
+        self.thread_count = threads or getattr(detector, 'num_workers', 1)
+        # cada item: (detections, boxes, frame_size, captured_at, published_at)
+        self.results = Queue(maxsize=1)
+
+        self.state = self.STOPPED
+        self._state_condition = threading.Condition()
+        self._threads = []
+
+        # estado compartilhado pelas threads: cada frame é processado por uma só thread
+        self._lock = threading.Lock()
+        self.claimed_sequence = -1
+        self.published_sequence = -1
+        self.last_result = None
+
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.inferences = 0
+
+    def start(self):
+        with self._state_condition:
+            if self.state != self.STOPPED:
+                return
+            self._reset_scene()
+            self.state = self.RUNNING
+        self._threads = [threading.Thread(target=self._run, name=f'vision-{i}', daemon=True) for i in range(self.thread_count)]
+        for thread in self._threads:
+            thread.start()
+
+    def pause(self):
+        with self._state_condition:
+            if self.state == self.RUNNING:
+                self.state = self.PAUSED
+
+    def resume(self):
+        with self._state_condition:
+            if self.state != self.PAUSED:
+                return
+            # a cena pode ter mudado enquanto a tela estava fora: a primeira inferência não é pulada
+            self._reset_scene()
+            # descarta o resultado que ficou na fila desde antes da pausa
+            try:
+                self.results.get_nowait()
+            except Empty:
+                pass
+            self.state = self.RUNNING
+            self._state_condition.notify_all()
+
+    def stop(self, timeout=2.0):
+        with self._state_condition:
+            self.state = self.STOPPED
+            self._state_condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _reset_scene(self):
+        with self._lock:
+            self.last_result = None
+            if self.motion_detector is not None:
+                self.motion_detector.reset()
+
+    def _wait_until_running(self):
+        """
+        :return: False quando o worker foi parado e a thread deve terminar.
+        """
+        with self._state_condition:
+            self._state_condition.wait_for(lambda: self.state != self.PAUSED)
+            return self.state == self.RUNNING
+
+    def _run(self):
+        while self._wait_until_running():
+            try:
+                self._process_next_frame()
+            except Exception as e:
+                print(f"Error in vision thread: {e}")
+                pipeline_stats.increment('vision_errors')
+                time.sleep(0.1)
+
+    def _process_next_frame(self):
+        # a inferência pode demorar mais que buffer_size capturas: com a view do slot o detector leria um
+        # frame sendo sobrescrito pela câmera; a cópia é feita sob o lock do ring, sem concorrer com a captura
+        captured = self.camera.wait_for_frame(self.claimed_sequence, timeout=0.5, copy=True)
+        if captured is None:
+            return
+        with self._lock:
+            # outra thread de visão já pegou este frame
+            if captured.sequence <= self.claimed_sequence:
+                return
+            if self.claimed_sequence >= 0 and captured.sequence > self.claimed_sequence + 1:
+                skipped = captured.sequence - self.claimed_sequence - 1
+                self.frames_skipped += skipped
+                pipeline_stats.increment('frames_skipped_by_inference', skipped)
+            self.claimed_sequence = captured.sequence
+            # tempo entre a captura do frame e o início do processamento
+            pipeline_stats.record('queue_wait', time.monotonic() - captured.timestamp)
+            run_inference = self.last_result is None or self.motion_detector is None or self.motion_detector.needs_inference(captured.frame, captured.timestamp)
+
+        result = None
+        if run_inference:
+            inference_start = time.perf_counter()
+            boxes = self.detector.detect_products_array(captured.frame)
+            postprocess_start = time.perf_counter()
+            detections = self.detector.detections_to_dicts(boxes)
+            result = (detections, boxes, captured.frame.shape[:2])
+            pipeline_stats.record('inference', postprocess_start - inference_start)
+            pipeline_stats.record('postprocess', time.perf_counter() - postprocess_start)
+        else:
+            pipeline_stats.increment('inference_skipped_static_scene')
+
+        with self._lock:
+            # pausado no meio da inferência: o resultado é de uma cena que o cliente já deixou
+            if self.state != self.RUNNING:
+                return
+            # com várias threads um frame mais novo pode terminar antes: o resultado antigo é descartado
+            if captured.sequence < self.published_sequence:
+                pipeline_stats.increment('results_out_of_order')
+                return
+            if result is not None:
+                self.last_result = result
+                self.inferences += 1
+            elif self.last_result is None:
+                # a cena foi reiniciada (resume) enquanto este frame era processado
+                return
+            self.published_sequence = captured.sequence
+            self.frames_processed += 1
+            result = self.last_result
+        try:
+            self.results.put_nowait(result + (captured.timestamp, time.monotonic()))
+        except Full:
+            pipeline_stats.increment('results_dropped')
+
+        if self.snapshot_ring is not None and self.snapshot_ring.due(captured.timestamp):
+            self.snapshot_ring.add(captured.frame, result[1], captured.timestamp)